@@ -69,4 +69,23 @@ def create_app(config_name='default'):
     from app.cli import register_commands
     register_commands(app)
     
+    # Recompute quality scores when KPI thresholds change
+    from app.services.evaluation import init_threshold_tracking
+    init_threshold_tracking()
+    
+    # Bump the topology version when elements or links change
+    from app.services.topology import init_topology_tracking
+    init_topology_tracking()
+    
+    # SQLite: let background jobs and the web tier write while exports stream
+    if app.config.get('SQLITE_WAL', True):
+        from app.services.sql_helpers import init_sqlite_wal
+        with app.app_context():
+            init_sqlite_wal(db.engine)
+    
+    # Start scheduled maintenance jobs (retention, partitions) when enabled
+    if app.config.get('SCHEDULER_ENABLED'):
+        from app.scheduler import init_scheduler
+        init_scheduler(app)
+    
     return app
@@ -40,3 +40,164 @@ def register_commands(app):
         """Drop all tables and remove all data from the database."""
         db.drop_all()
         click.echo('Database cleared - all tables dropped.')
+
+    @app.cli.group('partitions')
+    def partitions():
+        """Manage time partitions of the kpi_measurements table."""
+
+    @partitions.command('init')
+    def partitions_init():
+        """Convert kpi_measurements to a partitioned table and create partitions."""
+        from app.services.partitioning import get_partitioner
+        partitioner = get_partitioner()
+        try:
+            if partitioner.convert_table():
+                click.echo('kpi_measurements converted to a partitioned table.')
+            created = partitioner.ensure_partitions()
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'Created {len(created)} partition(s): {", ".join(created) or "none"}')
+
+    @partitions.command('maintain')
+    @click.option('--ahead', type=int, default=None, help='Periods to create ahead of now.')
+    def partitions_maintain(ahead):
+        """Create upcoming partitions and move rows out of the default partition."""
+        from app.services.partitioning import get_partitioner
+        try:
+            created = get_partitioner().ensure_partitions(ahead=ahead)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'Created {len(created)} partition(s): {", ".join(created) or "none"}')
+
+    @partitions.command('list')
+    def partitions_list():
+        """List kpi_measurements partitions with their time ranges."""
+        from app.services.partitioning import get_partitioner
+        partitioner = get_partitioner()
+        for name in partitioner.list_partitions():
+            start = partitioner.partition_start(name)
+            click.echo(f'{name}  {start:%Y-%m-%d} -> {partitioner.period_end(start):%Y-%m-%d}')
+
+    @partitions.command('drop')
+    @click.option('--before', required=True, type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Drop partitions whose period ends on or before this date.')
+    @click.confirmation_option(prompt='Are you sure you want to drop these partitions? This will delete their data!')
+    def partitions_drop(before):
+        """Drop whole partitions older than a date."""
+        from app.services.partitioning import get_partitioner
+        for name, rows in get_partitioner().drop_partitions_before(before):
+            click.echo(f'Dropped {name} ({rows} rows)')
+
+    @app.cli.group('rollups')
+    def rollups():
+        """Manage the pre-aggregated KPI rollup tables."""
+
+    @rollups.command('rebuild')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='First day to rebuild (default: all data).')
+    @click.option('--until', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Day after the last day to rebuild (default: now).')
+    def rollups_rebuild(since, until):
+        """Recompute rollups from raw KPI measurements."""
+        from app.services.rollups import rebuild_rollups
+        total = rebuild_rollups(since, until)
+        click.echo(f'Rollups rebuilt from {total} measurements.')
+
+    @app.cli.group('topology')
+    def topology():
+        """Manage network links."""
+
+    @topology.command('derive-links')
+    def topology_derive_links():
+        """Create the default domain chain links for elements without links."""
+        from app.services.topology import derive_links
+        created = derive_links()
+        click.echo(f'Created {created} link(s).')
+
+    @topology.command('layout')
+    def topology_layout():
+        """Recompute stored node positions from scratch."""
+        from app.services.layout import sync_layout
+        from app.services.topology import get_topology_graph
+        layout = sync_layout(get_topology_graph(), rebuild=True)
+        click.echo(f'Laid out {len(layout.positions)} element(s).')
+
+    @app.cli.group('kpi-latest')
+    def kpi_latest():
+        """Manage the latest-value-per-series KPI table."""
+
+    @kpi_latest.command('rebuild')
+    def kpi_latest_rebuild():
+        """Recompute the latest KPI values from raw measurements."""
+        from app.services.latest import rebuild_latest
+        total = rebuild_latest()
+        click.echo(f'Latest values rebuilt for {total} element/KPI series.')
+
+    @app.cli.command('ingest-worker')
+    @click.option('--name', default=None, help='Consumer name (default: <hostname>-<pid>).')
+    @click.option('--read-count', type=int, default=None, help='Queue entries per batch.')
+    @click.option('--max-idle', type=float, default=None,
+                  help='Exit after this many seconds without work (default: run until stopped).')
+    def ingest_worker(name, read_count, max_idle):
+        """Consume the measurement ingest queue and store batches."""
+        from app.services.ingest_queue import IngestWorker
+        worker = IngestWorker(consumer=name, read_count=read_count)
+        click.echo(f'Ingest worker {worker.consumer} consuming the {worker.queue.backend} queue; '
+                   f'press Ctrl+C to stop.')
+        entries, rows = worker.run(max_idle=max_idle)
+        click.echo(f'Ingest worker stopped after {entries} entries ({rows} measurements).')
+
+    @app.cli.command('worker')
+    @click.option('--threads', type=int, default=None, help='Worker threads (default: JOB_WORKER_THREADS).')
+    @click.option('--name', default=None, help='Worker name (default: <hostname>-<pid>).')
+    @click.option('--max-idle', type=float, default=None,
+                  help='Exit after this many seconds without jobs (default: run until stopped).')
+    def worker(threads, name, max_idle):
+        """Execute queued background jobs (reports, exports, sweeps)."""
+        from app.services.jobs import JobWorker
+        job_worker = JobWorker(app, threads=threads, name=name)
+        click.echo(f'Job worker {job_worker.name} running {job_worker.threads} threads; press Ctrl+C to stop.')
+        completed = job_worker.run(max_idle=max_idle)
+        click.echo(f'Job worker stopped after {completed} jobs.')
+
+    @app.cli.group('quality')
+    def quality():
+        """Manage stored KPI quality scores."""
+
+    @quality.command('backfill')
+    @click.option('--kpi', 'kpi_codes', multiple=True, help='KPI code to recompute (repeatable; default: all).')
+    def quality_backfill(kpi_codes):
+        """Recompute quality scores of stored measurements from current KPI definitions."""
+        from app.models.network import KPIDefinition
+        from app.services.evaluation import backfill_quality_scores
+        kpi_ids = None
+        if kpi_codes:
+            kpi_ids = [k.id for k in KPIDefinition.query.filter(KPIDefinition.kpi_code.in_(kpi_codes))]
+            if len(kpi_ids) != len(set(kpi_codes)):
+                click.echo('Error: unknown KPI code.')
+                return
+        total = backfill_quality_scores(kpi_ids)
+        click.echo(f'Quality scores recomputed for {total} measurements.')
+
+    @app.cli.group('retention')
+    def retention():
+        """Purge data older than the configured retention policies."""
+
+    @retention.command('run')
+    @click.option('--vacuum/--no-vacuum', default=None, help='Run VACUUM/ANALYZE after purging.')
+    def retention_run(vacuum):
+        """Purge old measurements, alerts and rollups in batches."""
+        from app.services.retention import RetentionService
+        for record in RetentionService(vacuum=vacuum).run():
+            scope = record.get('impact_level') or record.get('resolution')
+            dropped = record.get('partitions_dropped')
+            extra = f', dropped {", ".join(dropped)}' if dropped else ''
+            click.echo(f"{record['table']} [{scope}] older than {record['cutoff']:%Y-%m-%d %H:%M}: "
+                       f"{record['rows_deleted']} rows in {record['batches']} batch(es){extra}")
+
+    @app.cli.command('run-scheduler')
+    def run_scheduler():
+        """Run scheduled maintenance jobs in the foreground."""
+        from app.scheduler import run_blocking_scheduler
+        click.echo('Scheduler started; press Ctrl+C to exit.')
+        run_blocking_scheduler(app)
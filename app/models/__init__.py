@@ -5,3 +5,5 @@ This ensures all models are imported for SQLAlchemy to discover them
 from app.models.user import *
 from app.models.network import *
 from app.models.subdomain import *
+from app.models.ingest import *
+from app.models.jobs import *
@@ -0,0 +1,23 @@
+from datetime import datetime
+from app import db
+
+
+class IngestQueueEntry(db.Model):
+    """Queued measurement batch (database-backed stand-in for the Redis stream)"""
+    __tablename__ = 'ingest_queue'
+
+    id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text, nullable=False)  # JSON: {'on_conflict': ..., 'rows': [...]}
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_by = db.Column(db.String(100))
+    claimed_at = db.Column(db.DateTime)
+    deliveries = db.Column(db.Integer, nullable=False, default=0)
+    failed_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('idx_ingest_queue_claim', 'failed_at', 'claimed_at'),
+    )
+
+    def __repr__(self):
+        return f'<IngestQueueEntry {self.id} claimed_by={self.claimed_by}>'
@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+from app import db
+
+
+class Job(db.Model):
+    """Background job (report, export, chart render or maintenance sweep)"""
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments of the handler
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # 0..1
+    message = db.Column(db.String(255))
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    claimed_by = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    result = db.Column(db.Text)  # JSON result of handlers without an artifact
+    error = db.Column(db.Text)
+    artifact_path = db.Column(db.String(500))
+    artifact_name = db.Column(db.String(255))
+    artifact_mimetype = db.Column(db.String(100))
+    artifact_size = db.Column(db.BigInteger)
+    expires_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_jobs_status_created', 'status', 'created_at'),
+        db.Index('idx_jobs_expires', 'expires_at'),
+    )
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.job_type,
+            'params': json.loads(self.params or '{}'),
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'cancel_requested': self.cancel_requested,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'artifact': {
+                'name': self.artifact_name,
+                'mimetype': self.artifact_mimetype,
+                'size': self.artifact_size
+            } if self.artifact_path else None
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.job_type} {self.status}>'
@@ -19,44 +19,91 @@ class NetworkElement(db.Model):
     
     def get_latest_kpis(self):
         """Get the latest KPI measurements for this element"""
-        from sqlalchemy import func
-        from app.models.network import KPIDefinition
+        from app.services.latest import latest_kpis_for
         
-        subquery = db.session.query(
-            KPIMeasurement.kpi_id,
-            func.max(KPIMeasurement.timestamp).label('max_time')
-        ).filter_by(element_id=self.id).group_by(KPIMeasurement.kpi_id).subquery('t')
-        
-        latest_kpis = db.session.query(KPIMeasurement).join(
-            subquery,
-            db.and_(
-                KPIMeasurement.kpi_id == subquery.c.kpi_id,
-                KPIMeasurement.timestamp == subquery.c.max_time
-            )
-        ).join(KPIDefinition).filter(KPIMeasurement.element_id == self.id).all()
-        
-        return {
-            kpi.definition.kpi_code: {
-                'value': kpi.value,
-                'timestamp': kpi.timestamp,
-                'quality_score': kpi.quality_score
-            } for kpi in latest_kpis
-        }
+        return latest_kpis_for([self.id]).get(self.id, {})
     
     def get_kpi_history(self, kpi_code, hours=24):
         """Get historical KPI measurements for this element"""
-        from app.models.network import KPIDefinition
+        from app.services.partitioning import measurement_source
         
         cutoff = datetime.utcnow() - timedelta(hours=hours)
-        return self.kpi_measurements.join(KPIDefinition).filter(
+        measurement = measurement_source(cutoff)
+        return db.session.query(measurement).join(measurement.definition).filter(
+            measurement.element_id == self.id,
             KPIDefinition.kpi_code == kpi_code,
-            KPIMeasurement.timestamp > cutoff
-        ).order_by(KPIMeasurement.timestamp).all()
+            measurement.timestamp > cutoff
+        ).order_by(measurement.timestamp).all()
     
     def __repr__(self):
         return f'<NetworkElement {self.element_name} ({self.domain})>'
 
 
+class NetworkLink(db.Model):
+    """Directed link between two network elements (source faces the RAN, target the internet)"""
+    __tablename__ = 'network_links'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source_id = db.Column(db.Integer, db.ForeignKey('network_elements.id'), nullable=False)
+    target_id = db.Column(db.Integer, db.ForeignKey('network_elements.id'), nullable=False)
+    link_type = db.Column(db.String(50), nullable=False)  # e.g. intra-ran, inter-domain
+    capacity_mbps = db.Column(db.Float)
+    subdomain = db.Column(db.String(50), nullable=True)
+    status = db.Column(db.String(20), default='active')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    source = db.relationship('NetworkElement', foreign_keys=[source_id])
+    target = db.relationship('NetworkElement', foreign_keys=[target_id])
+    
+    __table_args__ = (
+        db.UniqueConstraint('source_id', 'target_id', name='uq_network_link_endpoints'),
+        db.Index('idx_network_link_target', 'target_id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'source': self.source_id,
+            'target': self.target_id,
+            'type': self.link_type,
+            'capacity_mbps': self.capacity_mbps,
+            'subdomain': self.subdomain,
+            'status': self.status
+        }
+    
+    def __repr__(self):
+        return f'<NetworkLink {self.source_id}->{self.target_id} ({self.link_type})>'
+
+
+class TopologyChange(db.Model):
+    """Append-only log of element/link changes; the highest id is the topology version"""
+    __tablename__ = 'topology_changes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # 'element' or 'link'
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # 'insert', 'update' or 'delete'
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<TopologyChange {self.id}: {self.action} {self.entity} {self.entity_id}>'
+
+
+class TopologyPosition(db.Model):
+    """Server-computed layout coordinates of a network element"""
+    __tablename__ = 'topology_positions'
+    
+    element_id = db.Column(db.Integer, db.ForeignKey('network_elements.id', ondelete='CASCADE'), primary_key=True)
+    domain = db.Column(db.String(50), nullable=False)  # domain band the element was placed in
+    x = db.Column(db.Float, nullable=False)
+    y = db.Column(db.Float, nullable=False)
+    version = db.Column(db.Integer, nullable=False, index=True)  # topology version when placed
+    
+    def __repr__(self):
+        return f'<TopologyPosition {self.element_id}: ({self.x}, {self.y})>'
+
+
 class KPIDefinition(db.Model):
     __tablename__ = 'kpi_definitions'
     
@@ -100,8 +147,9 @@ class KPIMeasurement(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     quality_score = db.Column(db.Float)
     
+    # One value per series point; makes collector retries idempotent
     __table_args__ = (
-        db.Index('idx_element_kpi', 'element_id', 'kpi_id'),
+        db.Index('uq_kpi_measurement_series', 'element_id', 'kpi_id', 'timestamp', unique=True),
     )
     
     def to_dict(self):
@@ -118,6 +166,81 @@ class KPIMeasurement(db.Model):
         return f'<KPIMeasurement {self.definition.kpi_code}={self.value}{self.definition.unit or ""}>'
 
 
+class KPIRollup(db.Model):
+    """Pre-aggregated KPI measurements per (element, kpi, time bucket)"""
+    __tablename__ = 'kpi_rollups'
+
+    resolution = db.Column(db.String(4), primary_key=True)  # '1m', '1h' or '1d'
+    element_id = db.Column(db.Integer, db.ForeignKey('network_elements.id'), primary_key=True)
+    kpi_id = db.Column(db.Integer, db.ForeignKey('kpi_definitions.id'), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    value_sum = db.Column(db.Float, nullable=False, default=0.0)
+    value_sum_sq = db.Column(db.Float, nullable=False, default=0.0)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    last_value = db.Column(db.Float)
+    last_timestamp = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_rollup_kpi_bucket', 'resolution', 'kpi_id', 'bucket_start'),
+    )
+
+    @property
+    def avg_value(self):
+        return self.value_sum / self.sample_count if self.sample_count else None
+
+    @property
+    def stddev(self):
+        if not self.sample_count:
+            return None
+        mean = self.value_sum / self.sample_count
+        return max(0.0, self.value_sum_sq / self.sample_count - mean * mean) ** 0.5
+
+    def __repr__(self):
+        return f'<KPIRollup {self.resolution} {self.element_id}/{self.kpi_id}@{self.bucket_start}>'
+
+
+class KPISketch(db.Model):
+    """Quantile sketch (DDSketch) of the measurements per (element, kpi, hour)
+
+    Bins are packed (int16 key, uint32 count) pairs; see app.services.sketches.
+    """
+    __tablename__ = 'kpi_sketches'
+
+    element_id = db.Column(db.Integer, db.ForeignKey('network_elements.id'), primary_key=True)
+    kpi_id = db.Column(db.Integer, db.ForeignKey('kpi_definitions.id'), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    sample_count = db.Column(db.Integer, nullable=False, default=0)
+    zero_count = db.Column(db.Integer, nullable=False, default=0)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    positive_bins = db.Column(db.LargeBinary, nullable=False, default=b'')
+    negative_bins = db.Column(db.LargeBinary, nullable=False, default=b'')
+
+    __table_args__ = (
+        db.Index('idx_sketch_kpi_bucket', 'kpi_id', 'bucket_start'),
+    )
+
+    def __repr__(self):
+        return f'<KPISketch {self.element_id}/{self.kpi_id}@{self.bucket_start}>'
+
+
+class KPILatest(db.Model):
+    """Most recent measurement per (element, kpi), maintained on ingest"""
+    __tablename__ = 'kpi_latest'
+
+    element_id = db.Column(db.Integer, db.ForeignKey('network_elements.id'), primary_key=True)
+    kpi_id = db.Column(db.Integer, db.ForeignKey('kpi_definitions.id'), primary_key=True)
+    value = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    quality_score = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<KPILatest {self.element_id}/{self.kpi_id}={self.value}@{self.timestamp}>'
+
+
 class Alert(db.Model):
     __tablename__ = 'alerts'
     
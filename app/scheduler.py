@@ -0,0 +1,54 @@
+"""
+Scheduled maintenance jobs
+Jobs run either inside the web process (SCHEDULER_ENABLED=true, enable it on
+one replica only) or in a dedicated process via `flask run-scheduler`.
+"""
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+JOB_DEFAULTS = {'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 3600}
+
+
+def _in_app_context(app, func):
+    def job():
+        with app.app_context():
+            func()
+    job.__name__ = func.__name__
+    return job
+
+
+def register_jobs(scheduler, app):
+    """Add the maintenance jobs to an APScheduler scheduler"""
+    from app.services.retention import run_retention
+    from app.services.partitioning import maintain_partitions
+
+    scheduler.add_job(
+        _in_app_context(app, run_retention), 'cron',
+        id='retention_purge', replace_existing=True,
+        hour=app.config.get('RETENTION_SCHEDULE_HOUR', 3), minute=0
+    )
+
+    if app.config.get('KPI_PARTITIONING'):
+        scheduler.add_job(
+            _in_app_context(app, maintain_partitions), 'cron',
+            id='partition_maintenance', replace_existing=True, hour=0, minute=15
+        )
+    return scheduler
+
+
+def init_scheduler(app):
+    """Start a background scheduler inside the web process when enabled"""
+    if not app.config.get('SCHEDULER_ENABLED'):
+        return None
+    scheduler = BackgroundScheduler(timezone='UTC', job_defaults=JOB_DEFAULTS)
+    register_jobs(scheduler, app)
+    scheduler.start()
+    app.extensions['scheduler'] = scheduler
+    return scheduler
+
+
+def run_blocking_scheduler(app):
+    """Run the maintenance jobs in the foreground (dedicated scheduler process)"""
+    scheduler = BlockingScheduler(timezone='UTC', job_defaults=JOB_DEFAULTS)
+    register_jobs(scheduler, app)
+    scheduler.start()
@@ -0,0 +1,189 @@
+"""
+Time-bucketed KPI aggregation
+Buckets are aligned to the epoch and the requested range is widened to whole
+buckets, so every bucket covers its full width. Aggregates are computed in
+the database with one grouped query:
+
+- avg, min, max, count, sum and last come from the rollups when a rollup
+  resolution divides the bucket width and still covers the range, otherwise
+  from the raw measurements.
+- Percentiles (p50, p95, p99.9, ...) are nearest-rank values from raw
+  measurements: a window function ranks the values of each bucket and the
+  group keeps the smallest value ranked at or above q * n.
+"""
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, case, func, select
+
+from app import db
+from app.models.network import KPIRollup
+from app.services.partitioning import measurement_source
+from app.services.rollups import ROLLUP_RESOLUTIONS
+from app.services.sql_helpers import epoch_seconds
+
+BUCKET_WIDTHS = OrderedDict([
+    ('1m', timedelta(minutes=1)),
+    ('5m', timedelta(minutes=5)),
+    ('15m', timedelta(minutes=15)),
+    ('1h', timedelta(hours=1)),
+    ('6h', timedelta(hours=6)),
+    ('1d', timedelta(days=1)),
+])
+ROLLUP_FUNCTIONS = ('avg', 'min', 'max', 'count', 'sum', 'last')
+PERCENTILE = re.compile(r'^p(\d{1,2}(?:\.\d+)?)$')
+EPOCH = datetime(1970, 1, 1)
+
+
+def parse_functions(names):
+    """Validate aggregate function names; returns them in request order without duplicates"""
+    functions = []
+    for name in names:
+        name = name.strip().lower()
+        if not name or name in functions:
+            continue
+        if name not in ROLLUP_FUNCTIONS and not PERCENTILE.match(name):
+            raise ValueError(f'Unknown aggregate: {name}')
+        functions.append(name)
+    if not functions:
+        raise ValueError('No aggregate requested')
+    return functions
+
+
+def auto_bucket(start, end, max_buckets):
+    """Finest bucket width giving at most max_buckets buckets over [start, end)"""
+    for name, width in BUCKET_WIDTHS.items():
+        if (end - start) / width <= max_buckets:
+            return name
+    return next(reversed(BUCKET_WIDTHS))
+
+
+def bucket_range(start, end, bucket):
+    """[start, end) widened to whole buckets"""
+    width = BUCKET_WIDTHS[bucket]
+    first = EPOCH + ((start - EPOCH) // width) * width
+    last = EPOCH + -((EPOCH - end) // width) * width
+    return first, last
+
+
+def aggregate_kpis(kpi_ids, start, end, bucket, functions, element_ids=None):
+    """Aggregated series per (element, KPI), or per KPI across all elements
+
+    Returns {(element_id or None, kpi_id): {'buckets': [...], fn: [...]}}
+    with the buckets in time order and one list per aggregate function.
+    """
+    start, end = bucket_range(start, end, bucket)
+    width = int(BUCKET_WIDTHS[bucket].total_seconds())
+    resolution = _rollup_resolution(bucket, start, functions)
+    if resolution:
+        rows = _rollup_rows(kpi_ids, element_ids, start, end, width, resolution, functions)
+    else:
+        rows = _raw_rows(kpi_ids, element_ids, start, end, width, functions)
+
+    series = {}
+    for row in rows:
+        key = (row.element_id if element_ids is not None else None, row.kpi_id)
+        points = series.get(key)
+        if points is None:
+            points = series[key] = {'buckets': [], **{fn: [] for fn in functions}}
+        points['buckets'].append(EPOCH + timedelta(seconds=row.bucket * width))
+        for fn in functions:
+            points[fn].append(getattr(row, _label(fn)))
+    return series
+
+
+def _rollup_resolution(bucket, start, functions):
+    """Coarsest rollup resolution usable for these aggregates, or None"""
+    if any(fn not in ROLLUP_FUNCTIONS for fn in functions):
+        return None
+    width = BUCKET_WIDTHS[bucket]
+    kept = current_app.config.get('RETENTION_POLICIES', {}).get('kpi_rollups', {})
+    for resolution in reversed(ROLLUP_RESOLUTIONS):
+        if width % ROLLUP_RESOLUTIONS[resolution]:
+            continue
+        days = kept.get(resolution)
+        if days is None or start >= datetime.utcnow() - timedelta(days=days):
+            return resolution
+    return None
+
+
+def _group(source, element_ids, bucket):
+    columns = [source.kpi_id, bucket]
+    return [source.element_id] + columns if element_ids is not None else columns
+
+
+def _raw_rows(kpi_ids, element_ids, start, end, width, functions):
+    m = measurement_source(start, end)
+    bucket = epoch_seconds(m.timestamp) // width
+    partition = _group(m, element_ids, bucket)
+    columns = [m.element_id, m.kpi_id, bucket.label('bucket'), m.value.label('value')]
+    if any(PERCENTILE.match(fn) for fn in functions):
+        columns += [func.row_number().over(partition_by=partition, order_by=m.value).label('value_rank'),
+                    func.count().over(partition_by=partition).label('n')]
+    if 'last' in functions:
+        columns.append(func.row_number().over(partition_by=partition, order_by=m.timestamp.desc()).label('recency'))
+
+    filters = [m.kpi_id.in_(kpi_ids), m.timestamp >= start, m.timestamp < end]
+    if element_ids is not None:
+        filters.append(m.element_id.in_(element_ids))
+    ranked = select(*columns).where(and_(*filters)).subquery()
+
+    aggregates = []
+    for fn in functions:
+        if fn == 'avg':
+            expr = func.avg(ranked.c.value)
+        elif fn == 'min':
+            expr = func.min(ranked.c.value)
+        elif fn == 'max':
+            expr = func.max(ranked.c.value)
+        elif fn == 'count':
+            expr = func.count(ranked.c.value)
+        elif fn == 'sum':
+            expr = func.sum(ranked.c.value)
+        elif fn == 'last':
+            expr = func.max(case((ranked.c.recency == 1, ranked.c.value)))
+        else:
+            q = float(PERCENTILE.match(fn).group(1)) / 100
+            expr = func.min(case((ranked.c.value_rank >= q * ranked.c.n, ranked.c.value)))
+        aggregates.append(expr.label(_label(fn)))
+    return _grouped(ranked.c, element_ids, aggregates)
+
+
+def _rollup_rows(kpi_ids, element_ids, start, end, width, resolution, functions):
+    r = KPIRollup
+    bucket = epoch_seconds(r.bucket_start) // width
+    columns = [r.element_id, r.kpi_id, bucket.label('bucket'), r.sample_count, r.value_sum,
+               r.min_value, r.max_value, r.last_value]
+    if 'last' in functions:
+        columns.append(func.row_number().over(
+            partition_by=_group(r, element_ids, bucket), order_by=r.last_timestamp.desc()).label('recency'))
+
+    filters = [r.resolution == resolution, r.kpi_id.in_(kpi_ids), r.bucket_start >= start, r.bucket_start < end]
+    if element_ids is not None:
+        filters.append(r.element_id.in_(element_ids))
+    rollups = select(*columns).where(and_(*filters)).subquery()
+
+    c = rollups.c
+    expressions = {
+        'avg': func.sum(c.value_sum) / func.nullif(func.sum(c.sample_count), 0),
+        'min': func.min(c.min_value),
+        'max': func.max(c.max_value),
+        'count': func.sum(c.sample_count),
+        'sum': func.sum(c.value_sum),
+    }
+    aggregates = []
+    for fn in functions:
+        expr = func.max(case((c.recency == 1, c.last_value))) if fn == 'last' else expressions[fn]
+        aggregates.append(expr.label(_label(fn)))
+    return _grouped(c, element_ids, aggregates)
+
+
+def _grouped(c, element_ids, aggregates):
+    keys = [c.element_id, c.kpi_id, c.bucket] if element_ids is not None else [c.kpi_id, c.bucket]
+    return db.session.execute(select(*keys, *aggregates).group_by(*keys).order_by(*keys)).all()
+
+
+def _label(fn):
+    return 'agg_' + fn.replace('.', '_')
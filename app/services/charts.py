@@ -0,0 +1,169 @@
+"""
+Report chart images
+Charts are drawn with matplotlib's object-oriented Figure API (no pyplot
+state is shared between threads and figures are freed with their last
+reference) on a small bounded pool of render threads. The data is gathered
+in the request thread; the PNG bytes are kept in an LRU cache keyed by chart
+type, time range and a data version, so repeated downloads of an unchanged
+chart never reach the renderer:
+
+- domain_health: the topology version (element changes, status included)
+- qoe_trend: count, last id and last timestamp of the tests in the range
+"""
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from sqlalchemy import func
+
+from app import db
+from app.models.simulation import PerformanceTest
+from app.services.reporting import REPORT_DOMAINS, domain_health
+from app.services.topology import topology_version
+
+TIME_RANGES = {
+    'day': (timedelta(hours=24), '%H:%M'),
+    'week': (timedelta(days=7), '%a'),
+    'month': (timedelta(days=30), '%d/%m'),
+}
+
+
+class ChartBusy(Exception):
+    """All render workers are busy and the wait queue is full"""
+
+
+def chart_png(chart_type, time_range, inline=False):
+    """PNG bytes of a report chart, served from the cache while its data is unchanged
+
+    Raises KeyError for an unknown chart type and ChartBusy when the render
+    pool is saturated. Callers that already run on a bounded pool (background
+    jobs) render inline.
+    """
+    chart = CHARTS[chart_type]
+    if time_range not in TIME_RANGES:
+        time_range = 'day'
+    span, date_format = TIME_RANGES[time_range]
+    cutoff = datetime.utcnow() - span
+
+    key = (chart_type, time_range, chart['version'](cutoff))
+    png = _cache.get(key)
+    if png is None:
+        data = chart['data'](cutoff, date_format)
+        png = _draw_png(chart['draw'], data, time_range) if inline else _render(chart['draw'], data, time_range)
+        _cache.put(key, png)
+    return png
+
+
+def _domain_health_version(cutoff):
+    return topology_version()
+
+
+def _domain_health_data(cutoff, date_format):
+    report = domain_health(cutoff)
+    return [(domain, report[domain]['health']) for domain in REPORT_DOMAINS]
+
+
+def _draw_domain_health(ax, data, time_range):
+    domains = [d for d, _ in data]
+    health_values = [h for _, h in data]
+    colors = ['#e74c3c' if h < 60 else '#f1c40f' if h < 90 else '#2ecc71' for h in health_values]
+    ax.bar(domains, health_values, color=colors)
+    ax.set_xlabel('Network Domain')
+    ax.set_ylabel('Health (%)')
+    ax.set_title(f'Domain Health Overview - {time_range.capitalize()}')
+    ax.set_ylim(0, 100)
+    for i, v in enumerate(health_values):
+        ax.text(i, v + 2, f"{v}%", ha='center')
+
+
+def _qoe_trend_version(cutoff):
+    return tuple(db.session.query(
+        func.count(PerformanceTest.id), func.max(PerformanceTest.id), func.max(PerformanceTest.timestamp)
+    ).filter(PerformanceTest.timestamp >= cutoff).one())
+
+
+def _qoe_trend_data(cutoff, date_format):
+    tests = db.session.query(PerformanceTest.timestamp, PerformanceTest.qoe_score).filter(
+        PerformanceTest.timestamp >= cutoff
+    ).order_by(PerformanceTest.timestamp)
+    groups = {}
+    for timestamp, score in tests:
+        groups.setdefault(timestamp.strftime(date_format), []).append(score)
+    return [(key, sum(scores) / len(scores)) for key, scores in groups.items()]
+
+
+def _draw_qoe_trend(ax, data, time_range):
+    ax.plot([k for k, _ in data], [v for _, v in data], marker='o', linestyle='-', color='#3498db')
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Average QoE Score')
+    ax.set_title(f'QoE Score Trend - {time_range.capitalize()}')
+    ax.set_ylim(0, 100)
+    ax.grid(True, linestyle='--', alpha=0.7)
+
+
+CHARTS = {
+    'domain_health': {'version': _domain_health_version, 'data': _domain_health_data, 'draw': _draw_domain_health},
+    'qoe_trend': {'version': _qoe_trend_version, 'data': _qoe_trend_data, 'draw': _draw_qoe_trend},
+}
+
+
+def _draw_png(draw, data, time_range):
+    """Render one chart on a private Figure (runs on a pool thread)"""
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    draw(fig.add_subplot(), data, time_range)
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    return buffer.getvalue()
+
+
+class _PNGCache:
+    """Thread-safe LRU of rendered charts"""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            png = self.entries.get(key)
+            if png is not None:
+                self.entries.move_to_end(key)
+            return png
+
+    def put(self, key, png):
+        size = current_app.config.get('CHART_CACHE_SIZE', 64)
+        with self.lock:
+            self.entries[key] = png
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+
+_cache = _PNGCache()
+_executor = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+def _render(draw, data, time_range):
+    """Run _draw_png on the render pool, waiting for its result"""
+    global _executor, _slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = current_app.config.get('CHART_RENDER_WORKERS', 2)
+                _slots = threading.BoundedSemaphore(workers + current_app.config.get('CHART_RENDER_QUEUE', 8))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chart-render')
+    if not _slots.acquire(timeout=current_app.config.get('CHART_RENDER_TIMEOUT', 30)):
+        raise ChartBusy()
+    try:
+        return _executor.submit(_draw_png, draw, data, time_range).result()
+    finally:
+        _slots.release()
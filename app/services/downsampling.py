@@ -0,0 +1,113 @@
+"""
+Visual downsampling of chart series
+A chart only has so many pixels, so series are reduced to about max_points
+representative points before they are serialized:
+
+- lttb: Largest-Triangle-Three-Buckets keeps, from each of max_points - 2
+  equal-count buckets, the point forming the largest triangle with the point
+  kept before it and the average of the next bucket. Preserves the visual
+  shape (peaks, dips) of line charts.
+- minmax: splits the time axis into max_points / 2 equal-width columns and
+  keeps the lowest and highest point of each, so no extreme is lost.
+
+Both return the sorted indices of the kept points, so callers can pick the
+matching labels, timestamps or rows.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+DOWNSAMPLING_MODES = ('lttb', 'minmax')
+EPOCH = datetime(1970, 1, 1)
+
+
+def downsampling_params(args, default_points, default_mode='lttb'):
+    """(max_points, mode) from request arguments; max_points=0 disables downsampling"""
+    mode = args.get('downsample', default_mode)
+    if mode not in DOWNSAMPLING_MODES:
+        raise ValueError(f'downsample must be one of {list(DOWNSAMPLING_MODES)}')
+    try:
+        max_points = int(args.get('max_points', default_points))
+    except ValueError:
+        raise ValueError('max_points must be an integer')
+    if max_points < 0 or 0 < max_points < 3:
+        raise ValueError('max_points must be 0 or at least 3')
+    return max_points, mode
+
+
+def downsample(x, y, max_points, mode='lttb'):
+    """Indices of at most max_points points of the series (x ascending)"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if not max_points or len(x) <= max_points:
+        return np.arange(len(x))
+    if mode == 'minmax':
+        return minmax_indices(x, y, max_points)
+    if mode == 'lttb':
+        return lttb_indices(x, y, max_points)
+    raise ValueError(f'Unknown downsampling mode: {mode}')
+
+
+def lttb_indices(x, y, max_points):
+    size = len(x)
+    if max_points >= size:
+        return np.arange(size)
+    if max_points < 3:
+        return np.array([0, size - 1][:max_points], dtype=np.int64)
+
+    # Buckets between the fixed first and last point; bucket i is [edges[i], edges[i + 1])
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    # Slice off the last point so the last bucket stops at edges[-1] like the others
+    sums_x = np.add.reduceat(x[:edges[-1]], edges[:-1])
+    sums_y = np.add.reduceat(y[:edges[-1]], edges[:-1])
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        bx, by = x[start:end], y[start:end]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(x, y, max_points):
+    columns = max(1, max_points // 2)
+    span = x[-1] - x[0]
+    if span <= 0:
+        column = np.zeros(len(x), dtype=np.int64)
+    else:
+        column = np.minimum(((x - x[0]) / span * columns).astype(np.int64), columns - 1)
+    # Sorted by column, then value: the first and last entry of each column
+    # are its minimum and maximum
+    order = np.lexsort((y, column))
+    boundaries = np.flatnonzero(np.diff(column[order])) + 1
+    firsts = np.concatenate(([0], boundaries))
+    lasts = np.concatenate((boundaries - 1, [len(order) - 1]))
+    return np.unique(np.concatenate((order[firsts], order[lasts])))
+
+
+def downsample_rows(rows, max_points, mode='lttb', key=None):
+    """Downsample a list of rows carrying 'timestamp' (naive UTC) and 'value'
+
+    With key, each group of rows sharing key(row) (e.g. one KPI) is reduced
+    to max_points on its own; the result keeps the input order.
+    """
+    groups = {}
+    for position, row in enumerate(rows):
+        groups.setdefault(key(row) if key else None, []).append(position)
+    kept = []
+    for positions in groups.values():
+        if not max_points or len(positions) <= max_points:
+            kept.extend(positions)
+            continue
+        x = [(rows[p]['timestamp'] - EPOCH) / timedelta(seconds=1) for p in positions]
+        y = [np.nan if rows[p]['value'] is None else rows[p]['value'] for p in positions]
+        kept.extend(positions[i] for i in downsample(x, y, max_points, mode))
+    return [rows[p] for p in sorted(kept)]
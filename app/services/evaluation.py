@@ -0,0 +1,228 @@
+"""
+Vectorized KPI evaluation
+Quality scores and critical-threshold checks for whole measurement batches.
+KPI definitions are held as NumPy arrays indexed by kpi_id, so a batch of
+(kpi_id, value) pairs is evaluated in a single pass instead of one
+KPIDefinition lookup and is_critical() call per row.
+
+When a definition's min/max/optimal values change, the stored quality scores
+of that KPI are recomputed in the background, chunk by chunk.
+"""
+import threading
+import time
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, event, func, select, update
+
+from app import db
+from app.models.network import KPIDefinition, KPILatest
+from app.services.partitioning import measurement_tables
+
+# Columns that feed the quality score; impact_level only affects criticality
+SCORE_FIELDS = ('min_value', 'max_value', 'optimal_value')
+EVALUATION_FIELDS = SCORE_FIELDS + ('impact_level',)
+
+CRITICAL_DEVIATION = 0.3  # relative deviation from optimal for high impact KPIs
+
+
+class KPIEvaluator:
+    """KPI definition table as NumPy arrays with batch evaluation"""
+
+    def __init__(self, definitions):
+        definitions = sorted(definitions, key=lambda d: d.id)
+        self.kpi_ids = np.array([d.id for d in definitions], dtype=np.int64)
+        self.min_values = self._floats(d.min_value for d in definitions)
+        self.max_values = self._floats(d.max_value for d in definitions)
+        self.optimal_values = self._floats(d.optimal_value for d in definitions)
+        self.high_impact = np.array([d.impact_level == 'high' for d in definitions], dtype=bool)
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_database(cls):
+        return cls(KPIDefinition.query.all())
+
+    @staticmethod
+    def _floats(values):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+    def covers(self, kpi_ids):
+        """True when every kpi_id has a definition in this table"""
+        return bool(np.isin(np.asarray(kpi_ids, dtype=np.int64), self.kpi_ids).all())
+
+    def _positions(self, kpi_ids):
+        """Row of each kpi_id in the definition arrays and a mask of known ids"""
+        kpi_ids = np.asarray(kpi_ids, dtype=np.int64)
+        positions = np.searchsorted(self.kpi_ids, kpi_ids)
+        positions = np.minimum(positions, max(len(self.kpi_ids) - 1, 0))
+        known = self.kpi_ids[positions] == kpi_ids if len(self.kpi_ids) else np.zeros(len(kpi_ids), dtype=bool)
+        return positions, known
+
+    def evaluate(self, kpi_ids, values):
+        """Quality scores and critical mask for parallel kpi_id and value arrays
+
+        Scores are 0-100 from the distance to the optimal value relative to
+        the KPI's range, NaN where the definition lacks min/max/optimal.
+        A value is critical when its KPI has high impact and it deviates from
+        the optimal value by more than 30%.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return np.empty(0), np.zeros(0, dtype=bool)
+        positions, known = self._positions(kpi_ids)
+
+        minimum = np.where(known, self.min_values[positions], np.nan)
+        maximum = np.where(known, self.max_values[positions], np.nan)
+        optimal = np.where(known, self.optimal_values[positions], np.nan)
+        high = known & self.high_impact[positions]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            value_range = maximum - minimum
+            distance = np.abs(values - optimal) / value_range
+            scores = np.where(value_range > 0, np.clip(100 * (1 - distance), 0, 100), np.nan)
+
+            has_optimal = ~np.isnan(optimal) & (optimal != 0)
+            deviation = np.abs(values - optimal) / optimal
+            critical = high & has_optimal & (deviation > CRITICAL_DEVIATION)
+        return scores, critical
+
+    def quality_scores(self, kpi_ids, values):
+        """Quality scores only, as a list with None where undefined"""
+        scores, _ = self.evaluate(kpi_ids, values)
+        return [None if np.isnan(s) else float(s) for s in scores]
+
+
+_evaluator = None
+_evaluator_lock = threading.Lock()
+
+
+def get_evaluator(kpi_ids=()):
+    """Process-wide evaluator, rebuilt when stale or missing any of kpi_ids"""
+    global _evaluator
+    ttl = current_app.config.get('KPI_EVALUATOR_TTL', 60)
+    with _evaluator_lock:
+        evaluator = _evaluator
+        if (evaluator is None or time.monotonic() - evaluator.built_at > ttl
+                or not evaluator.covers(list(kpi_ids))):
+            evaluator = _evaluator = KPIEvaluator.from_database()
+    return evaluator
+
+
+def invalidate_evaluator():
+    global _evaluator
+    with _evaluator_lock:
+        _evaluator = None
+
+
+def backfill_quality_scores(kpi_ids=None, chunk_size=None, progress=None):
+    """Recompute stored quality_score for the given KPIs (all when None)
+
+    Walks every measurement table (each partition on SQLite) in primary key
+    order, chunk_size rows at a time, committing after each chunk so the
+    backfill never holds long locks. progress(fraction, message) is called
+    after every chunk and may raise to stop the backfill. Returns the number
+    of rows updated.
+    """
+    chunk_size = chunk_size or current_app.config.get('QUALITY_BACKFILL_CHUNK_SIZE', 5000)
+    evaluator = KPIEvaluator.from_database()
+    tables = measurement_tables()
+    expected = 0
+    if progress:
+        for table in tables:
+            query = select(func.count()).select_from(table)
+            if kpi_ids is not None:
+                query = query.where(table.c.kpi_id.in_(list(kpi_ids)))
+            expected += db.session.execute(query).scalar()
+    total = 0
+    for table in tables:
+        stmt = update(table).where(table.c.id == bindparam('_id')).values(quality_score=bindparam('_score'))
+        last_id = None
+        while True:
+            query = select(table.c.id, table.c.kpi_id, table.c.value).order_by(table.c.id).limit(chunk_size)
+            if kpi_ids is not None:
+                query = query.where(table.c.kpi_id.in_(list(kpi_ids)))
+            if last_id is not None:
+                query = query.where(table.c.id > last_id)
+            rows = db.session.execute(query).all()
+            if not rows:
+                break
+            scores = evaluator.quality_scores([r.kpi_id for r in rows], [r.value for r in rows])
+            db.session.execute(stmt, [{'_id': r.id, '_score': s} for r, s in zip(rows, scores)])
+            db.session.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+            if progress:
+                progress(total / max(expected, 1), f'{total} rows updated')
+
+    # The latest-value table carries a copy of the score
+    latest = select(KPILatest.element_id, KPILatest.kpi_id, KPILatest.value)
+    if kpi_ids is not None:
+        latest = latest.where(KPILatest.kpi_id.in_(list(kpi_ids)))
+    rows = db.session.execute(latest).all()
+    if rows:
+        table = KPILatest.__table__
+        scores = evaluator.quality_scores([r.kpi_id for r in rows], [r.value for r in rows])
+        db.session.execute(
+            update(table).where(table.c.element_id == bindparam('_element_id'),
+                                table.c.kpi_id == bindparam('_kpi_id')).values(quality_score=bindparam('_score')),
+            [{'_element_id': r.element_id, '_kpi_id': r.kpi_id, '_score': s} for r, s in zip(rows, scores)]
+        )
+        db.session.commit()
+    return total
+
+
+# ----------------------------------------------------------------------
+# Threshold change tracking
+# ----------------------------------------------------------------------
+
+def _changed_fields(obj, fields):
+    state = db.inspect(obj)
+    return {f for f in fields if state.attrs[f].history.has_changes()}
+
+
+def _track_definition_changes(session, flush_context, instances):
+    for obj in session.dirty:
+        if not isinstance(obj, KPIDefinition):
+            continue
+        changed = _changed_fields(obj, EVALUATION_FIELDS)
+        if changed:
+            session.info['kpi_definitions_changed'] = True
+        if changed & set(SCORE_FIELDS):
+            session.info.setdefault('kpi_threshold_changes', set()).add(obj.id)
+
+
+def _after_commit(session):
+    if session.info.pop('kpi_definitions_changed', False):
+        invalidate_evaluator()
+    kpi_ids = session.info.pop('kpi_threshold_changes', None)
+    if kpi_ids and has_app_context() and current_app.config.get('QUALITY_BACKFILL_ON_CHANGE', True):
+        _start_backfill(current_app._get_current_object(), sorted(kpi_ids))
+
+
+def _after_rollback(session):
+    session.info.pop('kpi_definitions_changed', None)
+    session.info.pop('kpi_threshold_changes', None)
+
+
+def _start_backfill(app, kpi_ids):
+    def run():
+        with app.app_context():
+            try:
+                rows = backfill_quality_scores(kpi_ids)
+                app.logger.info(f'Recomputed quality scores of {rows} measurements for KPIs {kpi_ids}')
+            except Exception:
+                db.session.rollback()
+                app.logger.exception(f'Quality score backfill failed for KPIs {kpi_ids}')
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name='quality-backfill', daemon=True).start()
+
+
+def init_threshold_tracking():
+    """Invalidate the evaluator and backfill scores when KPI thresholds change"""
+    session = db.session
+    if not event.contains(session, 'before_flush', _track_definition_changes):
+        event.listen(session, 'before_flush', _track_definition_changes)
+        event.listen(session, 'after_commit', _after_commit)
+        event.listen(session, 'after_rollback', _after_rollback)
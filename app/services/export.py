@@ -0,0 +1,229 @@
+"""
+Columnar KPI export
+A binary alternative to the CSV export for analysts loading month-long
+extracts into pandas. The file is a zip archive (ZIP_DEFLATED) of .npy
+arrays, written while the query is streamed:
+
+    elements/name.npy, elements/domain.npy   lookup tables (row = element code)
+    kpis/code.npy, kpis/name.npy, kpis/unit.npy
+    chunk_00000/timestamp.npy                int64 microseconds since the epoch (UTC)
+    chunk_00000/element.npy                  int32 element codes
+    chunk_00000/kpi.npy                      int16 KPI codes
+    chunk_00000/value.npy                    float64
+    chunk_00000/quality_score.npy            float32, NaN when unknown
+    ...
+    meta.json
+
+load_kpi_export() turns such a file into a DataFrame without any text parsing.
+kpi_export() builds either format (or the plain CSV) for the report view and
+for background export jobs.
+"""
+import csv
+import io
+import json
+import zipfile
+import zlib
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+
+from app import db
+from app.models.network import KPIDefinition, NetworkElement
+from app.services.partitioning import measurement_source
+
+FORMAT_NAME = 'qoe-kpi-columns'
+FORMAT_VERSION = 1
+
+CHUNK_COLUMNS = {
+    'timestamp': np.int64,
+    'element': np.int32,
+    'kpi': np.int16,
+    'value': np.float64,
+    'quality_score': np.float32,
+}
+
+
+CSV_COLUMNS = ['timestamp', 'element_name', 'domain', 'kpi_name', 'kpi_code', 'value', 'unit', 'quality_score']
+
+
+def kpi_export(cutoff, time_range, domain=None, kpi_code=None, export_format='csv', compress=False,
+               chunk_size=5000, track=None):
+    """Filename, mimetype and streamed chunks of a KPI export
+
+    Rows are read oldest first, chunk_size at a time; track, when given,
+    wraps the row iterator (every row starts with its timestamp).
+    """
+    measurement = measurement_source(cutoff)
+    filename = f"kpi_data_{time_range}_{domain or 'all'}_{kpi_code or 'all'}_{datetime.now().strftime('%Y%m%d')}"
+
+    if export_format == 'npz':
+        # Columnar arrays with element/KPI codes; the lookup tables are written once
+        query = db.session.query(
+            measurement.timestamp, measurement.element_id, measurement.kpi_id,
+            measurement.value, measurement.quality_score
+        ).filter(measurement.timestamp >= cutoff)
+        if domain:
+            query = query.join(NetworkElement, NetworkElement.id == measurement.element_id).filter(
+                NetworkElement.domain == domain)
+        if kpi_code:
+            query = query.join(KPIDefinition, KPIDefinition.id == measurement.kpi_id).filter(
+                KPIDefinition.kpi_code == kpi_code)
+        rows = query.order_by(measurement.timestamp).execution_options(yield_per=chunk_size)
+        filters = {'time_range': time_range, 'cutoff': cutoff.isoformat(), 'domain': domain, 'kpi_code': kpi_code}
+        chunks = stream_columnar_export(track(rows) if track else rows, chunk_size, filters)
+        return f'{filename}.npz', 'application/zip', chunks
+
+    # Select the exported columns directly; rows are streamed in chunks
+    query = db.session.query(
+        measurement.timestamp, NetworkElement.element_name, NetworkElement.domain,
+        KPIDefinition.kpi_name, KPIDefinition.kpi_code, measurement.value, KPIDefinition.unit,
+        measurement.quality_score
+    ).join(KPIDefinition, KPIDefinition.id == measurement.kpi_id).join(
+        NetworkElement, NetworkElement.id == measurement.element_id
+    ).filter(
+        measurement.timestamp >= cutoff
+    )
+    if domain:
+        query = query.filter(NetworkElement.domain == domain)
+    if kpi_code:
+        query = query.filter(KPIDefinition.kpi_code == kpi_code)
+    rows = query.order_by(measurement.timestamp).execution_options(yield_per=chunk_size)
+
+    chunks = stream_csv_export(track(rows) if track else rows, chunk_size, compress)
+    if compress:
+        return f'{filename}.csv.gz', 'application/gzip', chunks
+    return f'{filename}.csv', 'text/csv', chunks
+
+
+def stream_csv_export(rows, chunk_size, compress=False):
+    """Yield the KPI export CSV chunk by chunk, optionally gzip-compressed"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+
+    def flush():
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    for count, (timestamp, *columns) in enumerate(rows, 1):
+        writer.writerow([timestamp.isoformat(), *columns])
+        if count % chunk_size == 0:
+            yield flush()
+
+    yield flush()
+    if compressor:
+        yield compressor.flush()
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, unseekable sink whose contents are drained after each chunk"""
+
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_columnar_export(rows, chunk_size, filters=None):
+    """Yield a columnar export archive for (timestamp, element_id, kpi_id, value, quality_score) rows"""
+    elements = db.session.query(NetworkElement.id, NetworkElement.element_name,
+                                NetworkElement.domain).order_by(NetworkElement.id).all()
+    kpis = db.session.query(KPIDefinition.id, KPIDefinition.kpi_code, KPIDefinition.kpi_name,
+                            KPIDefinition.unit).order_by(KPIDefinition.id).all()
+    element_ids = np.array([e.id for e in elements], dtype=np.int64)
+    kpi_ids = np.array([k.id for k in kpis], dtype=np.int64)
+
+    buffer = _StreamBuffer()
+    archive = zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED)
+    _write_array(archive, 'elements/name', np.array([e.element_name for e in elements], dtype=str))
+    _write_array(archive, 'elements/domain', np.array([e.domain for e in elements], dtype=str))
+    _write_array(archive, 'kpis/code', np.array([k.kpi_code for k in kpis], dtype=str))
+    _write_array(archive, 'kpis/name', np.array([k.kpi_name for k in kpis], dtype=str))
+    _write_array(archive, 'kpis/unit', np.array([k.unit or '' for k in kpis], dtype=str))
+    yield buffer.drain()
+
+    rows = iter(rows)
+    chunks = total = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        timestamps, element_column, kpi_column, values, scores = zip(*chunk)
+        columns = {
+            'timestamp': np.array(timestamps, dtype='datetime64[us]').astype(np.int64),
+            'element': np.searchsorted(element_ids, np.array(element_column, dtype=np.int64)),
+            'kpi': np.searchsorted(kpi_ids, np.array(kpi_column, dtype=np.int64)),
+            'value': np.array(values, dtype=np.float64),
+            'quality_score': np.array([np.nan if s is None else s for s in scores], dtype=np.float32),
+        }
+        for name, dtype in CHUNK_COLUMNS.items():
+            _write_array(archive, f'chunk_{chunks:05d}/{name}', columns[name].astype(dtype, copy=False))
+        chunks += 1
+        total += len(chunk)
+        yield buffer.drain()
+
+    archive.writestr('meta.json', json.dumps({
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'rows': total,
+        'chunks': chunks,
+        'filters': filters or {},
+    }))
+    archive.close()
+    yield buffer.drain()
+
+
+def load_kpi_export(source):
+    """Load a columnar KPI export (path or file object) into a pandas DataFrame
+
+    Columns: timestamp (datetime64), element_name, domain and kpi_code
+    (categoricals), value and quality_score; KPI units are in df.attrs['units'].
+    """
+    import pandas as pd
+
+    with zipfile.ZipFile(source) as archive:
+        meta = json.loads(archive.read('meta.json'))
+        if meta.get('format') != FORMAT_NAME:
+            raise ValueError('Not a columnar KPI export')
+
+        def read(name):
+            with archive.open(f'{name}.npy') as f:
+                return np.lib.format.read_array(f, allow_pickle=False)
+
+        element_names, element_domains = read('elements/name'), read('elements/domain')
+        kpi_codes, kpi_units = read('kpis/code'), read('kpis/unit')
+        columns = {}
+        for name, dtype in CHUNK_COLUMNS.items():
+            parts = [read(f'chunk_{i:05d}/{name}') for i in range(meta['chunks'])]
+            columns[name] = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    domains, domain_codes = np.unique(element_domains, return_inverse=True)
+    df = pd.DataFrame({
+        'timestamp': pd.to_datetime(columns['timestamp'], unit='us'),
+        'element_name': pd.Categorical.from_codes(columns['element'], categories=element_names),
+        'domain': pd.Categorical.from_codes(domain_codes[columns['element']], categories=domains),
+        'kpi_code': pd.Categorical.from_codes(columns['kpi'], categories=kpi_codes),
+        'value': columns['value'],
+        'quality_score': columns['quality_score'],
+    })
+    df.attrs['units'] = dict(zip(kpi_codes.tolist(), kpi_units.tolist()))
+    return df
+
+
+def _write_array(archive, name, array):
+    with archive.open(f'{name}.npy', 'w') as f:
+        np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
@@ -0,0 +1,386 @@
+"""
+Asyncio ingest gateway
+Standalone server for collectors that stream measurements over long-lived
+connections instead of one HTTP request per value. It speaks a line protocol
+over plain TCP and the same protocol inside WebSocket text messages, parses
+and validates records on the event loop, batches them and hands each batch
+to a single writer thread that stores it through the normal ingest path
+(or appends it to the ingest queue when INGEST_QUEUE_ENABLED is set).
+No WSGI threads are involved, and a full batch queue stops reading from the
+sockets, so slow storage pushes back on collectors instead of buffering
+without bound.
+
+Protocol (one record per line, UTF-8):
+
+    AUTH <token>                                  first line when a token is configured
+    <element_name> <kpi_code> <value> [<timestamp>]
+    {"element_name": ..., "kpi_code": ..., "value": ..., "timestamp": ...}
+
+Timestamps are ISO 8601 or epoch seconds. Blank lines and lines starting with
+'#' are ignored. The server answers with:
+
+    ERR <seq> <message>    record number <seq> on this connection was rejected
+    ACK <seq>              every record up to <seq> has been processed
+"""
+import asyncio
+import hmac
+import json
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import (AcceptConnection, BytesMessage, CloseConnection, Ping,
+                            RejectConnection, Request, TextMessage)
+
+from app import db
+from app.services.ingest import IngestError, ingest_measurements, parse_timestamp, prepare_measurements
+from app.services.ingest_queue import enqueue_measurements
+
+WEBSOCKET_PATH = '/ingest'
+_STOP = object()  # queued by MeasurementBatcher.stop() behind every submitted record
+
+
+def parse_line(line):
+    """Parse one protocol line into a measurement record (None for blank/comment lines)"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise IngestError('Invalid JSON record')
+        if not isinstance(record, dict):
+            raise IngestError('Measurement must be an object')
+    else:
+        fields = line.split()
+        if len(fields) not in (3, 4):
+            raise IngestError('Expected: <element_name> <kpi_code> <value> [<timestamp>]')
+        record = {'element_name': fields[0], 'kpi_code': fields[1], 'value': fields[2]}
+        if len(fields) == 4:
+            try:
+                record['timestamp'] = float(fields[3])
+            except ValueError:
+                record['timestamp'] = fields[3]
+
+    # Syntax checks here; names are resolved against the database by the writer
+    for field in ('element_name', 'kpi_code', 'value'):
+        if field not in record:
+            raise IngestError(f'Missing required field: {field}')
+    for field in ('element_name', 'kpi_code'):
+        if not isinstance(record[field], str):
+            raise IngestError(f'{field} must be a string')
+    try:
+        record['value'] = float(record['value'])
+    except (TypeError, ValueError):
+        raise IngestError('Invalid value')
+    if record.get('timestamp') is not None:
+        record['timestamp'] = parse_timestamp(record['timestamp'])
+    return record
+
+
+class CollectorConnection:
+    """Per-connection state shared by the TCP and WebSocket transports"""
+
+    def __init__(self, gateway, peer, send):
+        self.gateway = gateway
+        self.peer = peer
+        self._send = send
+        self.authenticated = not gateway.token
+        self.seq = 0
+        self.closed = False
+
+    def send(self, text):
+        if not self.closed:
+            self._send(text + '\n')
+
+    async def handle_line(self, line):
+        """Process one protocol line; returns False when the connection must close"""
+        if not self.authenticated:
+            parts = line.strip().split(None, 1)
+            if len(parts) == 2 and parts[0] == 'AUTH' and hmac.compare_digest(parts[1], self.gateway.token):
+                self.authenticated = True
+                self.send('OK')
+                return True
+            self.send('ERR 0 Authentication required')
+            return False
+
+        try:
+            record = parse_line(line)
+        except IngestError as e:
+            self.seq += 1
+            self.send(f'ERR {self.seq} {e}')
+            return True
+        if record is None:
+            return True
+        if record.get('timestamp') is None:
+            record['timestamp'] = datetime.utcnow()
+        self.seq += 1
+        await self.gateway.batcher.submit(self, self.seq, record)
+        return True
+
+
+class MeasurementBatcher:
+    """Collects records from all connections and writes them in batches"""
+
+    def __init__(self, app, batch_size, flush_interval, queue_size):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        # One writer thread keeps batches ordered and the database load bounded
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-writer')
+        self.stored = 0
+        self.rejected = 0
+
+    async def submit(self, connection, seq, record):
+        await self.queue.put((connection, seq, record))
+
+    async def stop(self):
+        """Make run() write everything submitted so far and return"""
+        await self.queue.put(_STOP)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    item = self.queue.get_nowait()
+                elif (timeout := deadline - loop.time()) <= 0:
+                    break
+                else:
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            # A batch taken off the queue is always written, also when stopping
+            await self.flush(batch)
+
+    async def drain(self):
+        """Write everything still queued (used on shutdown)"""
+        batch = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is _STOP:
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                await self.flush(batch)
+                batch = []
+        if batch:
+            await self.flush(batch)
+
+    async def flush(self, batch):
+        loop = asyncio.get_running_loop()
+        records = [record for _, _, record in batch]
+        try:
+            errors = await loop.run_in_executor(self.executor, self._write, records)
+        except Exception:
+            self.app.logger.exception(f'Ingest gateway failed to write {len(batch)} measurements; retrying one by one')
+            errors = await loop.run_in_executor(self.executor, self._write_each, records)
+
+        for error in errors:
+            connection, seq, _ = batch[error['index']]
+            connection.send(f'ERR {seq} {error["error"]}')
+        self.rejected += len(errors)
+        self.stored += len(batch) - len(errors)
+
+        last_seq = {}
+        for connection, seq, _ in batch:
+            last_seq[connection] = seq
+        for connection, seq in last_seq.items():
+            connection.send(f'ACK {seq}')
+
+    def _write(self, records):
+        """Validate and store one batch (runs on the writer thread)"""
+        with self.app.app_context():
+            try:
+                rows, errors = prepare_measurements(records)
+                if self.app.config.get('INGEST_QUEUE_ENABLED'):
+                    enqueue_measurements(rows)
+                else:
+                    ingest_measurements(rows)
+                db.session.commit()
+                return errors
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+    def _write_each(self, records):
+        """Store records one at a time so a bad record only fails itself"""
+        errors = []
+        for index, record in enumerate(records):
+            try:
+                errors += [{'index': index, 'error': e['error']} for e in self._write([record])]
+            except Exception:
+                self.app.logger.exception('Ingest gateway failed to write a measurement')
+                errors.append({'index': index, 'error': 'Write failed, resend'})
+        return errors
+
+
+class IngestGateway:
+    """TCP line-protocol and WebSocket servers feeding one MeasurementBatcher"""
+
+    def __init__(self, app, host=None, port=None, ws_port=None):
+        cfg = app.config
+        self.app = app
+        self.host = host or cfg.get('INGEST_GATEWAY_HOST', '0.0.0.0')
+        self.port = cfg.get('INGEST_GATEWAY_PORT', 5100) if port is None else port
+        self.ws_port = cfg.get('INGEST_GATEWAY_WS_PORT', 5101) if ws_port is None else ws_port
+        self.token = cfg.get('INGEST_GATEWAY_TOKEN') or ''
+        self.max_line = cfg.get('INGEST_GATEWAY_MAX_LINE', 65536)
+        self.batcher = MeasurementBatcher(
+            app,
+            batch_size=cfg.get('INGEST_GATEWAY_BATCH_SIZE', 1000),
+            flush_interval=cfg.get('INGEST_GATEWAY_FLUSH_INTERVAL', 0.2),
+            queue_size=cfg.get('INGEST_GATEWAY_QUEUE_SIZE', 50000),
+        )
+        self.servers = []
+        self.connections = {}  # CollectorConnection -> (writer, handler task)
+
+    async def start(self):
+        self.servers.append(await asyncio.start_server(
+            self.handle_tcp, self.host, self.port, limit=self.max_line))
+        if self.ws_port:
+            self.servers.append(await asyncio.start_server(
+                self.handle_websocket, self.host, self.ws_port, limit=self.max_line))
+        self._batcher_task = asyncio.create_task(self.batcher.run())
+        for server in self.servers:
+            for sock in server.sockets:
+                self.app.logger.info(f'Ingest gateway listening on {sock.getsockname()}')
+
+    async def stop(self):
+        """Stop accepting, close collector connections and write every record already received"""
+        for server in self.servers:
+            server.close()
+        # Closing the transports ends the handlers, so nothing is submitted after the batcher stops
+        handlers = []
+        for writer, task in list(self.connections.values()):
+            writer.close()
+            handlers.append(task)
+        await asyncio.gather(*handlers, return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        await self.batcher.stop()
+        await self._batcher_task
+        await self.batcher.drain()
+        self.batcher.executor.shutdown(wait=True)
+
+    async def serve_forever(self):
+        """Run until SIGINT/SIGTERM, then flush queued measurements and exit"""
+        await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+        await stop.wait()
+        await self.stop()
+
+    async def handle_tcp(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        connection = CollectorConnection(self, peer, lambda text: writer.write(text.encode()))
+        self.connections[connection] = (writer, asyncio.current_task())
+        try:
+            while True:
+                try:
+                    raw = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    connection.send('ERR 0 Line too long')
+                    break
+                if not raw:
+                    break
+                if not await connection.handle_line(raw.decode('utf-8', errors='replace')):
+                    break
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            await self._close(connection, writer)
+
+    async def handle_websocket(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        ws = WSConnection(ConnectionType.SERVER)
+        connection = CollectorConnection(
+            self, peer, lambda text: writer.write(ws.send(TextMessage(data=text))))
+        connection.closed = True  # until the handshake completes
+        self.connections[connection] = (writer, asyncio.current_task())
+        message = []
+        try:
+            while True:
+                data = await reader.read(self.max_line)
+                if not data:
+                    break
+                ws.receive_data(data)
+                open_ = True
+                for event in ws.events():
+                    if isinstance(event, Request):
+                        if event.target.split('?', 1)[0] != WEBSOCKET_PATH:
+                            writer.write(ws.send(RejectConnection(status_code=404)))
+                            open_ = False
+                            break
+                        writer.write(ws.send(AcceptConnection()))
+                        connection.closed = False
+                    elif isinstance(event, (TextMessage, BytesMessage)):
+                        chunk = event.data if isinstance(event.data, str) else event.data.decode('utf-8', 'replace')
+                        message.append(chunk)
+                        if not event.message_finished:
+                            continue
+                        text, message = ''.join(message), []
+                        for line in _message_lines(text):
+                            if not await connection.handle_line(line):
+                                writer.write(ws.send(CloseConnection(code=1008)))
+                                open_ = False
+                                break
+                    elif isinstance(event, Ping):
+                        writer.write(ws.send(event.response()))
+                    elif isinstance(event, CloseConnection):
+                        connection.closed = True
+                        writer.write(ws.send(event.response()))
+                        open_ = False
+                    if not open_:
+                        break
+                await writer.drain()
+                if not open_:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            await self._close(connection, writer)
+
+    async def _close(self, connection, writer):
+        connection.closed = True
+        self.connections.pop(connection, None)
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+def _message_lines(text):
+    """Protocol lines in a WebSocket message (a JSON array counts as one line per item)"""
+    stripped = text.strip()
+    if stripped.startswith('['):
+        try:
+            items = json.loads(stripped)
+        except ValueError:
+            return [stripped]
+        return [json.dumps(item) if isinstance(item, dict) else str(item) for item in items]
+    return text.splitlines()
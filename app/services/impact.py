@@ -0,0 +1,195 @@
+"""
+Impact and root-cause analysis over the topology
+Links point from the RAN towards the internet, so an element depends on every
+element it can reach: when one of those degrades, its traffic is affected.
+Reachability is precomputed per topology version as a bit matrix over the
+strongly connected components of the link graph (row c = components reachable
+from c, packed with np.packbits), which turns both questions into a few vector
+operations:
+
+- impact of X: every element whose row has X's bit set (depends on X)
+- root cause of alarming elements A: the elements most of A depend on,
+  preferring those whose dependents are mostly alarming
+"""
+import threading
+
+import numpy as np
+
+from app.services.topology import get_topology_graph
+
+
+class Reachability:
+    """Transitive closure of a TopologyGraph over its strongly connected components"""
+
+    def __init__(self, graph):
+        self.version = graph.version
+        self.element_ids = np.array(sorted(graph.nodes), dtype=np.int64)
+        self.index = {element_id: i for i, element_id in enumerate(self.element_ids.tolist())}
+        n = len(self.element_ids)
+
+        successors = [[] for _ in range(n)]
+        for link in graph.links.values():
+            source, target = self.index.get(link['source']), self.index.get(link['target'])
+            if source is not None and target is not None:
+                successors[source].append(target)
+
+        # Components come out of Tarjan's algorithm in reverse topological
+        # order: every component only reaches components numbered before it
+        self.component = _strongly_connected_components(successors)
+        count = int(self.component.max()) + 1 if n else 0
+        self.sizes = np.bincount(self.component, minlength=count)
+        self.members = np.argsort(self.component, kind='stable')
+        self.member_offsets = np.concatenate(([0], np.cumsum(self.sizes)))
+
+        component = self.component.tolist()
+        component_successors = [set() for _ in range(count)]
+        for source, targets in enumerate(successors):
+            for target in targets:
+                if component[source] != component[target]:
+                    component_successors[component[source]].add(component[target])
+
+        width = (count + 7) // 8
+        self.reach = np.zeros((count, width), dtype=np.uint8)
+        for c in range(count):
+            row = self.reach[c]
+            row[c >> 3] |= 0x80 >> (c & 7)
+            for d in component_successors[c]:
+                np.bitwise_or(row, self.reach[d], out=row)
+
+    def dependents(self, components):
+        """Number of elements depending on each component (its own members included)"""
+        components = np.asarray(components, dtype=np.int64)
+        bits = (self.reach[:, components >> 3] & (0x80 >> (components & 7)).astype(np.uint8)) != 0
+        return self.sizes @ bits
+
+    def _column(self, c):
+        """Mask of components that reach component c"""
+        return (self.reach[:, c >> 3] & (0x80 >> (c & 7))) != 0
+
+    def _row(self, c):
+        """Mask of components reachable from component c"""
+        return np.unpackbits(self.reach[c], count=len(self.sizes)).astype(bool)
+
+    def _elements(self, component_mask):
+        """Element ids of the components in a mask"""
+        components = np.flatnonzero(component_mask)
+        if not len(components):
+            return []
+        spans = [self.members[self.member_offsets[c]:self.member_offsets[c + 1]] for c in components]
+        return sorted(self.element_ids[np.concatenate(spans)].tolist())
+
+    def affected_by(self, element_id):
+        """Elements depending on element_id (their paths to the internet cross it)"""
+        c = self.component[self.index[element_id]]
+        return [e for e in self._elements(self._column(c)) if e != element_id]
+
+    def depends_on(self, element_id):
+        """Elements on the paths from element_id towards the internet"""
+        c = self.component[self.index[element_id]]
+        return [e for e in self._elements(self._row(c)) if e != element_id]
+
+    def root_causes(self, element_ids, limit=10):
+        """Rank elements that could explain all or most of element_ids
+
+        Each candidate is an element that alarming elements depend on (or one
+        of them). Candidates are ranked by how many alarming elements they
+        explain, then by precision: the share of the candidate's dependents
+        that are alarming, so a shared gateway ranks below the router the
+        alarms actually sit behind.
+        """
+        alarming = sorted({self.index[e] for e in element_ids})
+        if not alarming:
+            return []
+        alarming_components = self.component[alarming]
+        rows = np.unpackbits(self.reach[alarming_components], axis=1, count=len(self.sizes))
+        coverage = rows.sum(axis=0, dtype=np.int64)
+
+        candidates = np.flatnonzero(coverage)
+        # Only candidates tied with or above the limit-th best coverage can
+        # make the list, so precision is computed for those alone
+        cutoff = np.sort(coverage[candidates])[::-1][min(limit, len(candidates)) - 1]
+        candidates = candidates[coverage[candidates] >= cutoff]
+        precision = coverage[candidates] / self.dependents(candidates)
+        order = np.lexsort((candidates, -precision, -coverage[candidates]))
+
+        ranked = []
+        for position in order:
+            c = candidates[position]
+            members = self.element_ids[self.members[self.member_offsets[c]:self.member_offsets[c + 1]]].tolist()
+            explained = self.element_ids[np.asarray(alarming)[rows[:, c].astype(bool)]].tolist()
+            for element_id in sorted(members):
+                ranked.append({
+                    'element_id': element_id,
+                    'coverage': int(coverage[c]),
+                    'coverage_ratio': float(coverage[c] / len(alarming)),
+                    'precision': float(precision[position]),
+                    'explains': explained
+                })
+                if len(ranked) >= limit:
+                    return ranked
+        return ranked
+
+
+def _strongly_connected_components(successors):
+    """Component number of every node (iterative Tarjan), reverse topological order"""
+    n = len(successors)
+    index = [-1] * n
+    lowlink = [0] * n
+    component = [-1] * n
+    on_stack = [False] * n
+    stack = []
+    counter = 0
+    count = 0
+
+    for root in range(n):
+        if index[root] >= 0:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, edge = work.pop()
+            if edge == 0:
+                index[node] = lowlink[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            targets = successors[node]
+            while edge < len(targets):
+                target = targets[edge]
+                edge += 1
+                if index[target] < 0:
+                    work.append((node, edge))
+                    work.append((target, 0))
+                    break
+                if on_stack[target] and index[target] < lowlink[node]:
+                    lowlink[node] = index[target]
+            else:
+                if lowlink[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component[member] = count
+                        if member == node:
+                            break
+                    count += 1
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+    return np.array(component, dtype=np.int64)
+
+
+_reachability = None
+_reachability_lock = threading.Lock()
+
+
+def get_reachability(graph=None):
+    """Reachability of the current topology, rebuilt when its version moves"""
+    global _reachability
+    graph = graph or get_topology_graph()
+    reachability = _reachability
+    if reachability is not None and reachability.version == graph.version:
+        return reachability
+    with _reachability_lock:
+        if _reachability is None or _reachability.version != graph.version:
+            _reachability = Reachability(graph)
+        return _reachability
@@ -0,0 +1,217 @@
+"""
+KPI measurement ingestion
+Single write path for measurements: rows are stored through the partition
+router and every derived table is updated in the same transaction, so the
+API, bulk loaders and background workers all keep them consistent.
+
+Measurements carry the collector's own timestamp and are unique per
+(element, kpi, timestamp), so a retried or re-sent batch is idempotent and
+buffered data lands at the time it was measured, however late it arrives.
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from flask import current_app
+
+from app import db
+from app.models.network import NetworkElement, KPIDefinition, Alert
+from app.services.evaluation import get_evaluator
+from app.services.latest import apply_latest
+from app.services.partitioning import insert_measurements, measurement_source
+from app.services.rollups import apply_rollups, recompute_rollups, bucket_start
+from app.services.sketches import apply_sketches
+
+CONFLICT_MODES = ('ignore', 'update')
+
+
+class IngestError(ValueError):
+    """A measurement record that cannot be ingested"""
+
+
+def parse_timestamp(value):
+    """Parse a collector timestamp into a naive UTC datetime
+
+    Accepts ISO 8601 strings (with or without an offset or trailing Z) and
+    Unix epoch seconds. Naive ISO strings are taken to be UTC.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, bool):
+        raise IngestError(f'Invalid timestamp: {value!r}')
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            raise IngestError(f'Invalid timestamp: {value!r}')
+    if isinstance(value, str):
+        text = value.strip()
+        if text.endswith(('Z', 'z')):
+            text = text[:-1] + '+00:00'
+        try:
+            ts = datetime.fromisoformat(text)
+        except ValueError:
+            raise IngestError(f'Invalid timestamp: {value!r}')
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        return ts
+    raise IngestError(f'Invalid timestamp: {value!r}')
+
+
+def prepare_measurements(records, now=None):
+    """Validate API records and resolve them into measurement rows
+
+    Records reference elements and KPIs by element_name and kpi_code and may
+    carry a timestamp; records without one are stamped with the arrival time.
+    Returns (rows, errors) where errors is a list of {'index', 'error'} and
+    rows keep a '_index' key pointing back at the source record.
+    """
+    now = now or datetime.utcnow()
+    max_skew = timedelta(seconds=current_app.config.get('INGEST_MAX_FUTURE_SKEW', 300))
+
+    # Malformed names and codes stay out of the lookups and fail per record below
+    valid = [r for r in records if isinstance(r, dict)]
+    names = {r.get('element_name') for r in valid if isinstance(r.get('element_name'), str)}
+    codes = {r.get('kpi_code') for r in valid if isinstance(r.get('kpi_code'), str)}
+    elements = {e.element_name: e for e in NetworkElement.query.filter(NetworkElement.element_name.in_(names))}
+    kpi_defs = {k.kpi_code: k for k in KPIDefinition.query.filter(KPIDefinition.kpi_code.in_(codes))}
+
+    rows = []
+    errors = []
+    for index, record in enumerate(records):
+        try:
+            if not isinstance(record, dict):
+                raise IngestError('Measurement must be an object')
+            for field in ('element_name', 'kpi_code', 'value'):
+                if field not in record:
+                    raise IngestError(f'Missing required field: {field}')
+            for field in ('element_name', 'kpi_code'):
+                if not isinstance(record[field], str):
+                    raise IngestError(f'{field} must be a string')
+            element = elements.get(record['element_name'])
+            if not element:
+                raise IngestError('Invalid element name')
+            kpi_def = kpi_defs.get(record['kpi_code'])
+            if not kpi_def:
+                raise IngestError('Invalid KPI code')
+            try:
+                value = float(record['value'])
+            except (TypeError, ValueError):
+                raise IngestError('Invalid value')
+
+            ts = parse_timestamp(record['timestamp']) if record.get('timestamp') is not None else now
+            if ts > now + max_skew:
+                raise IngestError('Timestamp is in the future')
+        except IngestError as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+
+        rows.append({
+            '_index': index,
+            'element_id': element.id,
+            'kpi_id': kpi_def.id,
+            'value': value,
+            'timestamp': ts,
+        })
+    return rows, errors
+
+
+def ingest_measurements(rows, on_conflict='ignore'):
+    """Store measurement rows (dicts) and update derived data
+
+    Each row needs element_id, kpi_id, value and timestamp; quality_score is
+    computed in one vectorized pass when not given. Points already stored for
+    the same (element, kpi, timestamp) are skipped with on_conflict='ignore'
+    or overwritten with 'update'. Rows repeated within the batch collapse to
+    the last one.
+
+    The caller owns the transaction and must commit. Returns the stored ids
+    in input order, None for skipped rows.
+    """
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f'Unknown on_conflict mode: {on_conflict}')
+    if not rows:
+        return []
+
+    # Collapse duplicates inside the batch (last write wins)
+    latest = {}
+    for position, row in enumerate(rows):
+        latest[(row['element_id'], row['kpi_id'], row['timestamp'])] = position
+    unique_rows = [
+        {
+            'element_id': row['element_id'],
+            'kpi_id': row['kpi_id'],
+            'value': row['value'],
+            'timestamp': row['timestamp'],
+            'quality_score': row.get('quality_score'),
+        }
+        for position, row in enumerate(rows)
+        if latest[(row['element_id'], row['kpi_id'], row['timestamp'])] == position
+    ]
+
+    kpi_ids = [row['kpi_id'] for row in unique_rows]
+    scores, critical = get_evaluator(set(kpi_ids)).evaluate(kpi_ids, [row['value'] for row in unique_rows])
+    for row, score in zip(unique_rows, scores):
+        if row['quality_score'] is None and not np.isnan(score):
+            row['quality_score'] = float(score)
+
+    existing = set()
+    if on_conflict == 'update':
+        existing = existing_series_points(unique_rows)
+
+    stored_ids = insert_measurements(unique_rows, on_conflict=on_conflict)
+    is_new = [new_id is not None and _series_key(row) not in existing
+              for row, new_id in zip(unique_rows, stored_ids)]
+
+    new_rows = [row for row, new in zip(unique_rows, is_new) if new]
+    apply_rollups(new_rows)
+    apply_sketches(new_rows)
+    apply_latest([row for row, new_id in zip(unique_rows, stored_ids) if new_id is not None])
+    if existing:
+        recompute_rollups({(e, k, bucket_start(ts, '1d')) for e, k, ts in existing})
+    _raise_alerts([row for row, new, crit in zip(unique_rows, is_new, critical) if new and crit])
+
+    ids_by_key = {_series_key(row): new_id for row, new_id in zip(unique_rows, stored_ids)}
+    return [
+        ids_by_key.get(_series_key(row)) if latest[_series_key(row)] == position else None
+        for position, row in enumerate(rows)
+    ]
+
+
+def _series_key(row):
+    return row['element_id'], row['kpi_id'], row['timestamp']
+
+
+def existing_series_points(rows):
+    """Series keys of rows that are already stored"""
+    start = min(row['timestamp'] for row in rows)
+    end = max(row['timestamp'] for row in rows) + timedelta(microseconds=1)
+    measurement = measurement_source(start, end)
+    keys = {_series_key(row) for row in rows}
+    stored = db.session.query(measurement.element_id, measurement.kpi_id, measurement.timestamp).filter(
+        measurement.element_id.in_({k[0] for k in keys}),
+        measurement.kpi_id.in_({k[1] for k in keys}),
+        measurement.timestamp >= start,
+        measurement.timestamp < end
+    )
+    return {tuple(row) for row in stored} & keys
+
+
+def _raise_alerts(rows):
+    """Create threshold alerts for newly stored critical values"""
+    if not rows:
+        return
+    kpi_defs = {k.id: k for k in KPIDefinition.query.filter(KPIDefinition.id.in_({r['kpi_id'] for r in rows}))}
+    now = datetime.utcnow()
+    for row in rows:
+        kpi_def = kpi_defs.get(row['kpi_id'])
+        if kpi_def:
+            db.session.add(Alert(
+                element_id=row['element_id'],
+                kpi_id=kpi_def.id,
+                alert_type='kpi_threshold',
+                severity='high',
+                message=f'Critical {kpi_def.kpi_name} value: {row["value"]:g} {kpi_def.unit or ""}',
+                created_at=now
+            ))
@@ -0,0 +1,290 @@
+"""
+Queue-based measurement ingestion
+With INGEST_QUEUE_ENABLED the API and the ingest gateway only validate
+measurements and append them to a durable queue; `flask ingest-worker`
+processes consume it in batches and store them through the normal ingest
+path. Workers share one consumer group, so each entry goes to exactly one
+worker and adding workers adds write throughput.
+
+Redis Streams are used when REDIS_URL is reachable; otherwise the
+`ingest_queue` table stands in for local development and single-node setups.
+Entries are acknowledged only after the measurements are committed. Entries
+of a crashed worker are redelivered after INGEST_QUEUE_VISIBILITY_TIMEOUT,
+which is safe because measurement writes are idempotent.
+"""
+import json
+import os
+import signal
+import socket
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, select, update
+
+from app import db
+from app.models.ingest import IngestQueueEntry
+from app.services.ingest import ingest_measurements
+
+
+def encode_entry(rows, on_conflict='ignore'):
+    """Serialize measurement rows (as produced by prepare_measurements) for the queue"""
+    return json.dumps({
+        'on_conflict': on_conflict,
+        'rows': [
+            {
+                'element_id': row['element_id'],
+                'kpi_id': row['kpi_id'],
+                'value': row['value'],
+                'timestamp': row['timestamp'].isoformat(),
+                'quality_score': row.get('quality_score'),
+            }
+            for row in rows
+        ],
+    })
+
+
+def decode_entry(payload):
+    """Inverse of encode_entry; returns (rows, on_conflict)"""
+    data = json.loads(payload)
+    rows = data['rows']
+    for row in rows:
+        row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+    return rows, data.get('on_conflict', 'ignore')
+
+
+class RedisStreamQueue:
+    """Ingest queue on a Redis stream with a consumer group"""
+
+    backend = 'redis'
+
+    def __init__(self, client, stream, group, visibility_timeout):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.visibility_timeout = visibility_timeout
+        self._group_ready = False
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        import redis
+        try:
+            self.client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    def publish(self, rows, on_conflict='ignore'):
+        if rows:
+            self.client.xadd(self.stream, {'payload': encode_entry(rows, on_conflict)})
+
+    def read(self, consumer, count, block_ms):
+        """Up to count (entry_id, payload) pairs for this consumer"""
+        self._ensure_group()
+        # Take over entries a crashed consumer never acknowledged
+        claimed = self.client.xautoclaim(
+            self.stream, self.group, consumer,
+            min_idle_time=int(self.visibility_timeout * 1000), start_id='0-0', count=count
+        )
+        messages = claimed[1]
+        if not messages:
+            response = self.client.xreadgroup(self.group, consumer, {self.stream: '>'},
+                                              count=count, block=block_ms or None)
+            messages = response[0][1] if response else []
+        return [(entry_id, fields[b'payload'].decode()) for entry_id, fields in messages if fields]
+
+    def ack(self, entry_ids):
+        if entry_ids:
+            pipe = self.client.pipeline()
+            pipe.xack(self.stream, self.group, *entry_ids)
+            pipe.xdel(self.stream, *entry_ids)
+            pipe.execute()
+
+    def dead_letter(self, entry_id, payload, error):
+        self.client.xadd(f'{self.stream}:dead', {'payload': payload, 'error': error})
+        self.ack([entry_id])
+
+    def pending(self):
+        self._ensure_group()
+        return self.client.xlen(self.stream)
+
+
+class DatabaseQueue:
+    """Ingest queue on the ingest_queue table"""
+
+    backend = 'database'
+
+    def __init__(self, visibility_timeout, poll_interval=0.2):
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+
+    def publish(self, rows, on_conflict='ignore'):
+        """Add an entry to the current transaction (the caller commits)"""
+        if rows:
+            db.session.add(IngestQueueEntry(payload=encode_entry(rows, on_conflict)))
+
+    def read(self, consumer, count, block_ms):
+        deadline = time.monotonic() + (block_ms or 0) / 1000
+        while True:
+            entries = self._claim(consumer, count)
+            if entries or time.monotonic() >= deadline:
+                return entries
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def _claim(self, consumer, count):
+        now = datetime.utcnow()
+        claimable = or_(IngestQueueEntry.claimed_at.is_(None),
+                        IngestQueueEntry.claimed_at < now - timedelta(seconds=self.visibility_timeout))
+        candidates = select(IngestQueueEntry.id).where(
+            IngestQueueEntry.failed_at.is_(None), claimable
+        ).order_by(IngestQueueEntry.id).limit(count)
+        if db.engine.dialect.name == 'postgresql':
+            candidates = candidates.with_for_update(skip_locked=True)
+
+        ids = db.session.execute(candidates).scalars().all()
+        if ids:
+            # Re-check claimability so concurrent workers never share an entry
+            db.session.execute(update(IngestQueueEntry).where(
+                IngestQueueEntry.id.in_(ids), claimable
+            ).values(claimed_by=consumer, claimed_at=now,
+                     deliveries=IngestQueueEntry.deliveries + 1))
+        db.session.commit()
+        if not ids:
+            return []
+        rows = db.session.execute(select(IngestQueueEntry.id, IngestQueueEntry.payload).where(
+            IngestQueueEntry.id.in_(ids),
+            IngestQueueEntry.claimed_by == consumer,
+            IngestQueueEntry.claimed_at == now
+        ).order_by(IngestQueueEntry.id)).all()
+        db.session.commit()
+        return [(row.id, row.payload) for row in rows]
+
+    def ack(self, entry_ids):
+        if entry_ids:
+            IngestQueueEntry.query.filter(IngestQueueEntry.id.in_(entry_ids)).delete(synchronize_session=False)
+            db.session.commit()
+
+    def dead_letter(self, entry_id, payload, error):
+        db.session.execute(update(IngestQueueEntry).where(IngestQueueEntry.id == entry_id).values(
+            failed_at=datetime.utcnow(), error=error))
+        db.session.commit()
+
+    def pending(self):
+        return IngestQueueEntry.query.filter(IngestQueueEntry.failed_at.is_(None)).count()
+
+
+def _redis_client(url):
+    """Connected Redis client, or None when the server is not reachable"""
+    try:
+        import redis
+    except ImportError:
+        return None
+    try:
+        client = redis.Redis.from_url(url, socket_connect_timeout=1)
+        client.ping()
+        return client
+    except redis.RedisError:
+        return None
+
+
+def get_ingest_queue():
+    """Process-wide ingest queue for the configured backend"""
+    queue = current_app.extensions.get('ingest_queue')
+    if queue is not None:
+        return queue
+
+    cfg = current_app.config
+    backend = cfg.get('INGEST_QUEUE_BACKEND', 'auto')
+    visibility_timeout = cfg.get('INGEST_QUEUE_VISIBILITY_TIMEOUT', 60)
+    client = None
+    if backend in ('auto', 'redis'):
+        client = _redis_client(cfg.get('REDIS_URL'))
+        if client is None and backend == 'redis':
+            raise RuntimeError(f'Redis is not reachable at {cfg.get("REDIS_URL")}')
+    if client is not None:
+        queue = RedisStreamQueue(client, cfg.get('INGEST_QUEUE_STREAM', 'kpi:ingest'),
+                                 cfg.get('INGEST_QUEUE_GROUP', 'ingest-workers'), visibility_timeout)
+    else:
+        queue = DatabaseQueue(visibility_timeout)
+    current_app.extensions['ingest_queue'] = queue
+    return queue
+
+
+def enqueue_measurements(rows, on_conflict='ignore'):
+    """Append prepared measurement rows to the ingest queue"""
+    queue = get_ingest_queue()
+    queue.publish(rows, on_conflict)
+    return queue
+
+
+class IngestWorker:
+    """Consumes the ingest queue and stores measurements in batches"""
+
+    def __init__(self, queue=None, consumer=None, read_count=None, block_ms=None):
+        cfg = current_app.config
+        self.queue = queue or get_ingest_queue()
+        self.consumer = consumer or f'{socket.gethostname()}-{os.getpid()}'
+        self.read_count = read_count or cfg.get('INGEST_WORKER_READ_COUNT', 200)
+        self.block_ms = cfg.get('INGEST_WORKER_BLOCK_MS', 2000) if block_ms is None else block_ms
+        self.stopping = False
+        self.entries = 0
+        self.rows = 0
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self, max_idle=None):
+        """Process batches until stopped (SIGINT/SIGTERM) or idle for max_idle seconds"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                signal.signal(sig, self.stop)
+            except ValueError:  # not on the main thread
+                pass
+        idle_since = time.monotonic()
+        while not self.stopping:
+            if self.process_batch():
+                idle_since = time.monotonic()
+            elif max_idle is not None and time.monotonic() - idle_since >= max_idle:
+                break
+        return self.entries, self.rows
+
+    def process_batch(self):
+        """Read, store and acknowledge one batch; returns the number of entries handled"""
+        entries = self.queue.read(self.consumer, self.read_count, self.block_ms)
+        if not entries:
+            return 0
+        try:
+            self.rows += self._store([payload for _, payload in entries])
+            self.queue.ack([entry_id for entry_id, _ in entries])
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception(f'Ingest batch of {len(entries)} entries failed; retrying one by one')
+            for entry_id, payload in entries:
+                self._process_single(entry_id, payload)
+        self.entries += len(entries)
+        return len(entries)
+
+    def _process_single(self, entry_id, payload):
+        try:
+            self.rows += self._store([payload])
+            self.queue.ack([entry_id])
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception(f'Ingest queue entry {entry_id} failed; moved to dead letters')
+            self.queue.dead_letter(entry_id, payload, str(e))
+
+    @staticmethod
+    def _store(payloads):
+        """Store the rows of several entries in one transaction"""
+        by_mode = {}
+        for payload in payloads:
+            rows, on_conflict = decode_entry(payload)
+            by_mode.setdefault(on_conflict, []).extend(rows)
+        total = 0
+        for on_conflict, rows in by_mode.items():
+            ingest_measurements(rows, on_conflict=on_conflict)
+            total += len(rows)
+        db.session.commit()
+        return total
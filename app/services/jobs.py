@@ -0,0 +1,396 @@
+"""
+Background jobs
+Long-running reports, exports, chart renders and maintenance sweeps are
+queued in the `jobs` table; the web tier only enqueues them and answers with
+the job, which clients poll (GET /api/jobs/<id>) until its artifact can be
+downloaded. Jobs are executed by a JobWorker: a pool of threads started by
+the web server entry points (JOBS_IN_APP_WORKERS > 0) or by `flask worker`
+processes.
+
+- Claiming re-checks the job state in the UPDATE, so concurrent workers
+  never run the same job. A heartbeat thread keeps the running jobs of a
+  worker alive; jobs of a crashed worker are re-queued after
+  JOB_HEARTBEAT_TIMEOUT, up to JOB_MAX_ATTEMPTS runs.
+- Handlers report progress through JobContext.progress(), which is also
+  where cancellation takes effect (cooperative cancellation).
+- Handlers return an Artifact (written to JOB_ARTIFACT_DIR while streamed)
+  or a small JSON-serializable result. Finished jobs and their artifacts are
+  deleted JOB_RESULT_TTL seconds after they finish.
+"""
+import inspect
+import json
+import os
+import shutil
+import signal
+import socket
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+
+from app import db
+from app.models.jobs import Job
+
+Artifact = namedtuple('Artifact', 'filename mimetype chunks')
+JobType = namedtuple('JobType', 'func role cancellable')
+
+JOB_TYPES = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job was cancelled"""
+
+
+def job_type(name, role=None, cancellable=False):
+    """Register a job handler
+
+    role restricts who may enqueue it ('engineer' or 'admin'); cancellable
+    marks handlers that report progress and can therefore be stopped while
+    running (queued jobs of any type can be cancelled).
+    """
+    def decorator(func):
+        JOB_TYPES[name] = JobType(func, role, cancellable)
+        return func
+    return decorator
+
+
+def can_enqueue(user, name):
+    role = JOB_TYPES[name].role
+    if role == 'admin':
+        return user.has_role('admin')
+    if role == 'engineer':
+        return user.can_edit()
+    return True
+
+
+class JobContext:
+    """Progress reporting and cancellation checks for a running job"""
+
+    def __init__(self, job_id, min_interval=1.0):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_write = 0.0
+
+    def progress(self, fraction, message=None, force=False):
+        """Record progress (0..1); raises JobCancelled once cancellation was requested
+
+        Writes go through their own connection so a handler's open result
+        set (e.g. a streamed export) is left alone; they are throttled to one
+        every min_interval seconds.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        values = {'progress': max(0.0, min(1.0, float(fraction))), 'heartbeat_at': datetime.utcnow()}
+        if message is not None:
+            values['message'] = message[:255]
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == self.job_id).values(**values))
+            cancelled = connection.execute(select(Job.cancel_requested).where(Job.id == self.job_id)).scalar()
+        if cancelled:
+            raise JobCancelled()
+
+    def track(self, rows, start, end, every=1000):
+        """Pass rows through, reporting progress from their leading timestamp within [start, end]"""
+        span = (end - start).total_seconds() or 1.0
+        for count, row in enumerate(rows, 1):
+            if count % every == 0:
+                self.progress((row[0] - start).total_seconds() / span, f'{count} rows')
+            yield row
+
+
+def enqueue_job(name, params=None, user=None):
+    """Queue a job and return it (committed)
+
+    Raises ValueError for an unknown job type or params that do not match
+    the handler's keyword arguments.
+    """
+    if name not in JOB_TYPES:
+        raise ValueError(f'Unknown job type: {name}')
+    try:
+        inspect.signature(JOB_TYPES[name].func).bind(None, **(params or {}))
+    except TypeError as e:
+        raise ValueError(f'Invalid params for {name}: {e}')
+    job = Job(job_type=name, params=json.dumps(params or {}), status='queued',
+              created_by=user.id if user is not None else None, created_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def can_cancel(job):
+    """Whether cancelling the job can still take effect"""
+    return job.status == 'queued' or (job.status == 'running' and JOB_TYPES[job.job_type].cancellable)
+
+
+def cancel_job(job):
+    """Cancel a queued job at once; ask a running job to stop at its next progress report"""
+    if job.finished:
+        return job
+    db.session.execute(update(Job).where(Job.id == job.id, Job.status == 'queued').values(
+        status='cancelled', finished_at=datetime.utcnow(), expires_at=_expiry()))
+    db.session.execute(update(Job).where(Job.id == job.id, Job.status == 'running').values(
+        cancel_requested=True))
+    db.session.commit()
+    db.session.refresh(job)
+    return job
+
+
+def claim_job(worker):
+    """Mark the oldest runnable job as running for this worker and return its id (or None)
+
+    Running jobs without a heartbeat for JOB_HEARTBEAT_TIMEOUT belong to a
+    worker that died and are claimed again.
+    """
+    cfg = current_app.config
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=cfg.get('JOB_HEARTBEAT_TIMEOUT', 120))
+    claimable = or_(
+        Job.status == 'queued',
+        and_(Job.status == 'running', Job.heartbeat_at < stale)
+    )
+    candidates = select(Job.id).where(claimable).order_by(Job.created_at, Job.id).limit(5)
+    if db.engine.dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    for job_id in db.session.execute(candidates).scalars().all():
+        claimed = db.session.execute(update(Job).where(Job.id == job_id, claimable).values(
+            status='running', claimed_by=worker, started_at=now, heartbeat_at=now,
+            attempts=Job.attempts + 1, progress=0.0, message=None
+        )).rowcount
+        if claimed:
+            db.session.commit()
+            return job_id
+    db.session.commit()
+    return None
+
+
+def execute_job(job_id):
+    """Run a claimed job to completion and record its outcome"""
+    job = db.session.get(Job, job_id)
+    name, params, attempts = job.job_type, json.loads(job.params or '{}'), job.attempts
+    context = JobContext(job_id, current_app.config.get('JOB_PROGRESS_INTERVAL', 1.0))
+    directory = os.path.join(current_app.config['JOB_ARTIFACT_DIR'], str(job_id))
+    outcome = {'status': 'succeeded', 'progress': 1.0}
+    try:
+        if attempts > current_app.config.get('JOB_MAX_ATTEMPTS', 3):
+            raise RuntimeError('Job was interrupted too many times')
+        result = JOB_TYPES[name].func(context, **params)
+        if isinstance(result, Artifact):
+            outcome.update(_write_artifact(directory, result))
+        elif result is not None:
+            outcome['result'] = json.dumps(result, default=str)
+    except JobCancelled:
+        outcome = {'status': 'cancelled', 'message': 'Cancelled'}
+    except Exception as e:
+        current_app.logger.exception(f'Job {job_id} ({name}) failed')
+        outcome = {'status': 'failed', 'error': str(e) or e.__class__.__name__}
+    if outcome['status'] != 'succeeded':
+        shutil.rmtree(directory, ignore_errors=True)
+
+    db.session.rollback()
+    now = datetime.utcnow()
+    db.session.execute(update(Job).where(Job.id == job_id).values(
+        finished_at=now, expires_at=_expiry(now), **outcome))
+    db.session.commit()
+
+
+def _write_artifact(directory, artifact):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, os.path.basename(artifact.filename))
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in artifact.chunks:
+            f.write(chunk)
+            size += len(chunk)
+    return {'artifact_path': path, 'artifact_name': os.path.basename(path),
+            'artifact_mimetype': artifact.mimetype, 'artifact_size': size}
+
+
+def _expiry(now=None):
+    return (now or datetime.utcnow()) + timedelta(seconds=current_app.config.get('JOB_RESULT_TTL', 86400))
+
+
+def purge_expired_jobs(now=None):
+    """Delete finished jobs (and their artifacts) past their expiry; returns the number deleted"""
+    now = now or datetime.utcnow()
+    expired = db.session.execute(select(Job.id, Job.artifact_path).where(
+        Job.expires_at < now, Job.status.in_(('succeeded', 'failed', 'cancelled'))
+    )).all()
+    for _, path in expired:
+        if path:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    if expired:
+        Job.query.filter(Job.id.in_([job_id for job_id, _ in expired])).delete(synchronize_session=False)
+    db.session.commit()
+    return len(expired)
+
+
+class JobWorker:
+    """Pool of threads claiming and executing jobs"""
+
+    def __init__(self, app, threads=None, name=None):
+        cfg = app.config
+        self.app = app
+        self.threads = threads or cfg.get('JOB_WORKER_THREADS', 2)
+        self.name = name or f'{socket.gethostname()}-{os.getpid()}'
+        self.poll_interval = cfg.get('JOB_POLL_INTERVAL', 1.0)
+        self.heartbeat_interval = cfg.get('JOB_HEARTBEAT_INTERVAL', 30)
+        self.purge_interval = cfg.get('JOB_PURGE_INTERVAL', 600)
+        self.stopping = threading.Event()
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._pool = []
+
+    def start(self, max_idle=None):
+        """Start the worker threads and the heartbeat thread in the background"""
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._work, args=(max_idle,), name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._pool.append(thread)
+        threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True).start()
+        return self
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self, max_idle=None):
+        """Execute jobs until stopped (SIGINT/SIGTERM) or every thread was idle for max_idle seconds"""
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                signal.signal(sig, self.stop)
+            except ValueError:  # not on the main thread
+                pass
+        self.start(max_idle)
+        while any(thread.is_alive() for thread in self._pool):
+            for thread in self._pool:
+                thread.join(timeout=0.5)
+        self.stopping.set()
+        return self.completed
+
+    def _work(self, max_idle):
+        with self.app.app_context():
+            idle_since = time.monotonic()
+            while not self.stopping.is_set():
+                try:
+                    job_id = claim_job(self.name)
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.exception('Claiming a job failed')
+                    job_id = None
+                if job_id is not None:
+                    execute_job(job_id)
+                    with self._lock:
+                        self.completed += 1
+                    idle_since = time.monotonic()
+                elif max_idle is not None and time.monotonic() - idle_since >= max_idle:
+                    break
+                else:
+                    self.stopping.wait(self.poll_interval)
+            db.session.remove()
+
+    def _heartbeat(self):
+        with self.app.app_context():
+            last_purge = None
+            while not self.stopping.wait(self.heartbeat_interval):
+                try:
+                    db.session.execute(update(Job).where(
+                        Job.claimed_by == self.name, Job.status == 'running'
+                    ).values(heartbeat_at=datetime.utcnow()))
+                    db.session.commit()
+                    if last_purge is None or time.monotonic() - last_purge >= self.purge_interval:
+                        last_purge = time.monotonic()
+                        purge_expired_jobs()
+                except Exception:
+                    db.session.rollback()
+                    current_app.logger.exception('Job heartbeat failed')
+                finally:
+                    db.session.remove()
+
+
+def start_in_app_workers(app):
+    """Run a JobWorker inside the web process (JOBS_IN_APP_WORKERS threads)
+
+    Called by the web server entry points only (run_waitress.py, run.py and
+    the gunicorn post_worker_init hook), never by create_app(), so CLI
+    commands and scripts do not start workers. Returns None when disabled
+    or already running in this process.
+    """
+    threads = app.config.get('JOBS_IN_APP_WORKERS')
+    if not threads or 'job_worker' in app.extensions:
+        return app.extensions.get('job_worker')
+    worker = JobWorker(app, threads=threads).start()
+    app.extensions['job_worker'] = worker
+    return worker
+
+
+# ----------------------------------------------------------------------
+# Job types
+# ----------------------------------------------------------------------
+
+def _time_range_cutoff(time_range):
+    from app.services.charts import TIME_RANGES
+    span, _ = TIME_RANGES.get(time_range, TIME_RANGES['day'])
+    return datetime.utcnow() - span
+
+
+@job_type('kpi_export', cancellable=True)
+def run_kpi_export(job, time_range='day', domain=None, kpi_code=None, format='csv', compress=False):
+    """KPI measurement export (CSV, gzipped CSV or columnar npz) as an artifact"""
+    from app.services.export import kpi_export
+    if format not in ('csv', 'npz'):
+        raise ValueError('format must be csv or npz')
+    cutoff = _time_range_cutoff(time_range)
+    end = datetime.utcnow()
+    chunk_size = current_app.config.get('EXPORT_CHUNK_SIZE', 5000)
+    filename, mimetype, chunks = kpi_export(
+        cutoff, time_range, domain=domain, kpi_code=kpi_code, export_format=format, compress=compress,
+        chunk_size=chunk_size, track=lambda rows: job.track(rows, cutoff, end, every=chunk_size)
+    )
+    return Artifact(filename, mimetype, chunks)
+
+
+@job_type('chart')
+def run_chart(job, chart_type, time_range='day'):
+    """Report chart PNG as an artifact"""
+    from app.services.charts import chart_png
+    png = chart_png(chart_type, time_range, inline=True)
+    return Artifact(f"{chart_type}_{time_range}_{datetime.now().strftime('%Y%m%d')}.png", 'image/png', [png])
+
+
+@job_type('kpi_trends')
+def run_kpi_trends(job, kpi_code, time_range='month', element_id=None):
+    """KPI trend series from the rollups (JSON result)"""
+    from app.models.network import KPIDefinition
+    from app.services.rollups import TREND_ROLLUPS, regroup, rollup_series
+    interval = {'day': 'hourly', 'week': 'daily'}.get(time_range, 'weekly')
+    kpi = KPIDefinition.query.filter_by(kpi_code=kpi_code).first()
+    if kpi is None:
+        raise ValueError(f'Unknown KPI code: {kpi_code}')
+    resolution, group_width = TREND_ROLLUPS[interval]
+    trend = rollup_series(kpi.id, resolution, _time_range_cutoff(time_range), element_id=element_id)
+    if group_width:
+        trend = regroup(trend, group_width)
+    return {'kpi_code': kpi_code, 'interval': interval, 'trend': trend}
+
+
+@job_type('retention', role='admin', cancellable=True)
+def run_retention_sweep(job, vacuum=None):
+    """Retention purge of old measurements, alerts, rollups and sketches"""
+    from app.services.retention import RetentionService
+    return RetentionService(vacuum=vacuum, progress=job.progress).run()
+
+
+@job_type('quality_backfill', role='admin', cancellable=True)
+def run_quality_backfill(job, kpi_codes=None):
+    """Recompute stored quality scores (all KPIs or the given codes)"""
+    from app.models.network import KPIDefinition
+    from app.services.evaluation import backfill_quality_scores
+    kpi_ids = None
+    if kpi_codes:
+        kpi_ids = [k.id for k in KPIDefinition.query.filter(KPIDefinition.kpi_code.in_(kpi_codes))]
+    return {'rows_updated': backfill_quality_scores(kpi_ids, progress=job.progress)}
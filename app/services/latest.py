@@ -0,0 +1,139 @@
+"""
+Latest KPI values
+`kpi_latest` keeps the most recent measurement of every (element, kpi)
+series and is upserted on ingest, so "current value" lookups are primary-key
+reads instead of a max(timestamp) scan of kpi_measurements. Late data only
+replaces a stored value when it is at least as recent.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.models.network import KPIDefinition, KPILatest
+from app.services.partitioning import measurement_source
+from app.services.sql_helpers import upsert_insert
+
+
+def apply_latest(rows):
+    """Upsert measurement rows (dicts) into kpi_latest (caller commits)
+
+    Returns the number of series offered for update.
+    """
+    newest = {}
+    for row in rows:
+        key = (row['element_id'], row['kpi_id'])
+        current = newest.get(key)
+        if current is None or row['timestamp'] >= current['timestamp']:
+            newest[key] = row
+    if not newest:
+        return 0
+
+    now = datetime.utcnow()
+    values = [
+        {
+            'element_id': row['element_id'],
+            'kpi_id': row['kpi_id'],
+            'value': row['value'],
+            'timestamp': row['timestamp'],
+            'quality_score': row.get('quality_score'),
+            'updated_at': now,
+        }
+        # Deterministic order keeps concurrent upserts from deadlocking
+        for _, row in sorted(newest.items())
+    ]
+
+    table = KPILatest.__table__
+    stmt = upsert_insert(table)
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.element_id, table.c.kpi_id],
+        set_={
+            'value': new.value,
+            'timestamp': new.timestamp,
+            'quality_score': new.quality_score,
+            'updated_at': new.updated_at,
+        },
+        where=new.timestamp >= table.c.timestamp
+    )
+    db.session.execute(stmt, values)
+    return len(values)
+
+
+def latest_kpis_for(element_ids=None):
+    """Latest KPI values of many elements in one query
+
+    Returns {element_id: {kpi_code: {'value', 'timestamp', 'quality_score'}}};
+    element_ids=None fetches every element. Elements without measurements
+    are absent from the result.
+    """
+    query = _latest_query()
+    if element_ids is not None:
+        element_ids = list(element_ids)
+        if not element_ids:
+            return {}
+        query = query.filter(KPILatest.element_id.in_(element_ids))
+    return _by_element(query)
+
+
+def latest_values(kpi_codes):
+    """Latest values of a few KPIs: {kpi_code: (element_ids, values)} as lists"""
+    result = {code: ([], []) for code in kpi_codes}
+    query = db.session.query(KPIDefinition.kpi_code, KPILatest.element_id, KPILatest.value).join(
+        KPIDefinition, KPIDefinition.id == KPILatest.kpi_id
+    ).filter(KPIDefinition.kpi_code.in_(list(kpi_codes)), KPILatest.value.isnot(None))
+    for code, element_id, value in query:
+        result[code][0].append(element_id)
+        result[code][1].append(value)
+    return result
+
+
+def latest_watermark():
+    """Time of the most recent kpi_latest update (None when empty)"""
+    return db.session.query(func.max(KPILatest.updated_at)).scalar()
+
+
+def latest_kpis_changed_since(since):
+    """Latest KPI values updated after since, shaped like latest_kpis_for()"""
+    return _by_element(_latest_query().filter(KPILatest.updated_at > since))
+
+
+def _latest_query():
+    return db.session.query(
+        KPILatest.element_id, KPIDefinition.kpi_code,
+        KPILatest.value, KPILatest.timestamp, KPILatest.quality_score
+    ).join(KPIDefinition, KPIDefinition.id == KPILatest.kpi_id)
+
+
+def _by_element(query):
+    result = {}
+    for row in query:
+        result.setdefault(row.element_id, {})[row.kpi_code] = {
+            'value': row.value,
+            'timestamp': row.timestamp,
+            'quality_score': row.quality_score
+        }
+    return result
+
+
+def rebuild_latest():
+    """Recompute kpi_latest from raw measurements; returns the number of series"""
+    measurement = measurement_source()
+    ranked = select(
+        measurement.element_id, measurement.kpi_id, measurement.value,
+        measurement.timestamp, measurement.quality_score,
+        func.row_number().over(
+            partition_by=(measurement.element_id, measurement.kpi_id),
+            order_by=(measurement.timestamp.desc(), measurement.id.desc())
+        ).label('rn')
+    ).where(measurement.timestamp.isnot(None)).subquery('ranked')
+
+    table = KPILatest.__table__
+    KPILatest.query.delete(synchronize_session=False)
+    db.session.execute(insert(table).from_select(
+        ['element_id', 'kpi_id', 'value', 'timestamp', 'quality_score', 'updated_at'],
+        select(ranked.c.element_id, ranked.c.kpi_id, ranked.c.value, ranked.c.timestamp,
+               ranked.c.quality_score, func.current_timestamp()).where(ranked.c.rn == 1)
+    ))
+    db.session.commit()
+    return KPILatest.query.count()
@@ -0,0 +1,219 @@
+"""
+Topology layout
+Node coordinates computed on the server so the browser does not have to run a
+force simulation. Elements are laid out in one band of grid columns per
+domain, from the RAN to the internet, and ordered within a band by the
+barycenter of their neighbours in other bands (a few vectorized sweeps).
+
+Positions are stored in topology_positions so every process serves the same
+coordinates. When the topology version moves and only a few elements are new
+(or changed domain), existing positions are kept and the new elements are put
+on the free grid slot nearest to their neighbours; larger changes lay out the
+whole topology again.
+"""
+import math
+import threading
+from itertools import count
+
+import numpy as np
+from flask import current_app
+
+from app import db
+from app.models.network import TopologyPosition
+from app.services.sql_helpers import upsert_insert
+from app.services.topology import DOMAIN_ORDER
+
+SPACING = 40.0  # distance between neighbouring grid slots
+BAND_GAP = 3  # empty columns between domain bands
+SWEEPS = 4  # barycenter ordering passes
+
+
+class TopologyLayout:
+    """Positions of the elements of one topology version"""
+
+    def __init__(self, version, positions, placed):
+        self.version = version
+        self.positions = positions  # {element_id: (x, y)}
+        self.placed = placed  # {element_id: topology version when placed}
+
+    def position(self, element_id):
+        x, y = self.positions.get(element_id, (None, None))
+        return {'x': x, 'y': y}
+
+    def with_positions(self, nodes):
+        """Copies of node dicts with x/y added"""
+        return [dict(node, **self.position(node['id'])) for node in nodes]
+
+    def moved_since(self, version, exclude=()):
+        """Positions of elements placed after version, except those in exclude"""
+        exclude = set(exclude)
+        return [dict(id=element_id, **self.position(element_id))
+                for element_id, placed in self.placed.items() if placed > version and element_id not in exclude]
+
+
+def compute_layout(graph, sweeps=SWEEPS):
+    """Lay out every node of graph; returns {element_id: (domain, x, y)}"""
+    if not graph.nodes:
+        return {}
+    nodes = list(graph.nodes.values())
+    n = len(nodes)
+    ids = np.array([node['id'] for node in nodes], dtype=np.int64)
+    index = {node['id']: i for i, node in enumerate(nodes)}
+
+    domains = [node['domain'] for node in nodes]
+    band_keys = sorted(set(domains), key=_band_order)
+    band_index = {domain: i for i, domain in enumerate(band_keys)}
+    band = np.array([band_index[d] for d in domains], dtype=np.int64)
+    band_sizes = np.bincount(band, minlength=len(band_keys))
+
+    groups = [(node['subdomain'] or '', node['location'] or '') for node in nodes]
+    group_index = {g: i for i, g in enumerate(sorted(set(groups)))}
+    group = np.array([group_index[g] for g in groups], dtype=np.int64)
+
+    pairs = np.array([(index[l['source']], index[l['target']]) for l in graph.links.values()
+                      if l['source'] in index and l['target'] in index], dtype=np.int64).reshape(-1, 2)
+    cross = band[pairs[:, 0]] != band[pairs[:, 1]]
+    source, target = pairs[cross, 0], pairs[cross, 1]
+    degree = np.bincount(source, minlength=n) + np.bincount(target, minlength=n)
+
+    # Start from subdomain/location order, then pull each node towards the
+    # mean position of its neighbours in other bands
+    ranks, relative = _band_ranks(np.lexsort((ids, group, band)), band, band_sizes)
+    for _ in range(sweeps):
+        total = (np.bincount(source, weights=relative[target], minlength=n)
+                 + np.bincount(target, weights=relative[source], minlength=n))
+        barycenter = np.where(degree > 0, total / np.maximum(degree, 1), relative)
+        ranks, relative = _band_ranks(np.lexsort((ids, group, barycenter, band)), band, band_sizes)
+
+    # Fill each band row by row so the position in the ordering maps to y
+    height = math.ceil(math.sqrt(n))
+    columns = np.ceil(band_sizes / height).astype(np.int64)
+    rows = np.ceil(band_sizes / columns).astype(np.int64)
+    offsets = np.concatenate(([0], np.cumsum(columns + BAND_GAP)[:-1]))
+    x = (offsets[band] + ranks % columns[band]) * SPACING
+    y = (ranks // columns[band] + (height - rows[band]) // 2) * SPACING
+    return {int(i): (d, float(xi), float(yi)) for i, d, xi, yi in zip(ids, domains, x, y)}
+
+
+def place_nodes(positions, graph, element_ids):
+    """Add element_ids to an existing layout, next to their placed neighbours
+
+    positions is {element_id: (domain, x, y)} and is not modified. Returns
+    the positions of the new elements, or None when an element belongs to a
+    domain without a band (the topology needs a full layout).
+    """
+    occupied = set()
+    extents = {}
+    for domain, x, y in positions.values():
+        col, row = _slot(x, y)
+        occupied.add((col, row))
+        lo, hi, bottom = extents.get(domain, (col, col, row))
+        extents[domain] = (min(lo, col), max(hi, col), max(bottom, row))
+
+    placed = {}
+    for element_id in sorted(element_ids):
+        domain = graph.nodes[element_id]['domain']
+        if domain not in extents:
+            return None
+        lo, hi, bottom = extents[domain]
+        neighbours = [placed.get(m) or positions.get(m) for m in graph.neighbors(element_id)]
+        neighbours = [p for p in neighbours if p is not None]
+        if neighbours:
+            col, row = _slot(np.mean([p[1] for p in neighbours]), np.mean([p[2] for p in neighbours]))
+        else:
+            col, row = lo, bottom + 1
+        col, row = _free_slot(min(max(col, lo), hi), max(row, 0), lo, hi, occupied)
+        occupied.add((col, row))
+        extents[domain] = (lo, hi, max(bottom, row))
+        placed[element_id] = (domain, col * SPACING, row * SPACING)
+    return placed
+
+
+def load_layout(version):
+    rows = db.session.query(TopologyPosition.element_id, TopologyPosition.x,
+                            TopologyPosition.y, TopologyPosition.version).all()
+    return TopologyLayout(version, {r.element_id: (r.x, r.y) for r in rows},
+                          {r.element_id: r.version for r in rows})
+
+
+def sync_layout(graph, rebuild=False):
+    """Bring topology_positions up to date with graph and return its layout
+
+    Positions of removed elements are deleted. New elements are placed
+    incrementally unless they exceed TOPOLOGY_LAYOUT_REBUILD_FRACTION of the
+    topology, or rebuild is set. Concurrent processes may race here; rows
+    are inserted with ON CONFLICT DO NOTHING and re-read, so all of them end
+    up serving the stored positions.
+    """
+    stored = {r.element_id: r for r in db.session.query(
+        TopologyPosition.element_id, TopologyPosition.domain, TopologyPosition.x, TopologyPosition.y)}
+    stale = [i for i, r in stored.items() if i not in graph.nodes or r.domain != graph.nodes[i]['domain']]
+    stale_ids = set(stale)
+    kept = {i: (r.domain, r.x, r.y) for i, r in stored.items() if i not in stale_ids}
+    missing = [i for i in graph.nodes if i not in kept]
+
+    placed = None
+    if missing and not rebuild:
+        fraction = current_app.config.get('TOPOLOGY_LAYOUT_REBUILD_FRACTION', 0.1)
+        if len(missing) <= max(1, fraction * len(graph.nodes)):
+            placed = place_nodes(kept, graph, missing)
+    if rebuild or (missing and placed is None):
+        placed = compute_layout(graph)
+        db.session.query(TopologyPosition).delete(synchronize_session=False)
+    elif stale:
+        db.session.query(TopologyPosition).filter(
+            TopologyPosition.element_id.in_(stale)).delete(synchronize_session=False)
+    if placed:
+        stmt = upsert_insert(TopologyPosition.__table__).on_conflict_do_nothing(index_elements=['element_id'])
+        db.session.execute(stmt, [
+            {'element_id': i, 'domain': d, 'x': x, 'y': y, 'version': graph.version}
+            for i, (d, x, y) in sorted(placed.items())
+        ])
+    if stale or placed or rebuild:
+        db.session.commit()
+    return load_layout(graph.version)
+
+
+_layout = None
+_layout_lock = threading.Lock()
+
+
+def get_topology_layout(graph):
+    """Layout of graph, cached per topology version"""
+    global _layout
+    layout = _layout
+    if layout is not None and layout.version == graph.version:
+        return layout
+    with _layout_lock:
+        if _layout is None or _layout.version != graph.version:
+            _layout = sync_layout(graph)
+        return _layout
+
+
+def _band_order(domain):
+    return DOMAIN_ORDER.get(domain, len(DOMAIN_ORDER) + 1), domain or ''
+
+
+def _band_ranks(order, band, band_sizes):
+    """Rank of each node within its band, and the rank scaled to 0..1"""
+    sorted_band = band[order]
+    starts = np.searchsorted(sorted_band, sorted_band, side='left')
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order)) - starts
+    relative = ranks / np.maximum(band_sizes[band] - 1, 1)
+    return ranks, relative
+
+
+def _slot(x, y):
+    return int(round(x / SPACING)), int(round(y / SPACING))
+
+
+def _free_slot(col, row, lo, hi, occupied):
+    """Nearest unoccupied grid slot to (col, row) within columns lo..hi"""
+    for radius in count():
+        ring = [(col + dc, row + dr)
+                for dc in range(-radius, radius + 1) for dr in range(-radius, radius + 1)
+                if max(abs(dc), abs(dr)) == radius]
+        ring = [(c, r) for c, r in ring if lo <= c <= hi and r >= 0 and (c, r) not in occupied]
+        if ring:
+            return min(ring, key=lambda s: ((s[0] - col) ** 2 + (s[1] - row) ** 2, s))
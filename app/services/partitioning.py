@@ -0,0 +1,436 @@
+"""
+Time partitioning for KPI measurements
+
+PostgreSQL uses native declarative range partitioning: `kpi_measurements`
+becomes a partitioned parent with one partition per period plus a DEFAULT
+partition, and the planner prunes partitions for queries with a time cutoff.
+
+SQLite has no partitioning, so each period is stored in its own table
+(`kpi_measurements_pYYYYMMDD`) and this module routes reads and writes.
+The original `kpi_measurements` table acts as the default partition for rows
+whose period has no partition yet. Reads union the default table with only
+the partitions overlapping the requested time range.
+
+On both backends partitions are created (and rows moved out of the default
+partition) by maintenance, never on the write path, so ingestion does not
+take DDL locks. Dropping old data is a DROP TABLE instead of a DELETE.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import (Column, DateTime, Float, Index, Integer, MetaData, Table,
+                        insert, select, text, union_all)
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models.network import KPIMeasurement
+from app.services.sql_helpers import upsert_insert
+
+PARTITION_PREFIX = 'kpi_measurements_p'
+DEFAULT_PARTITION = 'kpi_measurements_default'
+PARTITION_INTERVALS = ('day', 'week', 'month')
+
+# Each SQLite partition starts its AUTOINCREMENT sequence at
+# <days since epoch> * ID_SPACING so ids stay unique across partitions
+ID_SPACING = 10 ** 12
+EPOCH = datetime(1970, 1, 1)
+
+
+class MeasurementPartitioner:
+    """Creates, lists, routes to and drops kpi_measurements partitions"""
+
+    def __init__(self, interval='month'):
+        if interval not in PARTITION_INTERVALS:
+            raise ValueError(f'Unsupported partition interval: {interval}')
+        self.interval = interval
+        self._metadata = MetaData()
+
+    # ------------------------------------------------------------------
+    # Period arithmetic
+    # ------------------------------------------------------------------
+
+    def period_start(self, ts):
+        """Start of the partition period containing ts"""
+        day = datetime(ts.year, ts.month, ts.day)
+        if self.interval == 'day':
+            return day
+        if self.interval == 'week':
+            return day - timedelta(days=day.weekday())
+        return datetime(ts.year, ts.month, 1)
+
+    def period_end(self, start):
+        """Exclusive end of the partition period starting at start"""
+        if self.interval == 'day':
+            return start + timedelta(days=1)
+        if self.interval == 'week':
+            return start + timedelta(days=7)
+        if start.month == 12:
+            return datetime(start.year + 1, 1, 1)
+        return datetime(start.year, start.month + 1, 1)
+
+    def periods_between(self, start, end):
+        """Start of every period overlapping [start, end)"""
+        periods = []
+        current = self.period_start(start)
+        while current < end:
+            periods.append(current)
+            current = self.period_end(current)
+        return periods
+
+    @staticmethod
+    def partition_name(start):
+        return f'{PARTITION_PREFIX}{start.strftime("%Y%m%d")}'
+
+    @staticmethod
+    def partition_start(name):
+        return datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m%d')
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    @property
+    def dialect(self):
+        return db.engine.dialect.name
+
+    @property
+    def native(self):
+        """True when the database partitions kpi_measurements itself"""
+        return self.dialect == 'postgresql'
+
+    def list_partitions(self, connection=None):
+        """Names of existing period partitions, oldest first"""
+        conn = connection or db.session
+        if self.native:
+            rows = conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'kpi_measurements' AND c.relname LIKE :prefix"
+            ), {'prefix': PARTITION_PREFIX + '%'})
+        else:
+            rows = conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix"
+            ), {'prefix': PARTITION_PREFIX + '%'})
+        return sorted(row[0] for row in rows)
+
+    def partitions_for_range(self, start=None, end=None, connection=None):
+        """Existing partitions overlapping [start, end)"""
+        names = []
+        for name in self.list_partitions(connection):
+            period_start = self.partition_start(name)
+            if start is not None and self.period_end(period_start) <= start:
+                continue
+            if end is not None and period_start >= end:
+                continue
+            names.append(name)
+        return names
+
+    def is_partitioned(self, connection=None):
+        """True when kpi_measurements has been converted to a partitioned table"""
+        conn = connection or db.session
+        if self.native:
+            return conn.execute(text(
+                "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = 'kpi_measurements'"
+            )).first() is not None
+        return True
+
+    # ------------------------------------------------------------------
+    # SQLite partition tables
+    # ------------------------------------------------------------------
+
+    def partition_table(self, name):
+        """Table object for a SQLite partition (same columns as kpi_measurements)"""
+        table = self._metadata.tables.get(name)
+        if table is None:
+            table = Table(
+                name, self._metadata,
+                Column('id', Integer, primary_key=True),
+                Column('element_id', Integer, nullable=False),
+                Column('kpi_id', Integer, nullable=False),
+                Column('value', Float, nullable=False),
+                Column('timestamp', DateTime),
+                Column('quality_score', Float),
+                sqlite_autoincrement=True,
+            )
+            Index(f'ix_{name}_timestamp', table.c.timestamp)
+            Index(f'uq_{name}_series', table.c.element_id, table.c.kpi_id, table.c.timestamp, unique=True)
+        return table
+
+    def _create_sqlite_partition(self, conn, start):
+        name = self.partition_name(start)
+        table = self.partition_table(name)
+        table.create(conn, checkfirst=True)
+        conn.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) "
+            "SELECT :name, :seq WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+        ), {'name': name, 'seq': (start - EPOCH).days * ID_SPACING})
+        return name
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def convert_table(self):
+        """Convert an existing kpi_measurements table to a partitioned table (PostgreSQL)
+
+        SQLite needs no conversion: the existing table becomes the default
+        partition. Returns True when a conversion was performed.
+        """
+        require_partitioning()
+        if not self.native:
+            return False
+        with db.engine.begin() as conn:
+            if self.is_partitioned(conn):
+                return False
+            conn.execute(text("ALTER SEQUENCE kpi_measurements_id_seq OWNED BY NONE"))
+            conn.execute(text("ALTER TABLE kpi_measurements RENAME TO kpi_measurements_legacy"))
+            conn.execute(text(
+                "CREATE TABLE kpi_measurements ("
+                " id INTEGER NOT NULL DEFAULT nextval('kpi_measurements_id_seq'),"
+                " element_id INTEGER NOT NULL REFERENCES network_elements (id),"
+                " kpi_id INTEGER NOT NULL REFERENCES kpi_definitions (id),"
+                " value DOUBLE PRECISION NOT NULL,"
+                " timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),"
+                " quality_score DOUBLE PRECISION,"
+                " PRIMARY KEY (id, timestamp)"
+                ") PARTITION BY RANGE (timestamp)"
+            ))
+            conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF kpi_measurements DEFAULT"))
+            conn.execute(text(
+                "INSERT INTO kpi_measurements (id, element_id, kpi_id, value, timestamp, quality_score) "
+                "SELECT id, element_id, kpi_id, value, COALESCE(timestamp, now() AT TIME ZONE 'utc'), "
+                "quality_score FROM kpi_measurements_legacy"
+            ))
+            conn.execute(text("DROP TABLE kpi_measurements_legacy"))
+            conn.execute(text("ALTER SEQUENCE kpi_measurements_id_seq OWNED BY kpi_measurements.id"))
+            conn.execute(text("CREATE INDEX ix_kpi_measurements_timestamp ON kpi_measurements (timestamp)"))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX uq_kpi_measurement_series ON kpi_measurements (element_id, kpi_id, timestamp)"
+            ))
+        return True
+
+    def ensure_partitions(self, start=None, ahead=None):
+        """Create partitions from start through `ahead` periods after now
+
+        When start is None it defaults to the oldest row in the default
+        partition (or now). Rows already sitting in the default partition for
+        a newly created period are moved into it. Returns the created names.
+        Raises RuntimeError unless KPI_PARTITIONING is enabled, since reads
+        and writes ignore the partition tables without it.
+        """
+        require_partitioning()
+        if ahead is None:
+            ahead = current_app.config.get('KPI_PARTITION_PREMAKE', 2)
+        now = datetime.utcnow()
+        end = now
+        for _ in range(ahead + 1):
+            end = self.period_end(self.period_start(end))
+
+        default_table = DEFAULT_PARTITION if self.native else KPIMeasurement.__tablename__
+        created = []
+        with db.engine.begin() as conn:
+            if self.native and not self.is_partitioned(conn):
+                raise RuntimeError('kpi_measurements is not partitioned; run `flask partitions init` first')
+            if start is None:
+                oldest = conn.execute(text(f"SELECT MIN(timestamp) FROM {default_table}")).scalar()
+                if isinstance(oldest, str):
+                    oldest = datetime.fromisoformat(oldest)
+                start = min(oldest, now) if oldest else now
+
+            existing = set(self.list_partitions(conn))
+            if not self.native:
+                # Partitions created before an index was added pick it up here
+                for name in existing:
+                    for index in self.partition_table(name).indexes:
+                        index.create(conn, checkfirst=True)
+            for period in self.periods_between(start, end):
+                name = self.partition_name(period)
+                if name in existing:
+                    continue
+                bounds = {'start': period, 'end': self.period_end(period)}
+                if self.native:
+                    conn.execute(text(
+                        f"CREATE TABLE {name} (LIKE kpi_measurements INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+                    ))
+                    conn.execute(text(
+                        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                        f"WHERE timestamp >= :start AND timestamp < :end RETURNING *) "
+                        f"INSERT INTO {name} SELECT * FROM moved"
+                    ), bounds)
+                    conn.execute(text(
+                        f"ALTER TABLE kpi_measurements ATTACH PARTITION {name} "
+                        f"FOR VALUES FROM ('{bounds['start'].isoformat()}') TO ('{bounds['end'].isoformat()}')"
+                    ))
+                else:
+                    self._create_sqlite_partition(conn, period)
+                    conn.execute(text(
+                        f"INSERT INTO {name} (id, element_id, kpi_id, value, timestamp, quality_score) "
+                        f"SELECT id, element_id, kpi_id, value, timestamp, quality_score FROM {default_table} "
+                        f"WHERE timestamp >= :start AND timestamp < :end"
+                    ), bounds)
+                    conn.execute(text(
+                        f"DELETE FROM {default_table} WHERE timestamp >= :start AND timestamp < :end"
+                    ), bounds)
+                created.append(name)
+        return created
+
+    def drop_partitions_before(self, cutoff):
+        """Drop every partition whose period ends at or before cutoff
+
+        This is a metadata operation; rows older than cutoff that live in the
+        default partition are left for the retention purge. Returns the
+        dropped partition names with their row counts.
+        """
+        dropped = []
+        with db.engine.begin() as conn:
+            for name in self.list_partitions(conn):
+                if self.period_end(self.partition_start(name)) > cutoff:
+                    continue
+                rows = conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+                if self.native:
+                    conn.execute(text(f"ALTER TABLE kpi_measurements DETACH PARTITION {name}"))
+                else:
+                    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {'name': name})
+                conn.execute(text(f"DROP TABLE {name}"))
+                if name in self._metadata.tables:
+                    self._metadata.remove(self._metadata.tables[name])
+                dropped.append((name, rows))
+        return dropped
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def source(self, start=None, end=None):
+        """Mapped entity to query measurements in [start, end) from
+
+        On PostgreSQL (and when routing is disabled) this is KPIMeasurement
+        itself. On SQLite it is KPIMeasurement aliased over a UNION ALL of the
+        default table and only the partitions overlapping the range, with the
+        time predicate pushed into every branch. Entities loaded through the
+        alias are read-only.
+        """
+        if self.native or not current_app.config.get('KPI_PARTITIONING'):
+            return KPIMeasurement
+
+        base = KPIMeasurement.__table__
+        branches = [base] + [self.partition_table(n) for n in self.partitions_for_range(start, end)]
+        if len(branches) == 1:
+            return KPIMeasurement
+
+        selects = []
+        for table in branches:
+            stmt = select(table.c.id, table.c.element_id, table.c.kpi_id,
+                          table.c.value, table.c.timestamp, table.c.quality_score)
+            if start is not None:
+                stmt = stmt.where(table.c.timestamp >= start)
+            if end is not None:
+                stmt = stmt.where(table.c.timestamp < end)
+            selects.append(stmt)
+        routed = union_all(*selects).subquery('kpi_measurements_routed')
+        return aliased(KPIMeasurement, routed)
+
+    def insert(self, rows, on_conflict=None):
+        """Insert measurement rows (dicts) and return their ids in input order
+
+        Rows must be unique on (element_id, kpi_id, timestamp). on_conflict
+        decides what happens when that series point already exists: None
+        raises, 'ignore' skips the row (its id is returned as None) and
+        'update' overwrites value and quality_score.
+
+        On SQLite rows are grouped per period and written to the matching
+        partition, or to the default table when it does not exist yet.
+        """
+        if not rows:
+            return []
+        base = KPIMeasurement.__table__
+        if self.native or not current_app.config.get('KPI_PARTITIONING'):
+            return self._insert_into(base, rows, on_conflict)
+
+        existing = set(self.list_partitions())
+        groups = {}
+        for index, row in enumerate(rows):
+            name = self.partition_name(self.period_start(row['timestamp']))
+            target = name if name in existing else None
+            groups.setdefault(target, []).append(index)
+
+        ids = [None] * len(rows)
+        for name, indexes in groups.items():
+            table = self.partition_table(name) if name else base
+            group = [rows[i] for i in indexes]
+            for index, new_id in zip(indexes, self._insert_into(table, group, on_conflict)):
+                ids[index] = new_id
+        return ids
+
+    @staticmethod
+    def _insert_into(table, rows, on_conflict=None):
+        series = [table.c.element_id, table.c.kpi_id, table.c.timestamp]
+        if on_conflict is None:
+            stmt = insert(table)
+        else:
+            stmt = upsert_insert(table)
+            if on_conflict == 'ignore':
+                stmt = stmt.on_conflict_do_nothing(index_elements=series)
+            elif on_conflict == 'update':
+                stmt = stmt.on_conflict_do_update(index_elements=series, set_={
+                    'value': stmt.excluded.value,
+                    'quality_score': stmt.excluded.quality_score,
+                })
+            else:
+                raise ValueError(f'Unknown on_conflict mode: {on_conflict}')
+
+        # Skipped rows return nothing, so match ids back by series key
+        stmt = stmt.returning(table.c.id, *series)
+        ids = {(row[1], row[2], row[3]): row[0] for row in db.session.execute(stmt, rows)}
+        return [ids.get((r['element_id'], r['kpi_id'], r['timestamp'])) for r in rows]
+
+
+_partitioner = None
+
+
+def get_partitioner():
+    """Process-wide partitioner for the configured interval"""
+    global _partitioner
+    interval = current_app.config.get('KPI_PARTITION_INTERVAL', 'month')
+    if _partitioner is None or _partitioner.interval != interval:
+        _partitioner = MeasurementPartitioner(interval)
+    return _partitioner
+
+
+def measurement_source(start=None, end=None):
+    """Entity to query KPI measurements in [start, end) from"""
+    return get_partitioner().source(start, end)
+
+
+def measurement_tables():
+    """Physical tables holding measurements (the default table plus SQLite partitions)
+
+    On PostgreSQL the partitioned parent is returned on its own; statements
+    against it reach every partition.
+    """
+    partitioner = get_partitioner()
+    base = KPIMeasurement.__table__
+    if partitioner.native or not current_app.config.get('KPI_PARTITIONING'):
+        return [base]
+    return [base] + [partitioner.partition_table(name) for name in partitioner.list_partitions()]
+
+
+def insert_measurements(rows, on_conflict=None):
+    """Insert measurement rows through the partition router"""
+    return get_partitioner().insert(rows, on_conflict)
+
+
+def require_partitioning():
+    """Refuse partition maintenance while reads and writes do not route to partitions"""
+    if not current_app.config.get('KPI_PARTITIONING'):
+        raise RuntimeError('KPI_PARTITIONING is not enabled; set KPI_PARTITIONING=true first')
+
+
+def maintain_partitions():
+    """Create upcoming partitions; entry point for the scheduler"""
+    created = get_partitioner().ensure_partitions()
+    if created:
+        current_app.logger.info(f'Created KPI measurement partitions: {", ".join(created)}')
+    return created
@@ -0,0 +1,178 @@
+"""
+End-to-end path metrics
+Service paths run from the subscriber side of the topology (elements without
+incoming links, e.g. UEs or eNodeBs) along the links to the internet edge
+(elements without outgoing links). The path set is enumerated once per
+topology version and kept as a padded NumPy matrix of element positions, so
+each request only gathers the latest hop KPIs and reduces along the paths:
+
+- latency: sum of hop latencies
+- jitter: square root of the summed squared hop jitter (independent hops)
+- loss: 1 - product of hop delivery ratios
+
+Per-segment latency (air interface, MPLS transport, GTP core, internet) is the
+latency summed over the hops of each domain.
+"""
+import threading
+
+import numpy as np
+from flask import current_app
+
+from app.services.latest import latest_values
+from app.services.topology import DOMAIN_ORDER, get_topology_graph
+
+SEGMENTS = tuple(sorted(DOMAIN_ORDER, key=DOMAIN_ORDER.get))
+
+
+class PathSet:
+    """Source-to-sink paths of one topology version"""
+
+    def __init__(self, graph, max_paths_per_source=64):
+        self.version = graph.version
+        self.element_ids = np.array(sorted(graph.nodes), dtype=np.int64)
+        index = {element_id: i for i, element_id in enumerate(self.element_ids.tolist())}
+        n = len(self.element_ids)
+        self.domains = np.array([SEGMENTS.index(graph.nodes[e]['domain']) if graph.nodes[e]['domain'] in SEGMENTS
+                                 else -1 for e in self.element_ids.tolist()], dtype=np.int64)
+
+        successors = [[index[t] for t in graph.successors.get(e, []) if t in index] for e in self.element_ids.tolist()]
+        has_predecessor = np.zeros(n, dtype=bool)
+        for targets in successors:
+            has_predecessor[targets] = True
+        sources = [i for i in range(n) if not has_predecessor[i] and successors[i]]
+
+        paths = []
+        self.truncated = False
+        for source in sources:
+            found = _enumerate_paths(source, successors, max_paths_per_source)
+            self.truncated |= len(found) >= max_paths_per_source
+            paths.extend(found)
+
+        # Padding points at position n, which holds neutral values
+        width = max((len(p) for p in paths), default=0)
+        self.hops = np.full((len(paths), width), n, dtype=np.int64)
+        for row, path in enumerate(paths):
+            self.hops[row, :len(path)] = path
+        self.lengths = np.array([len(p) for p in paths], dtype=np.int64)
+        self.locations = np.array([graph.nodes[self.element_ids[p[0]]]['location'] or '' for p in paths], dtype=object)
+        self.index = index
+
+    def __len__(self):
+        return len(self.hops)
+
+    def select(self, element_id=None, location=None):
+        """Mask of paths through element_id and/or starting at location"""
+        mask = np.ones(len(self), dtype=bool)
+        if element_id is not None:
+            position = self.index.get(element_id)
+            if position is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= (self.hops == position).any(axis=1)
+        if location is not None:
+            mask &= self.locations == location
+        return mask
+
+    def evaluate(self, latency, jitter, loss, mask=None):
+        """Per-path metrics from per-element arrays (NaN where unmeasured)
+
+        Unmeasured hops count as zero; a path is complete when every hop had a
+        latency value. Loss is given and returned in percent.
+        """
+        hops = self.hops if mask is None else self.hops[mask]
+        latency, jitter, loss = (np.append(np.asarray(a, dtype=np.float64), np.nan) for a in (latency, jitter, loss))
+        domains = np.append(self.domains, -1)
+
+        hop_latency = np.nan_to_num(latency[hops])
+        hop_jitter = np.nan_to_num(jitter[hops])
+        hop_delivery = 1 - np.clip(np.nan_to_num(loss[hops]), 0, 100) / 100
+        padding = hops == len(self.element_ids)
+
+        segments = {name: (hop_latency * (domains[hops] == i)).sum(axis=1) for i, name in enumerate(SEGMENTS)}
+        total_latency = hop_latency.sum(axis=1)
+        total_jitter = np.sqrt((hop_jitter ** 2).sum(axis=1))
+        total_loss = 100 * (1 - hop_delivery.prod(axis=1))
+        return {
+            'latency': total_latency,
+            'jitter': total_jitter,
+            'loss': total_loss,
+            'mos': estimate_mos(total_latency, total_jitter, total_loss),
+            'segments': segments,
+            'complete': ~(np.isnan(latency[hops]) & ~padding).any(axis=1)
+        }
+
+    def paths(self, mask=None):
+        """Element ids along each path"""
+        hops = self.hops if mask is None else self.hops[mask]
+        lengths = self.lengths if mask is None else self.lengths[mask]
+        return [self.element_ids[row[:length]].tolist() for row, length in zip(hops, lengths)]
+
+
+def estimate_mos(latency, jitter, loss):
+    """Mean opinion score (1-5) from latency/jitter (ms) and loss (%)
+
+    Simplified ITU-T G.107 E-model: jitter buffers add twice the jitter to the
+    delay, and every percent of loss lowers the rating factor by 2.5.
+    """
+    effective = latency + 2 * jitter + 10
+    r = 93.2 - np.where(effective < 160, effective / 40, (effective - 120) / 10) - 2.5 * loss
+    r = np.clip(r, 0, 100)
+    return 1 + 0.035 * r + 7e-6 * r * (r - 60) * (100 - r)
+
+
+def _enumerate_paths(source, successors, limit):
+    """Simple paths from source to nodes without successors (at most limit)"""
+    paths = []
+    stack = [(source, 0)]
+    path = []
+    on_path = set()
+    while stack:
+        node, edge = stack.pop()
+        if edge == 0:
+            path.append(node)
+            on_path.add(node)
+            if not successors[node]:
+                paths.append(list(path))
+                if len(paths) >= limit:
+                    break
+        targets = successors[node]
+        while edge < len(targets) and targets[edge] in on_path:
+            edge += 1
+        if edge < len(targets):
+            stack.append((node, edge + 1))
+            stack.append((targets[edge], 0))
+        else:
+            path.pop()
+            on_path.discard(node)
+    return paths
+
+
+def hop_metrics(path_set):
+    """Latest latency, jitter and loss of every element as aligned arrays"""
+    codes = current_app.config.get('PATH_KPIS', {})
+    codes = [codes.get(metric, metric) for metric in ('latency', 'jitter', 'loss')]
+    latest = latest_values(set(codes))
+    arrays = []
+    for code in codes:
+        element_ids, values = (np.asarray(a) for a in latest[code])
+        known = np.isin(element_ids, path_set.element_ids)
+        array = np.full(len(path_set.element_ids), np.nan)
+        array[np.searchsorted(path_set.element_ids, element_ids[known])] = values[known]
+        arrays.append(array)
+    return arrays
+
+
+_path_set = None
+_path_set_lock = threading.Lock()
+
+
+def get_path_set(graph=None):
+    """Path set of the current topology, rebuilt when its version moves"""
+    global _path_set
+    graph = graph or get_topology_graph()
+    path_set = _path_set
+    if path_set is not None and path_set.version == graph.version:
+        return path_set
+    with _path_set_lock:
+        if _path_set is None or _path_set.version != graph.version:
+            _path_set = PathSet(graph, current_app.config.get('PATH_MAX_PER_SOURCE', 64))
+        return _path_set
@@ -0,0 +1,88 @@
+"""
+Report aggregates
+Each report is computed with a fixed number of set-based queries over the
+latest-value and element tables, independent of how many elements, KPIs or
+alerts exist.
+"""
+from sqlalchemy import and_, case, distinct, func
+
+from app import db
+from app.models.network import Alert, KPIDefinition, KPILatest, NetworkElement
+
+REPORT_DOMAINS = ('ran', 'transport', 'core', 'internet')
+ALERT_SEVERITIES = ('low', 'medium', 'high')
+
+
+def domain_health(cutoff, domains=REPORT_DOMAINS):
+    """Per-domain element counts and average quality of critical KPIs
+
+    Critical KPIs are the high impact KPIs of the element's own domain; the
+    quality average covers each element's latest value of those KPIs if it
+    was measured after cutoff. Returns {domain: {'health', 'active',
+    'total', 'avg_quality', 'kpi_count'}} for every requested domain.
+    """
+    critical_score = case(
+        (and_(KPIDefinition.domain == NetworkElement.domain, KPIDefinition.impact_level == 'high'),
+         KPILatest.quality_score)
+    )
+    rows = db.session.query(
+        NetworkElement.domain,
+        func.count(distinct(NetworkElement.id)).label('total'),
+        func.count(distinct(case((NetworkElement.status == 'active', NetworkElement.id)))).label('active'),
+        func.avg(critical_score).label('avg_quality'),
+        func.count(critical_score).label('kpi_count')
+    ).outerjoin(
+        KPILatest, and_(KPILatest.element_id == NetworkElement.id, KPILatest.timestamp >= cutoff)
+    ).outerjoin(
+        KPIDefinition, KPIDefinition.id == KPILatest.kpi_id
+    ).filter(
+        NetworkElement.domain.in_(list(domains))
+    ).group_by(NetworkElement.domain).all()
+
+    by_domain = {row.domain: row for row in rows}
+    result = {}
+    for domain in domains:
+        row = by_domain.get(domain)
+        total = row.total if row else 0
+        active = row.active if row else 0
+        result[domain] = {
+            'health': int((active / total * 100) if total > 0 else 0),
+            'active': active,
+            'total': total,
+            'avg_quality': (row.avg_quality or 0) if row else 0,
+            'kpi_count': row.kpi_count if row else 0
+        }
+    return result
+
+
+def alerts_summary(cutoff):
+    """Alert counts by severity, element domain and acknowledgement since cutoff
+
+    One GROUP BY over (severity, domain, acknowledged) whose few rows are
+    folded into the three breakdowns. Alerts without an element only count
+    towards severity and acknowledgement.
+    """
+    rows = db.session.query(
+        Alert.severity, NetworkElement.domain, Alert.acknowledged, func.count(Alert.id)
+    ).outerjoin(
+        NetworkElement, NetworkElement.id == Alert.element_id
+    ).filter(
+        Alert.created_at >= cutoff
+    ).group_by(Alert.severity, NetworkElement.domain, Alert.acknowledged).all()
+
+    severity_counts = dict.fromkeys(ALERT_SEVERITIES, 0)
+    domain_counts = {}
+    ack_counts = {'acknowledged': 0, 'unacknowledged': 0}
+    total = 0
+    for severity, domain, acknowledged, count in rows:
+        severity_counts[severity] = severity_counts.get(severity, 0) + count
+        if domain is not None:
+            domain_counts[domain] = domain_counts.get(domain, 0) + count
+        ack_counts['acknowledged' if acknowledged else 'unacknowledged'] += count
+        total += count
+    return {
+        'severity_counts': severity_counts,
+        'domain_counts': domain_counts,
+        'ack_counts': ack_counts,
+        'total_count': total
+    }
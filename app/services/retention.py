@@ -0,0 +1,226 @@
+"""
+Data retention for KPI measurements, alerts, rollups and sketches
+Rows older than the configured retention (per table and KPI impact level)
+are deleted in bounded batches, committing and pausing between batches so
+no single statement holds long locks. Whole measurement partitions older
+than the longest retention are dropped instead of deleted row by row.
+Every purge is recorded in the audit log.
+"""
+import json
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, or_, select, text, tuple_
+
+from app import db
+from app.models.network import Alert, KPIDefinition, KPIRollup, KPISketch
+from app.models.simulation import AuditLog
+from app.services.partitioning import get_partitioner, measurement_tables
+
+
+class RetentionService:
+    """Applies RETENTION_POLICIES to the measurement, alert, rollup and sketch tables"""
+
+    def __init__(self, policies=None, batch_size=None, pause=None, vacuum=None, progress=None):
+        cfg = current_app.config
+        self.policies = policies if policies is not None else cfg.get('RETENTION_POLICIES', {})
+        self.batch_size = batch_size or cfg.get('RETENTION_BATCH_SIZE', 5000)
+        self.pause = cfg.get('RETENTION_BATCH_PAUSE', 0.5) if pause is None else pause
+        self.vacuum = cfg.get('RETENTION_VACUUM', False) if vacuum is None else vacuum
+        # Called as progress(fraction, message) after every batch; may raise to stop the purge
+        self.progress = progress
+        self._fraction = 0.0
+        self._step_deleted = 0  # rows removed by the purge in progress
+
+    def run(self, now=None):
+        """Purge every table with a policy and return the purge records
+
+        When the progress callback raises (e.g. a cancelled job), the rows
+        deleted so far are still recorded in the audit log.
+        """
+        now = now or datetime.utcnow()
+        records = []
+        purges = [
+            ('kpi_measurements', self.purge_measurements),
+            ('alerts', self.purge_alerts),
+            ('kpi_rollups', self.purge_rollups),
+            ('kpi_sketches', self.purge_sketches),
+        ]
+        for step, (table, purge) in enumerate(purges):
+            self._fraction = step / len(purges)
+            self._step_deleted = 0
+            try:
+                records += purge(now)
+            except Exception:
+                db.session.rollback()
+                if self._step_deleted:
+                    records.append({'table': table, 'rows_deleted': self._step_deleted, 'interrupted': True})
+                self._audit(records, now)
+                raise
+        self._audit(records, now)
+
+        if self.vacuum and any(r['rows_deleted'] or r.get('partitions_dropped') for r in records):
+            self.vacuum_tables({r['table'] for r in records})
+        return records
+
+    @staticmethod
+    def _audit(records, now):
+        for record in records:
+            db.session.add(AuditLog(
+                action='retention_purge',
+                resource_type=record['table'],
+                timestamp=now,
+                details=json.dumps(record, default=str)
+            ))
+        db.session.commit()
+
+    # ------------------------------------------------------------------
+    # Per-table purges
+    # ------------------------------------------------------------------
+
+    def purge_measurements(self, now):
+        policy = self.policies.get('kpi_measurements')
+        if not policy:
+            return []
+        records = []
+
+        # Whole partitions older than every impact level's retention go at once
+        if None not in policy.values():
+            cutoff = now - timedelta(days=max(policy.values()))
+            dropped = get_partitioner().drop_partitions_before(cutoff)
+            self._step_deleted += sum(rows for _, rows in dropped)
+            if dropped:
+                records.append({
+                    'table': 'kpi_measurements',
+                    'impact_level': '*',
+                    'cutoff': cutoff,
+                    'rows_deleted': sum(rows for _, rows in dropped),
+                    'partitions_dropped': [name for name, _ in dropped],
+                    'batches': 0,
+                })
+
+        tables = measurement_tables()
+        for level, days in policy.items():
+            if days is None:
+                continue
+            cutoff = now - timedelta(days=days)
+            deleted = batches = 0
+            for table in tables:
+                condition = (table.c.timestamp < cutoff) & table.c.kpi_id.in_(self._kpi_ids(level, policy))
+                count, n = self._delete_in_batches(table, [table.c.id], condition)
+                deleted += count
+                batches += n
+            records.append({
+                'table': 'kpi_measurements', 'impact_level': level, 'cutoff': cutoff,
+                'rows_deleted': deleted, 'batches': batches,
+            })
+        return records
+
+    def purge_alerts(self, now):
+        policy = self.policies.get('alerts')
+        if not policy:
+            return []
+        table = Alert.__table__
+        records = []
+        for level, days in policy.items():
+            if days is None:
+                continue
+            cutoff = now - timedelta(days=days)
+            kpi_ids = self._kpi_ids(level, policy)
+            if level == 'default':
+                # Alerts not tied to a KPI follow the default policy
+                kpi_filter = or_(table.c.kpi_id.is_(None), table.c.kpi_id.in_(kpi_ids))
+            else:
+                kpi_filter = table.c.kpi_id.in_(kpi_ids)
+            deleted, batches = self._delete_in_batches(
+                table, [table.c.id], (table.c.created_at < cutoff) & kpi_filter
+            )
+            records.append({
+                'table': 'alerts', 'impact_level': level, 'cutoff': cutoff,
+                'rows_deleted': deleted, 'batches': batches,
+            })
+        return records
+
+    def purge_rollups(self, now):
+        policy = self.policies.get('kpi_rollups')
+        if not policy:
+            return []
+        table = KPIRollup.__table__
+        key = [table.c.resolution, table.c.element_id, table.c.kpi_id, table.c.bucket_start]
+        records = []
+        for resolution, days in policy.items():
+            if days is None:
+                continue
+            cutoff = now - timedelta(days=days)
+            deleted, batches = self._delete_in_batches(
+                table, key, (table.c.resolution == resolution) & (table.c.bucket_start < cutoff)
+            )
+            records.append({
+                'table': 'kpi_rollups', 'resolution': resolution, 'cutoff': cutoff,
+                'rows_deleted': deleted, 'batches': batches,
+            })
+        return records
+
+    def purge_sketches(self, now):
+        days = self.policies.get('kpi_sketches')
+        if not days:
+            return []
+        table = KPISketch.__table__
+        key = [table.c.element_id, table.c.kpi_id, table.c.bucket_start]
+        cutoff = now - timedelta(days=days)
+        deleted, batches = self._delete_in_batches(table, key, table.c.bucket_start < cutoff)
+        return [{'table': 'kpi_sketches', 'cutoff': cutoff, 'rows_deleted': deleted, 'batches': batches}]
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _kpi_ids(level, policy):
+        """Subquery of KPI ids governed by an impact level's policy"""
+        query = select(KPIDefinition.id)
+        if level == 'default':
+            named = [l for l in policy if l != 'default']
+            return query.where(or_(KPIDefinition.impact_level.is_(None),
+                                   KPIDefinition.impact_level.notin_(named)))
+        return query.where(KPIDefinition.impact_level == level)
+
+    def _delete_in_batches(self, table, key_columns, condition):
+        """Delete matching rows batch_size at a time; returns (rows, batches)"""
+        total = batches = 0
+        while True:
+            keys = select(*key_columns).where(condition).limit(self.batch_size)
+            if len(key_columns) == 1:
+                stmt = delete(table).where(key_columns[0].in_(keys.scalar_subquery()))
+            else:
+                stmt = delete(table).where(tuple_(*key_columns).in_(keys))
+            deleted = db.session.execute(stmt).rowcount
+            db.session.commit()
+            total += deleted
+            batches += 1
+            self._step_deleted += deleted
+            if self.progress:
+                self.progress(self._fraction, f'{table.name}: {total} rows deleted')
+            if deleted < self.batch_size:
+                return total, batches
+            if self.pause:
+                time.sleep(self.pause)
+
+    def vacuum_tables(self, tables):
+        """Reclaim space and refresh planner statistics after a purge"""
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            if conn.dialect.name == 'postgresql':
+                for table in sorted(tables):
+                    conn.execute(text(f'VACUUM (ANALYZE) {table}'))
+            else:
+                conn.execute(text('VACUUM'))
+                conn.execute(text('ANALYZE'))
+
+
+def run_retention():
+    """Entry point for the scheduler and CLI"""
+    records = RetentionService().run()
+    total = sum(r['rows_deleted'] for r in records)
+    current_app.logger.info(f'Retention purge removed {total} rows: {records}')
+    return records
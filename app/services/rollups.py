@@ -0,0 +1,263 @@
+"""
+Incrementally maintained KPI rollups
+Raw measurements are folded into per (element, kpi, bucket) aggregates at
+1 minute, 1 hour and 1 day resolution as they are ingested. Every aggregate
+(count, sum, sum of squares, min, max, last) is mergeable, so late data is
+simply added to the bucket it belongs to. Reports read the coarsest rollup
+that still gives them enough points instead of scanning raw rows. The hourly
+quantile sketches (app.services.sketches) are rebuilt and recomputed along
+with the rollups.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func
+
+from app import db
+from app.models.network import KPIRollup
+from app.services.partitioning import measurement_source
+from app.services.sketches import apply_sketches, delete_sketches
+from app.services.sql_helpers import upsert_insert, least, greatest
+
+# Finest first; values are bucket widths
+ROLLUP_RESOLUTIONS = OrderedDict([
+    ('1m', timedelta(minutes=1)),
+    ('1h', timedelta(hours=1)),
+    ('1d', timedelta(days=1)),
+])
+
+# Regrouped buckets are counted from a Monday so weeks start on Monday (the epoch is a Thursday)
+REGROUP_ORIGIN = datetime(1970, 1, 5)
+
+# Coarsest rollup resolution (and optional regrouping) for each trend interval
+TREND_ROLLUPS = {
+    'hourly': ('1h', None),
+    'daily': ('1d', None),
+    'weekly': ('1d', timedelta(days=7)),
+}
+
+
+def bucket_start(ts, resolution):
+    """Start of the rollup bucket containing ts"""
+    if resolution == '1m':
+        return ts.replace(second=0, microsecond=0)
+    if resolution == '1h':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    if resolution == '1d':
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'Unknown rollup resolution: {resolution}')
+
+
+def summarize(rows, resolutions=None):
+    """Fold measurement rows into one partial aggregate per bucket"""
+    resolutions = resolutions or list(ROLLUP_RESOLUTIONS)
+    partials = {}
+    for row in rows:
+        value = row['value']
+        ts = row['timestamp']
+        for resolution in resolutions:
+            key = (resolution, row['element_id'], row['kpi_id'], bucket_start(ts, resolution))
+            partial = partials.get(key)
+            if partial is None:
+                partials[key] = {
+                    'resolution': key[0],
+                    'element_id': key[1],
+                    'kpi_id': key[2],
+                    'bucket_start': key[3],
+                    'sample_count': 1,
+                    'value_sum': value,
+                    'value_sum_sq': value * value,
+                    'min_value': value,
+                    'max_value': value,
+                    'last_value': value,
+                    'last_timestamp': ts,
+                }
+                continue
+            partial['sample_count'] += 1
+            partial['value_sum'] += value
+            partial['value_sum_sq'] += value * value
+            partial['min_value'] = min(partial['min_value'], value)
+            partial['max_value'] = max(partial['max_value'], value)
+            if ts >= partial['last_timestamp']:
+                partial['last_value'] = value
+                partial['last_timestamp'] = ts
+    # Deterministic order keeps concurrent upserts from deadlocking
+    return [partials[key] for key in sorted(partials)]
+
+
+def apply_rollups(rows):
+    """Merge measurement rows into the rollup tables (caller commits)
+
+    Returns the number of bucket rows upserted.
+    """
+    partials = summarize(rows)
+    if not partials:
+        return 0
+
+    table = KPIRollup.__table__
+    stmt = upsert_insert(table)
+    new = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.resolution, table.c.element_id, table.c.kpi_id, table.c.bucket_start],
+        set_={
+            'sample_count': table.c.sample_count + new.sample_count,
+            'value_sum': table.c.value_sum + new.value_sum,
+            'value_sum_sq': table.c.value_sum_sq + new.value_sum_sq,
+            'min_value': least(table.c.min_value, new.min_value),
+            'max_value': greatest(table.c.max_value, new.max_value),
+            'last_value': case(
+                (new.last_timestamp >= table.c.last_timestamp, new.last_value),
+                else_=table.c.last_value
+            ),
+            'last_timestamp': greatest(table.c.last_timestamp, new.last_timestamp),
+        }
+    )
+    db.session.execute(stmt, partials)
+    return len(partials)
+
+
+def rebuild_rollups(start=None, end=None, chunk_size=50000):
+    """Recompute rollups from raw measurements for whole days in [start, end)
+
+    Commits after every chunk. Returns the number of measurements folded in.
+    """
+    if start is not None:
+        start = bucket_start(start, '1d')
+    if end is not None and end != bucket_start(end, '1d'):
+        end = bucket_start(end, '1d') + ROLLUP_RESOLUTIONS['1d']
+
+    delete = KPIRollup.query
+    if start is not None:
+        delete = delete.filter(KPIRollup.bucket_start >= start)
+    if end is not None:
+        delete = delete.filter(KPIRollup.bucket_start < end)
+    delete.delete(synchronize_session=False)
+    delete_sketches(start, end)
+    db.session.commit()
+
+    measurement = measurement_source(start, end)
+    query = db.session.query(
+        measurement.element_id, measurement.kpi_id, measurement.value, measurement.timestamp
+    ).filter(measurement.timestamp.isnot(None))
+    if start is not None:
+        query = query.filter(measurement.timestamp >= start)
+    if end is not None:
+        query = query.filter(measurement.timestamp < end)
+
+    total = 0
+    chunk = []
+    for row in query.execution_options(yield_per=chunk_size):
+        chunk.append(row._asdict())
+        if len(chunk) >= chunk_size:
+            total += _flush_chunk(chunk)
+            chunk = []
+    total += _flush_chunk(chunk)
+    return total
+
+
+def _flush_chunk(chunk):
+    if not chunk:
+        return 0
+    apply_rollups(chunk)
+    apply_sketches(chunk)
+    db.session.commit()
+    return len(chunk)
+
+
+def recompute_rollups(series_days):
+    """Rebuild the rollups of (element_id, kpi_id, day) series-days from raw rows
+
+    Overwritten measurements cannot be merged incrementally (min/max and
+    sketch bins cannot be un-merged), so every bucket and sketch of the
+    affected days is recomputed.
+    """
+    day_width = ROLLUP_RESOLUTIONS['1d']
+    for element_id, kpi_id, day in sorted(set(series_days)):
+        day = bucket_start(day, '1d')
+        KPIRollup.query.filter(
+            KPIRollup.element_id == element_id,
+            KPIRollup.kpi_id == kpi_id,
+            KPIRollup.bucket_start >= day,
+            KPIRollup.bucket_start < day + day_width
+        ).delete(synchronize_session=False)
+        delete_sketches(day, day + day_width, element_id, kpi_id)
+
+        measurement = measurement_source(day, day + day_width)
+        rows = db.session.query(
+            measurement.element_id, measurement.kpi_id, measurement.value, measurement.timestamp
+        ).filter(
+            measurement.element_id == element_id,
+            measurement.kpi_id == kpi_id,
+            measurement.timestamp >= day,
+            measurement.timestamp < day + day_width
+        ).all()
+        rows = [row._asdict() for row in rows]
+        apply_rollups(rows)
+        apply_sketches(rows)
+
+
+def choose_resolution(span, min_points=24):
+    """Coarsest rollup resolution giving at least min_points buckets over span
+
+    Returns None when even 1 minute buckets are too coarse, in which case
+    callers should read raw measurements.
+    """
+    for resolution in reversed(ROLLUP_RESOLUTIONS):
+        if span / ROLLUP_RESOLUTIONS[resolution] >= min_points:
+            return resolution
+    return None
+
+
+def rollup_series(kpi_id, resolution, start, end=None, element_id=None):
+    """Per-bucket aggregates of one KPI, across all elements or for one element"""
+    query = db.session.query(
+        KPIRollup.bucket_start,
+        func.sum(KPIRollup.sample_count),
+        func.sum(KPIRollup.value_sum),
+        func.sum(KPIRollup.value_sum_sq),
+        func.min(KPIRollup.min_value),
+        func.max(KPIRollup.max_value),
+    ).filter(
+        KPIRollup.resolution == resolution,
+        KPIRollup.kpi_id == kpi_id,
+        KPIRollup.bucket_start >= bucket_start(start, resolution)
+    )
+    if end is not None:
+        query = query.filter(KPIRollup.bucket_start < end)
+    if element_id is not None:
+        query = query.filter(KPIRollup.element_id == element_id)
+
+    rows = query.group_by(KPIRollup.bucket_start).order_by(KPIRollup.bucket_start).all()
+    return [_point(*row) for row in rows]
+
+
+def regroup(points, width):
+    """Merge consecutive series points into wider buckets (e.g. days into weeks starting on Monday)"""
+    merged = OrderedDict()
+    for p in points:
+        key = REGROUP_ORIGIN + ((p['bucket'] - REGROUP_ORIGIN) // width) * width
+        m = merged.get(key)
+        if m is None:
+            merged[key] = dict(p, bucket=key)
+            continue
+        m['count'] += p['count']
+        m['sum'] += p['sum']
+        m['sum_sq'] += p['sum_sq']
+        m['min'] = min(m['min'], p['min'])
+        m['max'] = max(m['max'], p['max'])
+    return [_point(k, m['count'], m['sum'], m['sum_sq'], m['min'], m['max']) for k, m in merged.items()]
+
+
+def _point(bucket, count, total, total_sq, minimum, maximum):
+    mean = total / count if count else None
+    variance = max(0.0, total_sq / count - mean * mean) if count else None
+    return {
+        'bucket': bucket,
+        'count': count,
+        'sum': total,
+        'sum_sq': total_sq,
+        'avg': mean,
+        'min': minimum,
+        'max': maximum,
+        'stddev': variance ** 0.5 if variance is not None else None,
+    }
@@ -0,0 +1,296 @@
+"""
+Mergeable quantile sketches of KPI measurements
+Every (element, kpi, hour) keeps a DDSketch of its values, updated on ingest.
+A DDSketch maps each value x to the bin ceil(log_gamma |x|) with
+gamma = (1 + alpha) / (1 - alpha); positive and negative values have their own
+bins and values too close to zero are counted separately. Any quantile read
+back from the bins is within a relative error alpha of the exact value, and
+two sketches merge by adding their bin counts, so a percentile over any range,
+per element, per domain or overall, comes from merging hourly sketches instead
+of sorting the raw values. Partial hours at the edges of a range are sketched
+from the raw measurements on the fly, so ranges need not be hour aligned.
+
+Bins are stored as packed (int16 key, uint32 count) pairs, a few hundred
+bytes per sketch for typical KPIs.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import and_, bindparam, select, tuple_, update
+
+from app import db
+from app.models.network import KPISketch, NetworkElement
+from app.services.partitioning import measurement_source
+from app.services.sql_helpers import dialect_name, upsert_insert
+
+RELATIVE_ACCURACY = 0.01  # changing it requires `flask rollups rebuild`
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+MIN_INDEXABLE = 1e-9  # |x| below this counts as zero
+BIN_DTYPE = np.dtype([('key', '<i2'), ('count', '<u4')])
+SKETCH_WIDTH = timedelta(hours=1)
+KEY_BATCH = 500  # sketch rows locked and merged per statement
+
+
+class QuantileSketch:
+    """DDSketch over positive and negative values"""
+
+    def __init__(self, positive=None, negative=None, zero_count=0, min_value=None, max_value=None):
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self.positive = positive if positive is not None else empty  # (sorted keys, counts)
+        self.negative = negative if negative is not None else empty  # keys of |x|
+        self.zero_count = int(zero_count)
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @property
+    def count(self):
+        return int(self.positive[1].sum() + self.negative[1].sum()) + self.zero_count
+
+    @classmethod
+    def from_values(cls, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return cls()
+        magnitude = np.abs(values)
+        nonzero = magnitude >= MIN_INDEXABLE
+        keys = np.ceil(np.log(magnitude[nonzero]) / LOG_GAMMA).astype(np.int64)
+        negative = values[nonzero] < 0
+        return cls(
+            positive=np.unique(keys[~negative], return_counts=True),
+            negative=np.unique(keys[negative], return_counts=True),
+            zero_count=int((~nonzero).sum()),
+            min_value=float(values.min()),
+            max_value=float(values.max()),
+        )
+
+    @classmethod
+    def merge(cls, sketches):
+        """One sketch holding every value of the given sketches"""
+        sketches = [s for s in sketches if s.count]
+        if not sketches:
+            return cls()
+        return cls(
+            positive=_merge_bins([s.positive for s in sketches]),
+            negative=_merge_bins([s.negative for s in sketches]),
+            zero_count=sum(s.zero_count for s in sketches),
+            min_value=min(s.min_value for s in sketches),
+            max_value=max(s.max_value for s in sketches),
+        )
+
+    def quantiles(self, qs):
+        """Values at quantiles qs (0..1), None when the sketch is empty"""
+        total = self.count
+        if not total:
+            return [None] * len(qs)
+        # Bins in value order: negatives from the largest magnitude, zero, positives
+        neg_keys, neg_counts = self.negative
+        pos_keys, pos_counts = self.positive
+        values = np.concatenate((
+            -_bin_value(neg_keys[::-1]), [0.0] if self.zero_count else [], _bin_value(pos_keys)
+        ))
+        counts = np.concatenate((neg_counts[::-1], [self.zero_count] if self.zero_count else [], pos_counts))
+        cumulative = np.cumsum(counts)
+        ranks = np.asarray(qs, dtype=np.float64) * (total - 1)
+        found = values[np.minimum(np.searchsorted(cumulative, ranks, side='right'), len(values) - 1)]
+        found = np.clip(found, self.min_value, self.max_value)
+        return [float(v) for v in found]
+
+    def to_row(self):
+        return {
+            'sample_count': self.count,
+            'zero_count': self.zero_count,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'positive_bins': _encode_bins(self.positive),
+            'negative_bins': _encode_bins(self.negative),
+        }
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            positive=_decode_bins(row.positive_bins),
+            negative=_decode_bins(row.negative_bins),
+            zero_count=row.zero_count,
+            min_value=row.min_value,
+            max_value=row.max_value,
+        )
+
+
+def _bin_value(keys):
+    """Representative value of bins (relative error <= RELATIVE_ACCURACY)"""
+    return 2 * np.power(GAMMA, keys.astype(np.float64)) / (GAMMA + 1)
+
+
+def _merge_bins(bins):
+    keys = np.concatenate([k for k, _ in bins])
+    counts = np.concatenate([c for _, c in bins])
+    if not len(keys):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    merged_keys, inverse = np.unique(keys, return_inverse=True)
+    return merged_keys, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def _encode_bins(bins):
+    keys, counts = bins
+    packed = np.empty(len(keys), dtype=BIN_DTYPE)
+    packed['key'] = keys
+    packed['count'] = counts
+    return packed.tobytes()
+
+
+def _decode_bins(data):
+    packed = np.frombuffer(data or b'', dtype=BIN_DTYPE)
+    return packed['key'].astype(np.int64), packed['count'].astype(np.int64)
+
+
+def sketch_start(ts):
+    """Start of the sketch hour containing ts"""
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+# ----------------------------------------------------------------------
+# Maintenance (ingest, rebuilds)
+# ----------------------------------------------------------------------
+
+def apply_sketches(rows):
+    """Merge measurement rows into the hourly sketches (caller commits)
+
+    Missing sketch rows are created first, then the affected rows are read
+    (locked on PostgreSQL), merged and written back in key order, so
+    concurrent ingest never loses an update. Returns the number of sketches
+    updated.
+    """
+    values = defaultdict(list)
+    for row in rows:
+        values[(row['element_id'], row['kpi_id'], sketch_start(row['timestamp']))].append(row['value'])
+    if not values:
+        return 0
+
+    table = KPISketch.__table__
+    keys = sorted(values)
+    empty = QuantileSketch().to_row()
+    for i in range(0, len(keys), KEY_BATCH):
+        batch = keys[i:i + KEY_BATCH]
+        db.session.execute(
+            upsert_insert(table).on_conflict_do_nothing(
+                index_elements=[table.c.element_id, table.c.kpi_id, table.c.bucket_start]),
+            [dict(empty, element_id=e, kpi_id=k, bucket_start=h) for e, k, h in batch]
+        )
+        query = select(table).where(
+            tuple_(table.c.element_id, table.c.kpi_id, table.c.bucket_start).in_(batch)
+        ).order_by(table.c.element_id, table.c.kpi_id, table.c.bucket_start)
+        if dialect_name() == 'postgresql':
+            query = query.with_for_update()
+
+        updates = []
+        for stored in db.session.execute(query):
+            key = (stored.element_id, stored.kpi_id, stored.bucket_start)
+            merged = QuantileSketch.merge([QuantileSketch.from_row(stored), QuantileSketch.from_values(values[key])])
+            updates.append(dict(merged.to_row(), b_element_id=key[0], b_kpi_id=key[1], b_bucket_start=key[2]))
+        db.session.execute(update(table).where(
+            table.c.element_id == bindparam('b_element_id'),
+            table.c.kpi_id == bindparam('b_kpi_id'),
+            table.c.bucket_start == bindparam('b_bucket_start')
+        ).values({column: bindparam(column) for column in empty}), updates)
+    return len(keys)
+
+
+def delete_sketches(start=None, end=None, element_id=None, kpi_id=None):
+    """Delete the sketches of hours in [start, end), optionally of one series"""
+    query = KPISketch.query
+    if start is not None:
+        query = query.filter(KPISketch.bucket_start >= start)
+    if end is not None:
+        query = query.filter(KPISketch.bucket_start < end)
+    if element_id is not None:
+        query = query.filter(KPISketch.element_id == element_id, KPISketch.kpi_id == kpi_id)
+    query.delete(synchronize_session=False)
+
+
+# ----------------------------------------------------------------------
+# Queries
+# ----------------------------------------------------------------------
+
+SKETCH_GROUPS = ('element', 'domain', 'all')
+
+
+def kpi_percentiles(kpi_ids, start, end, quantiles, element_ids=None, group_by='element', domain=None):
+    """Quantiles of each KPI over [start, end), per element, per domain or overall
+
+    Whole hours are read from the stored sketches; the partial hours at
+    either end are sketched from raw measurements. Returns
+    {(group, kpi_id): {'count', 'min', 'max', 'quantiles': [...]}} where
+    group is the element id, the domain or None.
+    """
+    if group_by not in SKETCH_GROUPS:
+        raise ValueError(f'group_by must be one of {SKETCH_GROUPS}')
+    first_full = sketch_start(start)
+    if first_full < start:
+        first_full += SKETCH_WIDTH
+    last_full = sketch_start(end)
+
+    groups = defaultdict(list)
+    if first_full < last_full:
+        _stored_sketches(groups, kpi_ids, first_full, last_full, element_ids, group_by, domain)
+        edges = [(start, first_full), (last_full, end)]
+    else:
+        edges = [(start, end)]
+    for edge_start, edge_end in edges:
+        if edge_start < edge_end:
+            _raw_sketches(groups, kpi_ids, edge_start, edge_end, element_ids, group_by, domain)
+
+    result = {}
+    for key, sketches in groups.items():
+        merged = QuantileSketch.merge(sketches)
+        if merged.count:
+            result[key] = {'count': merged.count, 'min': merged.min_value, 'max': merged.max_value,
+                           'quantiles': merged.quantiles(quantiles)}
+    return result
+
+
+def _group_column(source, group_by):
+    if group_by == 'element':
+        return source.element_id
+    if group_by == 'domain':
+        return NetworkElement.domain
+    return None
+
+
+def _filtered(query, source, kpi_ids, element_ids, group_by, domain):
+    query = query.filter(source.kpi_id.in_(kpi_ids))
+    if element_ids is not None:
+        query = query.filter(source.element_id.in_(element_ids))
+    if group_by == 'domain' or domain:
+        query = query.join(NetworkElement, NetworkElement.id == source.element_id)
+    if domain:
+        query = query.filter(NetworkElement.domain == domain)
+    return query
+
+
+def _stored_sketches(groups, kpi_ids, start, end, element_ids, group_by, domain):
+    group = _group_column(KPISketch, group_by)
+    columns = [KPISketch.kpi_id, KPISketch.zero_count, KPISketch.min_value, KPISketch.max_value,
+               KPISketch.positive_bins, KPISketch.negative_bins]
+    query = db.session.query(*columns, *([group.label('grp')] if group is not None else []))
+    query = _filtered(query, KPISketch, kpi_ids, element_ids, group_by, domain).filter(
+        KPISketch.bucket_start >= start, KPISketch.bucket_start < end, KPISketch.sample_count > 0
+    )
+    for row in query.execution_options(yield_per=5000):
+        groups[(row.grp if group is not None else None, row.kpi_id)].append(QuantileSketch.from_row(row))
+
+
+def _raw_sketches(groups, kpi_ids, start, end, element_ids, group_by, domain):
+    m = measurement_source(start, end)
+    group = _group_column(m, group_by)
+    query = db.session.query(m.kpi_id, m.value, *([group.label('grp')] if group is not None else []))
+    query = _filtered(query, m, kpi_ids, element_ids, group_by, domain).filter(
+        and_(m.timestamp >= start, m.timestamp < end))
+    values = defaultdict(list)
+    for row in query:
+        values[(row.grp if group is not None else None, row.kpi_id)].append(row.value)
+    for key, series in values.items():
+        groups[key].append(QuantileSketch.from_values(series))
@@ -0,0 +1,60 @@
+"""
+Dialect helpers for the SQL the services issue directly
+The app runs on SQLite in development and PostgreSQL in production; both
+support INSERT ... ON CONFLICT, but spell a few scalar functions differently.
+"""
+from sqlalchemy import BigInteger, Integer, cast, event, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+
+
+def dialect_name():
+    return db.engine.dialect.name
+
+
+def upsert_insert(table):
+    """INSERT statement supporting on_conflict_do_update/do_nothing for the current database"""
+    name = dialect_name()
+    if name == 'postgresql':
+        return postgresql_insert(table)
+    if name == 'sqlite':
+        return sqlite_insert(table)
+    raise NotImplementedError(f'Upserts are not supported on {name}')
+
+
+def init_sqlite_wal(engine):
+    """Switch file-based SQLite databases to write-ahead logging
+
+    Without WAL a long streamed read (an export) blocks every commit, so
+    background jobs could not record progress and the web tier could not
+    write while one runs.
+    """
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+    if not event.contains(engine, 'connect', _set_wal):
+        event.listen(engine, 'connect', _set_wal)
+
+
+def _set_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.close()
+
+
+def least(a, b):
+    """Smaller of two scalar expressions"""
+    return func.least(a, b) if dialect_name() == 'postgresql' else func.min(a, b)
+
+
+def greatest(a, b):
+    """Larger of two scalar expressions"""
+    return func.greatest(a, b) if dialect_name() == 'postgresql' else func.max(a, b)
+
+
+def epoch_seconds(column):
+    """Whole seconds since the epoch of a naive UTC timestamp expression"""
+    if dialect_name() == 'postgresql':
+        return cast(func.floor(func.extract('epoch', column)), BigInteger)
+    return cast(func.strftime('%s', column), Integer)
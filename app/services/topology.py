@@ -0,0 +1,437 @@
+"""
+Network topology graph
+Elements and network_links are loaded once into an in-memory adjacency
+structure that serves topology requests. Every insert, update or delete of
+an element or link is logged in topology_changes from a session hook; the
+highest change id is the topology version, so each process rebuilds its
+cached graph only when the version it was built from is outdated. Together
+with the kpi_latest watermark the version identifies a topology response,
+which lets clients revalidate (ETag) or fetch only what changed since.
+
+Large topologies are served at a level of detail: elements are grouped by
+domain, subdomain and location into clusters with aggregated status, link
+and KPI summaries, and clients expand one cluster at a time.
+
+Changes made with bulk query.update()/delete() bypass the session hook and
+must call record_topology_change() themselves.
+"""
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, insert
+
+from app import db
+from app.models.network import KPIDefinition, KPILatest, NetworkElement, NetworkLink, TopologyChange
+from app.services.latest import latest_kpis_changed_since, latest_kpis_for, latest_watermark
+
+EPOCH = datetime(1970, 1, 1)
+
+# Order of the domains from the radio side to the internet; links point this way
+DOMAIN_ORDER = {'ran': 1, 'transport': 2, 'core': 3, 'internet': 4}
+
+# Cluster hierarchy; depth n groups elements by the first n fields and the
+# depth below the last field is the individual element
+CLUSTER_LEVELS = ('domain', 'subdomain', 'location')
+ELEMENT_DEPTH = len(CLUSTER_LEVELS) + 1
+
+
+class TopologyGraph:
+    """Immutable snapshot of the topology at one version"""
+
+    def __init__(self, version, elements, links):
+        self.version = version
+        self.nodes = {
+            e.id: {
+                'id': e.id,
+                'name': e.element_name,
+                'type': e.element_type,
+                'domain': e.domain,
+                'subdomain': e.subdomain,
+                'location': e.location,
+                'status': e.status
+            }
+            for e in elements
+        }
+        self.links = {}
+        self.successors = defaultdict(list)
+        self.predecessors = defaultdict(list)
+        for l in links:
+            self.links[l.id] = {
+                'id': l.id,
+                'source': l.source_id,
+                'target': l.target_id,
+                'type': l.link_type,
+                'capacity_mbps': l.capacity_mbps,
+                'subdomain': l.subdomain,
+                'status': l.status
+            }
+            self.successors[l.source_id].append(l.target_id)
+            self.predecessors[l.target_id].append(l.source_id)
+        self._levels = {}
+
+    def neighbors(self, element_id):
+        return self.successors.get(element_id, []) + self.predecessors.get(element_id, [])
+
+    def node_list(self):
+        return list(self.nodes.values())
+
+    def link_list(self):
+        return list(self.links.values())
+
+    def level(self, depth):
+        """Clusters at depth (1 = domain ... ELEMENT_DEPTH = elements), built once"""
+        level = self._levels.get(depth)
+        if level is None:
+            level = self._levels[depth] = ClusterLevel(self, depth)
+        return level
+
+
+class ClusterLevel:
+    """Elements of a graph grouped into clusters at one depth
+
+    Clusters are keyed by their path, e.g. ('ran', 'north') at depth 2; at
+    ELEMENT_DEPTH the path ends with the element id. Links are aggregated per
+    ordered pair of clusters, skipping links inside a cluster.
+    """
+
+    def __init__(self, graph, depth):
+        self.depth = depth
+        self.paths = {node_id: cluster_path(node, depth) for node_id, node in graph.nodes.items()}
+        self.members = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        for node_id, path in self.paths.items():
+            self.members[path].append(node_id)
+            self.statuses[path][graph.nodes[node_id]['status']] += 1
+
+        self.links = {}
+        for link in graph.links.values():
+            source, target = self.paths.get(link['source']), self.paths.get(link['target'])
+            if source is None or target is None or source == target:
+                continue
+            ids = [link['id']] if depth == ELEMENT_DEPTH else []
+            _add_link(self.links, (source, target), 1, link['capacity_mbps'], {link['status']: 1}, ids)
+
+
+def topology_version():
+    """Current topology version (0 before any change was recorded)"""
+    return db.session.query(func.coalesce(func.max(TopologyChange.id), 0)).scalar()
+
+
+def build_topology_graph():
+    """Load elements and links into a new TopologyGraph"""
+    version = topology_version()
+    elements = db.session.query(
+        NetworkElement.id, NetworkElement.element_name, NetworkElement.element_type,
+        NetworkElement.domain, NetworkElement.subdomain, NetworkElement.location, NetworkElement.status
+    ).order_by(NetworkElement.id).all()
+    links = db.session.query(
+        NetworkLink.id, NetworkLink.source_id, NetworkLink.target_id, NetworkLink.link_type,
+        NetworkLink.capacity_mbps, NetworkLink.subdomain, NetworkLink.status
+    ).order_by(NetworkLink.id).all()
+    return TopologyGraph(version, elements, links)
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_topology_graph(version=None):
+    """Cached topology graph, rebuilt when the topology version has moved"""
+    global _graph
+    if version is None:
+        version = topology_version()
+    graph = _graph
+    if graph is not None and graph.version == version:
+        return graph
+    with _graph_lock:
+        if _graph is None or _graph.version != version:
+            _graph = build_topology_graph()
+        return _graph
+
+
+class TopologyState:
+    """Topology version plus KPI watermark; identifies one topology response
+
+    Serialized as "<version>.<watermark>" where the watermark is the newest
+    kpi_latest update in microseconds since the epoch. Used as the ETag and as
+    the ?since= token for delta requests.
+    """
+
+    def __init__(self, version, watermark):
+        self.version = version
+        self.watermark = watermark
+
+    @classmethod
+    def current(cls):
+        updated = latest_watermark()
+        return cls(topology_version(), _to_micros(updated) if updated else 0)
+
+    @classmethod
+    def parse(cls, token):
+        """Parse a token; raises ValueError when malformed"""
+        version, _, watermark = token.partition('.')
+        state = cls(int(version), int(watermark or 0))
+        if state.version < 0 or state.watermark < 0:
+            raise ValueError(token)
+        return state
+
+    @property
+    def token(self):
+        return f'{self.version}.{self.watermark}'
+
+
+def topology_delta(graph, since, overlap=5, change_overlap=100):
+    """Nodes, links and KPI values changed between since and graph
+
+    Change ids are assigned on insert, not on commit, so a change with an id
+    below since.version may commit after the client read that version; the
+    last change_overlap changes before since.version are therefore read
+    again. Likewise KPI values updated up to overlap seconds before the
+    watermark are included again. Clients apply both idempotently.
+    """
+    changes = db.session.query(TopologyChange.entity, TopologyChange.entity_id, TopologyChange.action).filter(
+        TopologyChange.id > since.version - change_overlap, TopologyChange.id <= graph.version
+    ).order_by(TopologyChange.id)
+
+    first_action = {}
+    for entity, entity_id, action in changes:
+        first_action.setdefault((entity, entity_id), action)
+
+    sections = {'element': (graph.nodes, _delta_section()), 'link': (graph.links, _delta_section())}
+    for (entity, entity_id), action in sorted(first_action.items()):
+        current, section = sections[entity]
+        if entity_id not in current:
+            section['removed'].append(entity_id)
+        elif action == 'insert':
+            section['added'].append(current[entity_id])
+        else:
+            section['changed'].append(current[entity_id])
+
+    kpi_since = _from_micros(since.watermark) - timedelta(seconds=overlap)
+    return {
+        'nodes': sections['element'][1],
+        'links': sections['link'][1],
+        'kpis': latest_kpis_changed_since(kpi_since)
+    }
+
+
+def _delta_section():
+    return {'added': [], 'changed': [], 'removed': []}
+
+
+def _to_micros(ts):
+    return (ts - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+# ----------------------------------------------------------------------
+# Level of detail
+# ----------------------------------------------------------------------
+
+def cluster_path(node, depth):
+    """Cluster path of a node dict at depth"""
+    path = tuple(node[field] for field in CLUSTER_LEVELS[:depth])
+    return path + (node['id'],) if depth == ELEMENT_DEPTH else path
+
+
+def cluster_id(path):
+    """Public id of a cluster, e.g. "ran/north/-" ("-" for an empty field)"""
+    return '/'.join('-' if part is None else str(part) for part in path)
+
+
+def parse_cluster_id(value):
+    """Cluster path from a cluster id; raises ValueError when too deep"""
+    path = tuple(None if part == '-' else part for part in value.strip('/').split('/'))
+    if not value.strip('/') or len(path) > len(CLUSTER_LEVELS):
+        raise ValueError(value)
+    return path
+
+
+def cluster_status(status_counts):
+    """Aggregated status: active, degraded (some members not active) or inactive"""
+    active = status_counts.get('active', 0)
+    if active == sum(status_counts.values()):
+        return 'active'
+    return 'degraded' if active else 'inactive'
+
+
+def auto_depth(graph, max_nodes):
+    """Deepest level whose node count fits in max_nodes (at least the domain level)"""
+    for depth in range(ELEMENT_DEPTH, 1, -1):
+        if len(graph.level(depth).members) <= max_nodes:
+            return depth
+    return 1
+
+
+def cluster_view(graph, depth, parent=()):
+    """Nodes at depth inside the parent cluster and the links between them
+
+    Links leaving the parent are collapsed onto the parent's sibling
+    clusters (flagged external), so a view never contains more nodes than
+    the parent has children. Cluster nodes carry member counts, status and
+    per-KPI summaries of their members' latest values; at ELEMENT_DEPTH the
+    nodes are the elements themselves with their latest KPI values.
+    """
+    level = graph.level(depth)
+    prefix = len(parent)
+    paths = [path for path in level.members if path[:prefix] == parent]
+
+    if depth == ELEMENT_DEPTH:
+        element_ids = [path[-1] for path in paths]
+        latest = latest_kpis_for(element_ids)
+        nodes = [dict(graph.nodes[i], cluster=False, kpis=latest.get(i, {})) for i in element_ids]
+    else:
+        summaries = cluster_kpi_summary(depth, parent)
+        nodes = []
+        for path in paths:
+            counts = level.statuses[path]
+            node = {'id': cluster_id(path), 'cluster': True, 'level': CLUSTER_LEVELS[depth - 1],
+                    'name': path[-1], 'size': len(level.members[path]),
+                    'status': cluster_status(counts), 'status_counts': dict(counts),
+                    'kpis': summaries.get(path, {})}
+            node.update(zip(CLUSTER_LEVELS, path))
+            nodes.append(node)
+
+    links = {}
+    for (source, target), agg in level.links.items():
+        source_inside, target_inside = source[:prefix] == parent, target[:prefix] == parent
+        if not (source_inside or target_inside):
+            continue
+        key = (source if source_inside else source[:prefix], target if target_inside else target[:prefix])
+        if key[0] != key[1]:
+            _add_link(links, key, agg['count'], agg['capacity_mbps'], agg['status_counts'], agg['ids'])
+
+    link_list = []
+    for (source, target), agg in links.items():
+        external = len(source) == prefix or len(target) == prefix
+        link = {'source': _view_id(source, depth), 'target': _view_id(target, depth), 'external': external,
+                'count': agg['count'], 'capacity_mbps': agg['capacity_mbps'],
+                'status_counts': agg['status_counts']}
+        if depth == ELEMENT_DEPTH and not external:
+            link['ids'] = agg['ids']
+        link_list.append(link)
+
+    return {
+        'level': CLUSTER_LEVELS[depth - 1] if depth < ELEMENT_DEPTH else 'element',
+        'parent': cluster_id(parent) if parent else None,
+        'nodes': nodes,
+        'links': link_list
+    }
+
+
+def cluster_kpi_summary(depth, parent=()):
+    """Per-cluster count/avg/min/max of latest KPI values, grouped in SQL
+
+    Returns {cluster_path: {kpi_code: summary}} for clusters at depth below
+    parent.
+    """
+    columns = [getattr(NetworkElement, field) for field in CLUSTER_LEVELS[:depth]]
+    query = db.session.query(
+        *columns, KPIDefinition.kpi_code,
+        func.count(KPILatest.value).label('count'),
+        func.avg(KPILatest.value).label('avg'),
+        func.min(KPILatest.value).label('min'),
+        func.max(KPILatest.value).label('max'),
+        func.avg(KPILatest.quality_score).label('quality_score')
+    ).join(NetworkElement, NetworkElement.id == KPILatest.element_id).join(
+        KPIDefinition, KPIDefinition.id == KPILatest.kpi_id
+    ).group_by(*columns, KPIDefinition.kpi_code)
+    for column, value in zip(columns, parent):
+        query = query.filter(column.is_(None) if value is None else column == value)
+
+    result = {}
+    for row in query:
+        result.setdefault(tuple(row[:depth]), {})[row.kpi_code] = {
+            'count': row.count, 'avg': row.avg, 'min': row.min, 'max': row.max,
+            'quality_score': row.quality_score
+        }
+    return result
+
+
+def _view_id(path, depth):
+    return path[-1] if len(path) == depth == ELEMENT_DEPTH else cluster_id(path)
+
+
+def _add_link(links, key, count, capacity, status_counts, ids):
+    agg = links.get(key)
+    if agg is None:
+        agg = links[key] = {'count': 0, 'capacity_mbps': 0, 'status_counts': {}, 'ids': []}
+    agg['count'] += count
+    agg['capacity_mbps'] += capacity or 0
+    for status, n in status_counts.items():
+        agg['status_counts'][status] = agg['status_counts'].get(status, 0) + n
+    agg['ids'].extend(ids)
+
+
+def record_topology_change(entity, entity_ids, action='update', connection=None):
+    """Log changes to elements or links, bumping the topology version"""
+    rows = [{'entity': entity, 'entity_id': i, 'action': action, 'changed_at': datetime.utcnow()}
+            for i in entity_ids]
+    if rows:
+        (connection or db.session).execute(insert(TopologyChange.__table__), rows)
+
+
+def derive_links():
+    """Create links for the default chain topology where none exist yet
+
+    Elements of a domain are chained in id order and the last element of
+    each domain links to the first of the next domain (ran -> transport ->
+    core -> internet). Returns the number of links created.
+    """
+    by_domain = defaultdict(list)
+    for e in NetworkElement.query.order_by(NetworkElement.id):
+        by_domain[e.domain].append(e)
+    existing = {(s, t) for s, t in db.session.query(NetworkLink.source_id, NetworkLink.target_id)}
+
+    wanted = []
+    for domain, members in by_domain.items():
+        for a, b in zip(members, members[1:]):
+            wanted.append((a, b, f'intra-{domain}'))
+    domains = sorted(by_domain, key=lambda d: DOMAIN_ORDER.get(d, 999))
+    for a, b in zip(domains, domains[1:]):
+        wanted.append((by_domain[a][-1], by_domain[b][0], 'inter-domain'))
+
+    created = 0
+    for source, target, link_type in wanted:
+        if (source.id, target.id) in existing or (target.id, source.id) in existing:
+            continue
+        subdomain = source.subdomain if link_type != 'inter-domain' and source.subdomain == target.subdomain else None
+        db.session.add(NetworkLink(source_id=source.id, target_id=target.id,
+                                   link_type=link_type, subdomain=subdomain))
+        created += 1
+    db.session.commit()
+    return created
+
+
+# ----------------------------------------------------------------------
+# Change tracking
+# ----------------------------------------------------------------------
+
+_TRACKED = {NetworkElement: 'element', NetworkLink: 'link'}
+
+
+def _log_topology_changes(session, flush_context):
+    changes = []
+    for objects, action in ((session.new, 'insert'), (session.dirty, 'update'), (session.deleted, 'delete')):
+        for obj in objects:
+            entity = _TRACKED.get(type(obj))
+            if entity is None:
+                continue
+            if action == 'update' and not session.is_modified(obj, include_collections=False):
+                continue
+            changes.append((entity, obj.id, action))
+    if changes:
+        connection = session.connection()
+        for entity, entity_id, action in changes:
+            record_topology_change(entity, [entity_id], action, connection=connection)
+
+
+def init_topology_tracking():
+    """Bump the topology version whenever elements or links change"""
+    session = db.session
+    if not event.contains(session, 'after_flush', _log_topology_changes):
+        event.listen(session, 'after_flush', _log_topology_changes)
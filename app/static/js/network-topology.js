@@ -94,12 +94,18 @@ class NetworkTopologyVisualization {
         });
     }
 
-    // Load network data from API
-    loadData() {
-        // In a real implementation, this would fetch from an API
-        fetch('/api/network/topology')
+    // Load network data from API; large networks arrive as clusters that
+    // expand on double click
+    loadData(cluster) {
+        const url = cluster ? `/api/topology/clusters/${cluster}` : '/api/topology?level=auto';
+        fetch(url)
             .then(response => response.json())
             .then(data => {
+                if (this.simulation) this.simulation.stop();
+                this.svg.select('g').selectAll('*').remove();
+                // Links to clusters outside the expanded one have no node to attach to
+                const ids = new Set(data.nodes.map(d => d.id));
+                data.links = data.links.filter(d => ids.has(d.source) && ids.has(d.target));
                 this.renderNetwork(data);
             })
             .catch(error => {
@@ -174,6 +180,9 @@ class NetworkTopologyVisualization {
             .data(data.nodes)
             .enter().append('g')
             .attr('class', 'node')
+            .on('dblclick', (event, d) => {
+                if (d.cluster) this.loadData(d.id);
+            })
             .call(d3.drag()
                 .on('start', this.dragStarted.bind(this))
                 .on('drag', this.dragged.bind(this))
@@ -181,17 +190,29 @@ class NetworkTopologyVisualization {
 
         // Node circles
         this.node.append('circle')
-            .attr('r', 8)
-            .attr('fill', d => this.nodeTypes[d.type]?.color || '#999')
+            .attr('r', d => d.cluster ? 8 + Math.sqrt(d.size) : 8)
+            .attr('fill', d => d.cluster ? this.domainColors[d.domain] : this.nodeTypes[d.type]?.color || '#999')
             .attr('class', d => `node-status-${d.status}`);
 
         // Node labels
         this.node.append('text')
             .attr('dy', -12)
             .attr('text-anchor', 'middle')
-            .text(d => d.name)
+            .text(d => d.cluster ? `${d.name ?? '-'} (${d.size})` : d.name)
             .attr('font-size', '10px');
 
+        // Positions computed by the server are used as is
+        if (data.nodes.length && data.nodes.every(d => d.x != null && d.y != null)) {
+            const byId = new Map(data.nodes.map(d => [d.id, d]));
+            data.links.forEach(d => {
+                d.source = byId.get(d.source);
+                d.target = byId.get(d.target);
+            });
+            this.simulation = null;
+            this.ticked();
+            return;
+        }
+
         // Set up force simulation
         this.simulation = d3.forceSimulation(data.nodes)
             .force('link', d3.forceLink(data.links).id(d => d.id).distance(100))
@@ -215,7 +236,7 @@ class NetworkTopologyVisualization {
 
     // Drag handlers
     dragStarted(event, d) {
-        if (!event.active) this.simulation.alphaTarget(0.3).restart();
+        if (!event.active && this.simulation) this.simulation.alphaTarget(0.3).restart();
         d.fx = d.x;
         d.fy = d.y;
     }
@@ -223,10 +244,15 @@ class NetworkTopologyVisualization {
     dragged(event, d) {
         d.fx = event.x;
         d.fy = event.y;
+        if (!this.simulation) {
+            d.x = event.x;
+            d.y = event.y;
+            this.ticked();
+        }
     }
 
     dragEnded(event, d) {
-        if (!event.active) this.simulation.alphaTarget(0);
+        if (!event.active && this.simulation) this.simulation.alphaTarget(0);
         d.fx = null;
         d.fy = null;
     }
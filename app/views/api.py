@@ -1,12 +1,34 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, send_file, url_for
 from flask_login import login_required, current_user
 from app import db
-from app.models.network import NetworkElement, KPIMeasurement, KPIDefinition, Alert
+from app.models.network import NetworkElement, NetworkLink, KPIDefinition, Alert
 from app.models.simulation import SimulationScenario, PerformanceTest
+from app.models.jobs import Job
 from app.services.simulation import SimulationEngine
+from app.services.partitioning import measurement_source
+from app.services.ingest import (
+    CONFLICT_MODES, IngestError, existing_series_points, ingest_measurements, parse_timestamp, prepare_measurements
+)
+from app.services.ingest_queue import enqueue_measurements
+from app.services.latest import latest_kpis_for
+from app.services.aggregation import (
+    BUCKET_WIDTHS, PERCENTILE, aggregate_kpis, auto_bucket, bucket_range, parse_functions
+)
+from app.services.downsampling import downsample_rows, downsampling_params
+from app.services.impact import get_reachability
+from app.services.jobs import JOB_TYPES, can_cancel, can_enqueue, cancel_job, enqueue_job
+from app.services.layout import get_topology_layout
+from app.services.paths import get_path_set, hop_metrics
+from app.services.sketches import SKETCH_GROUPS, kpi_percentiles
+from app.services.topology import (
+    CLUSTER_LEVELS, ELEMENT_DEPTH, TopologyState, auto_depth, cluster_view, get_topology_graph,
+    parse_cluster_id, topology_delta
+)
 from datetime import datetime, timedelta
 from functools import wraps
 import json
+import os
+import numpy as np
 
 # Create API blueprint
 api_bp = Blueprint('api', __name__)
@@ -58,6 +80,7 @@ def get_network_elements():
         query = query.filter_by(status=status)
     
     elements = query.all()
+    latest_kpis = latest_kpis_for([e.id for e in elements] if domain or status else None)
     
     result = [{
         'id': e.id,
@@ -65,7 +88,8 @@ def get_network_elements():
         'type': e.element_type,
         'domain': e.domain,
         'status': e.status,
-        'location': e.location
+        'location': e.location,
+        'kpis': latest_kpis.get(e.id, {})
     } for e in elements]
     
     return jsonify(result)
@@ -118,19 +142,45 @@ def get_element_kpis(element_id):
         if not kpi_def:
             return jsonify({'error': 'Invalid KPI code'}), 400
     
-    # Get KPI measurements
+    # ?bucket= returns per-bucket aggregates instead of every raw point
+    if request.args.get('bucket'):
+        kpis = [kpi_def] if kpi_def else KPIDefinition.query.order_by(KPIDefinition.id).all()
+        end = datetime.utcnow()
+        return kpi_aggregate_response(kpis, [element_id], end - timedelta(hours=hours), end)
+    
+    try:
+        max_points, mode = downsampling_params(request.args, current_app.config.get('CHART_MAX_POINTS', 1000),
+                                               current_app.config.get('CHART_DOWNSAMPLING', 'lttb'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Get KPI measurements (columns only; KPI details come from one join)
     cutoff = datetime.utcnow() - timedelta(hours=hours)
-    query = KPIMeasurement.query.filter(
-        KPIMeasurement.element_id == element_id,
-        KPIMeasurement.timestamp >= cutoff
+    measurement = measurement_source(cutoff)
+    query = db.session.query(
+        measurement.timestamp, measurement.value, measurement.quality_score,
+        KPIDefinition.kpi_code, KPIDefinition.unit
+    ).join(KPIDefinition, KPIDefinition.id == measurement.kpi_id).filter(
+        measurement.element_id == element_id,
+        measurement.timestamp >= cutoff
     )
     
     if kpi_def:
-        query = query.filter(KPIMeasurement.kpi_id == kpi_def.id)
+        query = query.filter(measurement.kpi_id == kpi_def.id)
     
-    measurements = query.order_by(KPIMeasurement.timestamp).all()
+    rows = [row._asdict() for row in query.order_by(measurement.timestamp)]
     
-    result = [m.to_dict() for m in measurements]
+    # About max_points representative points per KPI (?max_points=0 returns all)
+    rows = downsample_rows(rows, max_points, mode, key=lambda row: row['kpi_code'])
+    
+    result = [{
+        'element': element.element_name,
+        'kpi': row['kpi_code'],
+        'value': row['value'],
+        'unit': row['unit'],
+        'timestamp': row['timestamp'].isoformat(),
+        'quality_score': row['quality_score']
+    } for row in rows]
     
     return jsonify(result)
 
@@ -207,69 +257,247 @@ def update_network_element(element_id):
     })
 
 
+def _arg_list(name):
+    """Values of a repeatable, comma-separated query parameter"""
+    return [v.strip() for arg in request.args.getlist(name) for v in arg.split(',') if v.strip()]
+
+
+def _kpi_range_args():
+    """(kpis, element_ids, start, end) from the kpi_code, element_id and range parameters
+
+    element_ids is None when no element is given. Raises ValueError with a
+    message for the client.
+    """
+    kpi_codes = _arg_list('kpi_code')
+    if not kpi_codes:
+        raise ValueError('kpi_code is required')
+    kpis = KPIDefinition.query.filter(KPIDefinition.kpi_code.in_(kpi_codes)).all()
+    unknown = sorted(set(kpi_codes) - {k.kpi_code for k in kpis})
+    if unknown:
+        raise ValueError(f'Invalid KPI code: {", ".join(unknown)}')
+    
+    element_ids = None
+    if _arg_list('element_id'):
+        try:
+            element_ids = sorted({int(e) for e in _arg_list('element_id')})
+        except ValueError:
+            raise ValueError('element_id must be integers')
+    
+    try:
+        end = parse_timestamp(request.args['end']) if request.args.get('end') else datetime.utcnow()
+        if request.args.get('start'):
+            start = parse_timestamp(request.args['start'])
+        else:
+            start = end - timedelta(hours=request.args.get('hours', 24, type=float))
+    except IngestError as e:
+        raise ValueError(str(e))
+    if start >= end:
+        raise ValueError('start must be before end')
+    return kpis, element_ids, start, end
+
+
+def kpi_aggregate_response(kpis, element_ids, start, end):
+    """JSON response of aggregate_kpis() for the bucket/agg query parameters"""
+    try:
+        functions = parse_functions(_arg_list('agg') or ['avg'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    bucket = request.args.get('bucket') or 'auto'
+    if bucket == 'auto':
+        bucket = auto_bucket(start, end, current_app.config.get('KPI_AGGREGATE_TARGET_BUCKETS', 500))
+    if bucket not in BUCKET_WIDTHS:
+        return jsonify({'error': f'bucket must be auto or one of {list(BUCKET_WIDTHS)}'}), 400
+    start, end = bucket_range(start, end, bucket)
+    max_buckets = current_app.config.get('KPI_AGGREGATE_MAX_BUCKETS', 5000)
+    if (end - start) / BUCKET_WIDTHS[bucket] > max_buckets:
+        return jsonify({'error': f'More than {max_buckets} buckets requested; use a wider bucket'}), 400
+    
+    by_id = {k.id: k for k in kpis}
+    series = aggregate_kpis(list(by_id), start, end, bucket, functions, element_ids=element_ids)
+    result = []
+    for (element_id, kpi_id), points in series.items():
+        kpi = by_id[kpi_id]
+        points['buckets'] = [b.isoformat() for b in points['buckets']]
+        result.append({'element_id': element_id, 'kpi_code': kpi.kpi_code, 'unit': kpi.unit, **points})
+    
+    return jsonify({
+        'bucket': bucket,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'functions': functions,
+        'series': result
+    })
+
+
+@api_bp.route('/kpi/aggregate', methods=['GET'])
+@api_login_required
+def get_kpi_aggregate():
+    """Time-bucketed KPI aggregates computed in the database
+    
+    Query parameters: kpi_code (required) and element_id (repeatable or
+    comma-separated; without elements the series cover all elements), start
+    and end (ISO 8601 or epoch seconds) or hours (default 24), bucket (1m, 5m,
+    15m, 1h, 6h, 1d or auto) and agg (avg, min, max, count, sum, last, pNN).
+    """
+    try:
+        kpis, element_ids, start, end = _kpi_range_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return kpi_aggregate_response(kpis, element_ids, start, end)
+
+
+@api_bp.route('/kpi/percentiles', methods=['GET'])
+@api_login_required
+def get_kpi_percentiles():
+    """KPI percentiles over any time range from the hourly quantile sketches
+    
+    Query parameters: kpi_code (required), element_id (repeatable or
+    comma-separated), domain, start and end (ISO 8601 or epoch seconds) or
+    hours (default 24), q (pNN, e.g. p5,p50,p95,p99.9; default p50,p95,p99)
+    and group_by (element, domain or all). Values are within 1% relative
+    error of the exact percentiles.
+    """
+    try:
+        kpis, element_ids, start, end = _kpi_range_args()
+        names = parse_functions(_arg_list('q') or ['p50', 'p95', 'p99'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if any(not PERCENTILE.match(name) for name in names):
+        return jsonify({'error': 'q must be percentiles such as p95 or p99.9'}), 400
+    group_by = request.args.get('group_by', 'element')
+    if group_by not in SKETCH_GROUPS:
+        return jsonify({'error': f'group_by must be one of {list(SKETCH_GROUPS)}'}), 400
+    
+    by_id = {k.id: k for k in kpis}
+    quantiles = [float(PERCENTILE.match(name).group(1)) / 100 for name in names]
+    groups = kpi_percentiles(list(by_id), start, end, quantiles, element_ids=element_ids,
+                             group_by=group_by, domain=request.args.get('domain'))
+    result = []
+    group_key = {'element': 'element_id', 'domain': 'domain'}.get(group_by)
+    for (group, kpi_id), summary in sorted(groups.items()):
+        kpi = by_id[kpi_id]
+        result.append({
+            **({group_key: group} if group_key else {}),
+            'kpi_code': kpi.kpi_code,
+            'unit': kpi.unit,
+            'count': summary['count'],
+            'min': summary['min'],
+            'max': summary['max'],
+            **dict(zip(names, summary['quantiles'])),
+        })
+    
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'group_by': group_by,
+        'percentiles': names,
+        'series': result
+    })
+
+
 @api_bp.route('/kpi/measurements', methods=['POST'])
 @engineer_required
 def create_kpi_measurement():
-    """Create a new KPI measurement"""
+    """Create a new KPI measurement
+    
+    An optional timestamp (ISO 8601 or epoch seconds) records when the value
+    was measured; re-sending the same point is reported as a duplicate.
+    """
     data = request.get_json()
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
-    # Validate required fields
-    required_fields = ['element_name', 'kpi_code', 'value']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    
-    # Get element and KPI definition
-    element = NetworkElement.query.filter_by(element_name=data['element_name']).first()
-    if not element:
-        return jsonify({'error': 'Invalid element name'}), 400
-    
-    kpi_def = KPIDefinition.query.filter_by(kpi_code=data['kpi_code']).first()
-    if not kpi_def:
-        return jsonify({'error': 'Invalid KPI code'}), 400
-    
-    # Calculate quality score based on KPI definition
-    quality_score = None
-    if kpi_def.optimal_value is not None and kpi_def.min_value is not None and kpi_def.max_value is not None:
-        # Calculate based on distance from optimal value
-        value = float(data['value'])
-        range_size = kpi_def.max_value - kpi_def.min_value
-        if range_size > 0:
-            distance = abs(value - kpi_def.optimal_value) / range_size
-            quality_score = max(0, min(100, 100 * (1 - distance)))
-    
-    # Create measurement
-    measurement = KPIMeasurement(
-        element_id=element.id,
-        kpi_id=kpi_def.id,
-        value=float(data['value']),
-        timestamp=datetime.utcnow(),
-        quality_score=quality_score
-    )
+    on_conflict = data.get('on_conflict', 'ignore')
+    if on_conflict not in CONFLICT_MODES:
+        return jsonify({'error': f'on_conflict must be one of: {", ".join(CONFLICT_MODES)}'}), 400
+    
+    rows, errors = prepare_measurements([data])
+    if errors:
+        return jsonify({'error': errors[0]['error']}), 400
+    
+    if current_app.config.get('INGEST_QUEUE_ENABLED'):
+        enqueue_measurements(rows, on_conflict)
+        db.session.commit()
+        return jsonify({
+            'success': True,
+            'queued': 1,
+            'message': 'KPI measurement queued for ingestion'
+        }), 202
+    
+    existed = on_conflict == 'update' and bool(existing_series_points(rows))
+    # Routed to its time partition; rollups and alerts updated
+    measurement_id, = ingest_measurements(rows, on_conflict=on_conflict)
+    db.session.commit()
     
-    db.session.add(measurement)
+    if measurement_id is None:
+        return jsonify({
+            'success': True,
+            'duplicate': True,
+            'message': 'KPI measurement already recorded'
+        }), 200
+    
+    if existed:
+        return jsonify({
+            'success': True,
+            'id': measurement_id,
+            'created': False,
+            'updated': True,
+            'message': 'KPI measurement updated successfully'
+        }), 200
     
-    # Check if this measurement should trigger an alert
-    if kpi_def.is_critical(float(data['value'])):
-        alert = Alert(
-            element_id=element.id,
-            kpi_id=kpi_def.id,
-            alert_type='kpi_threshold',
-            severity='high',
-            message=f'Critical {kpi_def.kpi_name} value: {data["value"]} {kpi_def.unit or ""}',
-            created_at=datetime.utcnow()
-        )
-        db.session.add(alert)
+    return jsonify({
+        'success': True,
+        'id': measurement_id,
+        'created': True,
+        'updated': False,
+        'message': 'KPI measurement created successfully'
+    }), 201
+
+
+@api_bp.route('/kpi/measurements/batch', methods=['POST'])
+@engineer_required
+def create_kpi_measurements_batch():
+    """Create many KPI measurements in one transaction
     
+    Invalid records are reported by index and do not block the valid ones.
+    """
+    data = request.get_json()
+    if not data or not isinstance(data.get('measurements'), list):
+        return jsonify({'error': 'measurements list is required'}), 400
+    
+    records = data['measurements']
+    max_batch = current_app.config.get('INGEST_MAX_BATCH', 5000)
+    if len(records) > max_batch:
+        return jsonify({'error': f'Batch too large (max {max_batch} measurements)'}), 413
+    
+    on_conflict = data.get('on_conflict', 'ignore')
+    if on_conflict not in CONFLICT_MODES:
+        return jsonify({'error': f'on_conflict must be one of: {", ".join(CONFLICT_MODES)}'}), 400
+    
+    rows, errors = prepare_measurements(records)
+    if current_app.config.get('INGEST_QUEUE_ENABLED'):
+        enqueue_measurements(rows, on_conflict)
+        db.session.commit()
+        return jsonify({
+            'success': not errors,
+            'queued': len(rows),
+            'rejected': len(errors),
+            'errors': errors
+        }), 202 if rows else 400
+    
+    ids = ingest_measurements(rows, on_conflict=on_conflict)
     db.session.commit()
     
+    accepted = sum(1 for measurement_id in ids if measurement_id is not None)
     return jsonify({
-        'success': True,
-        'id': measurement.id,
-        'message': f'KPI measurement created successfully'
-    }), 201
+        'success': not errors,
+        'accepted': accepted,
+        'duplicates': len(ids) - accepted,
+        'rejected': len(errors),
+        'errors': errors
+    }), 200 if not errors or rows else 400
 
 
 @api_bp.route('/alerts', methods=['GET'])
@@ -329,62 +557,343 @@ def acknowledge_alert(alert_id):
 @api_bp.route('/topology', methods=['GET'])
 @api_login_required
 def get_topology():
-    """Get network topology data for visualization"""
-    # Get all elements
-    elements = NetworkElement.query.all()
-    
-    # Structure for D3.js force-directed graph
-    nodes = []
-    links = []
-    
-    # Add nodes (elements)
-    for e in elements:
-        latest_kpis = e.get_latest_kpis()
-        nodes.append({
-            'id': e.id,
-            'name': e.element_name,
-            'type': e.element_type,
-            'domain': e.domain,
-            'status': e.status,
-            'kpis': latest_kpis
-        })
+    """Get network topology data for visualization
+    
+    Responses carry an ETag; clients polling with If-None-Match get 304 when
+    nothing changed, and ?since=<version> returns only what changed since an
+    earlier response. ?level=domain|subdomain|location returns clusters
+    instead of elements; level=auto picks the most detailed level that fits
+    TOPOLOGY_MAX_NODES.
+    """
+    state = TopologyState.current()
+    etag = f'topology-{state.token}'
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    
+    # Nodes and links come from the cached graph; only KPIs are read per request
+    graph = get_topology_graph(state.version)
+    
+    level = request.args.get('level')
+    if level:
+        if level == 'auto':
+            depth = auto_depth(graph, current_app.config.get('TOPOLOGY_MAX_NODES', 500))
+        elif level in CLUSTER_LEVELS:
+            depth = CLUSTER_LEVELS.index(level) + 1
+        else:
+            return jsonify({'error': f'Invalid level, expected auto or one of: {", ".join(CLUSTER_LEVELS)}'}), 400
+        if depth < ELEMENT_DEPTH:
+            response = jsonify(dict(cluster_view(graph, depth), version=state.token))
+            response.set_etag(etag, weak=True)
+            return response
+    
+    since = request.args.get('since')
+    if since:
+        try:
+            since_state = TopologyState.parse(since)
+        except ValueError:
+            return jsonify({'error': 'Invalid since version'}), 400
+        if since_state.version <= state.version:
+            delta = topology_delta(graph, since_state,
+                                   overlap=current_app.config.get('TOPOLOGY_DELTA_OVERLAP', 5),
+                                   change_overlap=current_app.config.get('TOPOLOGY_DELTA_CHANGE_OVERLAP', 100))
+            layout = get_topology_layout(graph)
+            for section in ('added', 'changed'):
+                delta['nodes'][section] = layout.with_positions(delta['nodes'][section])
+            listed = [n['id'] for n in delta['nodes']['added'] + delta['nodes']['changed']]
+            delta['nodes']['moved'] = layout.moved_since(since_state.version, exclude=listed)
+            response = jsonify(dict(delta, version=state.token, since=since, full=False))
+            response.set_etag(etag, weak=True)
+            return response
+        # The client is ahead of the database (e.g. restored backup): resend everything
+    
+    latest_kpis = latest_kpis_for()
+    layout = get_topology_layout(graph)
+    nodes = [dict(node, kpis=latest_kpis.get(node_id, {}), **layout.position(node_id))
+             for node_id, node in graph.nodes.items()]
+    
+    response = jsonify({
+        'version': state.token,
+        'full': True,
+        'nodes': nodes,
+        'links': graph.link_list()
+    })
+    response.set_etag(etag, weak=True)
+    return response
+
+
+@api_bp.route('/topology/clusters/<path:cluster>', methods=['GET'])
+@api_login_required
+def expand_topology_cluster(cluster):
+    """Children of one topology cluster (sub-clusters, or elements of a location)"""
+    try:
+        parent = parse_cluster_id(cluster)
+    except ValueError:
+        return jsonify({'error': 'Invalid cluster id'}), 400
+    
+    state = TopologyState.current()
+    graph = get_topology_graph(state.version)
+    if parent not in graph.level(len(parent)).members:
+        return jsonify({'error': 'Cluster not found'}), 404
+    
+    view = cluster_view(graph, len(parent) + 1, parent)
+    if view['level'] == 'element':
+        view['nodes'] = get_topology_layout(graph).with_positions(view['nodes'])
+    response = jsonify(dict(view, version=state.token))
+    response.set_etag(f'topology-{state.token}', weak=True)
+    return response
+
+
+@api_bp.route('/topology/links', methods=['POST'])
+@engineer_required
+def create_topology_link():
+    """Create a link between two network elements"""
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
     
-    # Define connections based on network architecture
-    # In a real app, these would come from a connections table
-    # For this prototype, we'll define a simple chain topology
-    
-    # Sort elements by domain in the expected order
-    domain_order = {'ran': 1, 'transport': 2, 'core': 3, 'internet': 4}
-    elements_by_domain = {}
-    
-    for e in elements:
-        if e.domain not in elements_by_domain:
-            elements_by_domain[e.domain] = []
-        elements_by_domain[e.domain].append(e)
-    
-    # Connect elements within domains
-    for domain, domain_elements in elements_by_domain.items():
-        for i in range(len(domain_elements) - 1):
-            links.append({
-                'source': domain_elements[i].id,
-                'target': domain_elements[i + 1].id,
-                'type': f'intra-{domain}'
-            })
-    
-    # Connect domains in sequence
-    domains = sorted(elements_by_domain.keys(), key=lambda d: domain_order.get(d, 999))
-    for i in range(len(domains) - 1):
-        if domains[i] in elements_by_domain and domains[i + 1] in elements_by_domain:
-            # Connect last element of current domain to first element of next domain
-            source = elements_by_domain[domains[i]][-1].id
-            target = elements_by_domain[domains[i + 1]][0].id
-            links.append({
-                'source': source,
-                'target': target,
-                'type': f'inter-domain'
-            })
+    for field in ('source', 'target', 'type'):
+        if field not in data:
+            return jsonify({'error': f'Missing required field: {field}'}), 400
+    
+    source = db.session.get(NetworkElement, data['source'])
+    target = db.session.get(NetworkElement, data['target'])
+    if not source or not target or source.id == target.id:
+        return jsonify({'error': 'Invalid source or target element'}), 400
+    
+    if NetworkLink.query.filter(db.or_(
+        db.and_(NetworkLink.source_id == source.id, NetworkLink.target_id == target.id),
+        db.and_(NetworkLink.source_id == target.id, NetworkLink.target_id == source.id)
+    )).first():
+        return jsonify({'error': 'Link already exists'}), 409
+    
+    link = NetworkLink(
+        source_id=source.id,
+        target_id=target.id,
+        link_type=data['type'],
+        capacity_mbps=data.get('capacity_mbps'),
+        subdomain=data.get('subdomain'),
+        status=data.get('status', 'active')
+    )
+    db.session.add(link)
+    db.session.commit()
+    
+    return jsonify({'success': True, 'link': link.to_dict()}), 201
+
+
+@api_bp.route('/topology/links/<int:link_id>', methods=['DELETE'])
+@engineer_required
+def delete_topology_link(link_id):
+    """Remove a link"""
+    link = NetworkLink.query.get_or_404(link_id)
+    db.session.delete(link)
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'Link deleted successfully'})
+
+
+@api_bp.route('/topology/elements/<int:element_id>/impact', methods=['GET'])
+@api_login_required
+def get_element_impact(element_id):
+    """Elements affected when an element degrades, and the elements it depends on"""
+    graph = get_topology_graph()
+    if element_id not in graph.nodes:
+        return jsonify({'error': 'Element not found'}), 404
+    
+    reachability = get_reachability(graph)
+    affected = reachability.affected_by(element_id)
+    by_domain = {}
+    for affected_id in affected:
+        domain = graph.nodes[affected_id]['domain']
+        by_domain[domain] = by_domain.get(domain, 0) + 1
     
     return jsonify({
-        'nodes': nodes,
-        'links': links
+        'element_id': element_id,
+        'version': graph.version,
+        'affected': affected,
+        'affected_by_domain': by_domain,
+        'depends_on': reachability.depends_on(element_id)
+    })
+
+
+@api_bp.route('/topology/paths', methods=['GET'])
+@api_login_required
+def get_topology_paths():
+    """End-to-end latency, jitter, loss and MOS of subscriber-to-internet paths
+    
+    Optional filters: element (paths through an element id) and location (of
+    the path's first element). Paths are returned worst first by ?sort=
+    latency (default), jitter, loss or mos.
+    """
+    sort = request.args.get('sort', 'latency')
+    if sort not in ('latency', 'jitter', 'loss', 'mos'):
+        return jsonify({'error': 'sort must be one of: latency, jitter, loss, mos'}), 400
+    limit = min(request.args.get('limit', type=int, default=100), 1000)
+    
+    graph = get_topology_graph()
+    path_set = get_path_set(graph)
+    mask = path_set.select(element_id=request.args.get('element', type=int),
+                           location=request.args.get('location'))
+    metrics = path_set.evaluate(*hop_metrics(path_set), mask=mask)
+    
+    # Worst first: highest latency/jitter/loss, lowest MOS
+    order = np.argsort(metrics[sort] if sort == 'mos' else -metrics[sort], kind='stable')[:max(limit, 0)]
+    paths = path_set.paths(mask)
+    result = [{
+        'elements': paths[i],
+        'latency_ms': float(metrics['latency'][i]),
+        'jitter_ms': float(metrics['jitter'][i]),
+        'loss_pct': float(metrics['loss'][i]),
+        'mos': float(metrics['mos'][i]),
+        'segments_ms': {name: float(values[i]) for name, values in metrics['segments'].items()},
+        'complete': bool(metrics['complete'][i])
+    } for i in order]
+    
+    count = int(mask.sum())
+    return jsonify({
+        'version': graph.version,
+        'count': count,
+        'truncated': path_set.truncated,
+        'summary': {
+            'complete': int(metrics['complete'].sum()),
+            'latency_avg_ms': float(metrics['latency'].mean()) if count else None,
+            'latency_max_ms': float(metrics['latency'].max()) if count else None,
+            'mos_avg': float(metrics['mos'].mean()) if count else None
+        },
+        'paths': result
+    })
+
+
+@api_bp.route('/topology/root-cause', methods=['POST'])
+@api_login_required
+def get_root_cause_candidates():
+    """Rank likely root causes of alarming elements
+    
+    Uses the given element ids, or the elements with unacknowledged alerts.
+    """
+    data = request.get_json(silent=True) or {}
+    graph = get_topology_graph()
+    
+    element_ids = data.get('elements')
+    if element_ids is None:
+        element_ids = [row.element_id for row in db.session.query(Alert.element_id).filter(
+            Alert.acknowledged.is_(False), Alert.element_id.isnot(None)).distinct()]
+    # type() rather than isinstance(): JSON true/false arrive as bool, a subclass of int
+    if not isinstance(element_ids, list) or not all(type(e) is int for e in element_ids):
+        return jsonify({'error': 'elements must be a list of element ids'}), 400
+    unknown = sorted(set(element_ids) - set(graph.nodes))
+    if unknown:
+        return jsonify({'error': f'Unknown elements: {unknown}'}), 404
+    
+    try:
+        limit = min(max(int(data.get('limit', 10)), 1), 100)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    candidates = get_reachability(graph).root_causes(element_ids, limit=limit)
+    for candidate in candidates:
+        node = graph.nodes[candidate['element_id']]
+        candidate.update(name=node['name'], domain=node['domain'], status=node['status'])
+    
+    return jsonify({
+        'version': graph.version,
+        'alarming': sorted(set(element_ids)),
+        'candidates': candidates
     })
+
+
+def job_response(job, status=200):
+    """Job JSON with its polling and download URLs"""
+    result = job.to_dict()
+    result['url'] = url_for('api.get_job', job_id=job.id)
+    if job.artifact_path:
+        result['artifact']['url'] = url_for('api.download_job_artifact', job_id=job.id)
+    response = jsonify(result)
+    response.status_code = status
+    if status == 202:
+        response.headers['Location'] = result['url']
+    return response
+
+
+def _visible_job(job_id):
+    """The job if the current user may see it (own jobs; admins see all)"""
+    job = db.session.get(Job, job_id)
+    if job is None or (job.created_by != current_user.id and not current_user.has_role('admin')):
+        return None
+    return job
+
+
+@api_bp.route('/jobs', methods=['POST'])
+@api_login_required
+def create_job():
+    """Queue a background job: {"type": ..., "params": {...}}"""
+    data = request.get_json(silent=True) or {}
+    job_type = data.get('type')
+    params = data.get('params', {})
+    if job_type not in JOB_TYPES:
+        return jsonify({'error': f'type must be one of {sorted(JOB_TYPES)}'}), 400
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object'}), 400
+    if not can_enqueue(current_user, job_type):
+        return jsonify({'error': 'Insufficient privileges for this job type'}), 403
+    
+    try:
+        job = enqueue_job(job_type, params, user=current_user)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return job_response(job, 202)
+
+
+@api_bp.route('/jobs', methods=['GET'])
+@api_login_required
+def get_jobs():
+    """Recent jobs of the current user (all users for admins), newest first"""
+    query = Job.query
+    if not current_user.has_role('admin'):
+        query = query.filter(Job.created_by == current_user.id)
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Job.status == status)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    jobs = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@api_login_required
+def get_job(job_id):
+    """Job status and progress (poll until status is succeeded, failed or cancelled)"""
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return job_response(job)
+
+
+@api_bp.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@api_login_required
+def cancel_background_job(job_id):
+    """Cancel a queued job, or ask a running one to stop"""
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.finished:
+        return jsonify({'error': f'Job already {job.status}'}), 409
+    if not can_cancel(job):
+        return jsonify({'error': f'Running {job.job_type} jobs cannot be cancelled'}), 409
+    return job_response(cancel_job(job))
+
+
+@api_bp.route('/jobs/<int:job_id>/artifact', methods=['GET'])
+@api_login_required
+def download_job_artifact(job_id):
+    """Download the result file of a finished job"""
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != 'succeeded' or not job.artifact_path:
+        return jsonify({'error': 'Job has no artifact', 'status': job.status}), 404
+    if not os.path.exists(job.artifact_path):
+        return jsonify({'error': 'Job artifact is no longer available', 'status': job.status}), 410
+    return send_file(job.artifact_path, mimetype=job.artifact_mimetype,
+                     download_name=job.artifact_name, as_attachment=True)
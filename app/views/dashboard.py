@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, jsonify, request, redirect, url_for
+from flask import Blueprint, render_template, jsonify, request, redirect, url_for, current_app
 from flask_login import login_required, current_user
-from app.models.network import NetworkElement, KPIMeasurement, KPIDefinition, Alert
+from app.models.network import NetworkElement, KPIDefinition, Alert
 from app.models.subdomain import NetworkSubdomain
 from app.models.simulation import PerformanceTest
+from app.services.partitioning import measurement_source
+from app.services.downsampling import downsample_rows, downsampling_params
+from app.services.rollups import choose_resolution, rollup_series
+from app import db
 from datetime import datetime, timedelta
 import json
 
@@ -143,20 +147,39 @@ def kpi_data():
     if not element:
         return jsonify({'error': 'Invalid element ID'}), 400
     
-    # Get KPI measurements
+    try:
+        max_points, mode = downsampling_params(request.args, current_app.config.get('CHART_MAX_POINTS', 1000),
+                                               current_app.config.get('CHART_DOWNSAMPLING', 'lttb'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Use the coarsest rollup that still gives a useful number of points
     cutoff = datetime.utcnow() - timedelta(hours=hours)
-    measurements = KPIMeasurement.query.join(KPIDefinition).filter(
-        KPIMeasurement.element_id == element_id,
-        KPIDefinition.kpi_code == kpi_code,
-        KPIMeasurement.timestamp >= cutoff
-    ).order_by(KPIMeasurement.timestamp).all()
+    resolution = choose_resolution(timedelta(hours=hours))
+    if resolution:
+        points = [{'timestamp': p['bucket'], 'value': p['avg']}
+                  for p in rollup_series(kpi_def.id, resolution, cutoff, element_id=element_id)]
+        label_format = '%d/%m' if resolution == '1d' else '%H:%M'
+    else:
+        measurement = measurement_source(cutoff)
+        points = [row._asdict() for row in db.session.query(measurement.timestamp, measurement.value).filter(
+            measurement.element_id == element_id,
+            measurement.kpi_id == kpi_def.id,
+            measurement.timestamp >= cutoff
+        ).order_by(measurement.timestamp)]
+        label_format = '%H:%M'
+    
+    # Reduce to about max_points representative points for the chart
+    points = downsample_rows(points, max_points, mode)
+    labels = [p['timestamp'].strftime(label_format) for p in points]
+    values = [p['value'] for p in points]
     
     # Format data for charts
     data = {
-        'labels': [m.timestamp.strftime('%H:%M') for m in measurements],
+        'labels': labels,
         'datasets': [{
             'label': f'{kpi_def.kpi_name} ({kpi_def.unit})',
-            'data': [m.value for m in measurements],
+            'data': values,
             'borderColor': '#3498db',
             'backgroundColor': 'rgba(52, 152, 219, 0.2)',
             'fill': True,
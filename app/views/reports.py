@@ -1,16 +1,18 @@
-from flask import Blueprint, render_template, request, jsonify, send_file
+from flask import Blueprint, render_template, request, jsonify, send_file, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
-from app.models.network import NetworkElement, KPIMeasurement, KPIDefinition
+from app.models.network import KPIDefinition
 from app.models.simulation import SimulationScenario, PerformanceTest
+from app.services.charts import CHARTS, TIME_RANGES, ChartBusy, chart_png
+from app.services.export import kpi_export
+from app.services.jobs import enqueue_job
+from app.services.reporting import alerts_summary as alerts_summary_report, domain_health as domain_health_report
+from app.services.rollups import TREND_ROLLUPS, rollup_series, regroup
+from app.views.api import job_response
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 import json
 import io
-import csv
 import pandas as pd
-from matplotlib import pyplot as plt
-import seaborn as sns
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
 
 # Create reports blueprint
 reports_bp = Blueprint('reports', __name__)
@@ -82,13 +84,13 @@ def kpi_trends():
             selected_kpi = kpi
             break
     
-    # Get measurements for selected KPI
-    measurements = []
+    # Get the trend for the selected KPI from the matching rollup
+    trend = []
     if selected_kpi:
-        measurements = KPIMeasurement.query.join(KPIDefinition).filter(
-            KPIDefinition.kpi_code == kpi_code,
-            KPIMeasurement.timestamp >= cutoff
-        ).order_by(KPIMeasurement.timestamp).all()
+        resolution, group_width = TREND_ROLLUPS[interval]
+        trend = rollup_series(selected_kpi.id, resolution, cutoff)
+        if group_width:
+            trend = regroup(trend, group_width)
     
     return render_template(
         'reports/kpi_trends.html',
@@ -97,7 +99,7 @@ def kpi_trends():
         time_range=time_range,
         kpi_defs=kpi_defs,
         selected_kpi=selected_kpi,
-        measurements=measurements,
+        trend=trend,
         interval=interval
     )
 
@@ -119,47 +121,8 @@ def domain_health():
     else:
         cutoff = datetime.utcnow() - timedelta(hours=24)
     
-    # Get health status by domain
-    domains = ['ran', 'transport', 'core', 'internet']
-    domain_health = {}
-    
-    for domain in domains:
-        # Get all elements in this domain
-        elements = NetworkElement.query.filter_by(domain=domain).all()
-        
-        # Count active vs inactive
-        total = len(elements)
-        active = sum(1 for e in elements if e.status == 'active')
-        
-        # Calculate health percentage
-        health = int((active / total * 100) if total > 0 else 0)
-        
-        # Get average quality scores for critical KPIs
-        kpi_scores = []
-        kpi_defs = KPIDefinition.query.filter_by(domain=domain, is_critical=True).all()
-        
-        for element in elements:
-            for kpi_def in kpi_defs:
-                # Get latest measurement
-                measurement = KPIMeasurement.query.join(KPIDefinition).filter(
-                    KPIMeasurement.element_id == element.id,
-                    KPIDefinition.id == kpi_def.id,
-                    KPIMeasurement.timestamp >= cutoff
-                ).order_by(KPIMeasurement.timestamp.desc()).first()
-                
-                if measurement and measurement.quality_score is not None:
-                    kpi_scores.append(measurement.quality_score)
-        
-        # Calculate average quality score
-        avg_quality = sum(kpi_scores) / len(kpi_scores) if kpi_scores else 0
-        
-        domain_health[domain] = {
-            'health': health,
-            'active': active,
-            'total': total,
-            'avg_quality': avg_quality,
-            'kpi_count': len(kpi_scores)
-        }
+    # One aggregate query over the latest values instead of one query per element and KPI
+    domain_health = domain_health_report(cutoff)
     
     return render_template(
         'reports/domain_health.html',
@@ -227,50 +190,32 @@ def alerts_summary():
     else:
         cutoff = datetime.utcnow() - timedelta(hours=24)
     
-    # Get alerts in the time range
-    alerts = Alert.query.filter(
+    # Counts come from one grouped query; the table shows one page of alerts
+    summary = alerts_summary_report(cutoff)
+    page = request.args.get('page', 1, type=int)
+    alerts = Alert.query.options(
+        joinedload(Alert.element), joinedload(Alert.definition)
+    ).filter(
         Alert.created_at >= cutoff
-    ).order_by(Alert.created_at.desc()).all()
-    
-    # Count by severity
-    severity_counts = {
-        'low': sum(1 for a in alerts if a.severity == 'low'),
-        'medium': sum(1 for a in alerts if a.severity == 'medium'),
-        'high': sum(1 for a in alerts if a.severity == 'high')
-    }
-    
-    # Count by domain
-    domain_counts = {}
-    for alert in alerts:
-        element = NetworkElement.query.get(alert.element_id)
-        if element:
-            domain = element.domain
-            if domain not in domain_counts:
-                domain_counts[domain] = 0
-            domain_counts[domain] += 1
-    
-    # Count acknowledged vs unacknowledged
-    ack_counts = {
-        'acknowledged': sum(1 for a in alerts if a.acknowledged),
-        'unacknowledged': sum(1 for a in alerts if not a.acknowledged)
-    }
+    ).order_by(Alert.created_at.desc(), Alert.id.desc()).paginate(
+        page=page, per_page=current_app.config.get('ITEMS_PER_PAGE', 20), error_out=False, count=False
+    )
+    alerts.total = summary['total_count']
     
     return render_template(
         'reports/alerts_summary.html',
         title='Alerts Summary',
         time_range=time_range,
-        alerts=alerts,
-        severity_counts=severity_counts,
-        domain_counts=domain_counts,
-        ack_counts=ack_counts,
-        total_count=len(alerts)
+        alerts=alerts.items,
+        pagination=alerts,
+        **summary
     )
 
 
 @reports_bp.route('/export/kpi', methods=['GET'])
 @login_required
 def export_kpi_data():
-    """Export KPI data to CSV"""
+    """Export KPI data as CSV (optionally gzipped) or columnar NumPy arrays (?format=npz)"""
     # Get parameters
     domain = request.args.get('domain')
     kpi_code = request.args.get('kpi_code')
@@ -286,53 +231,25 @@ def export_kpi_data():
     else:
         cutoff = datetime.utcnow() - timedelta(hours=24)
     
-    # Start query
-    query = KPIMeasurement.query.join(KPIDefinition).join(NetworkElement).filter(
-        KPIMeasurement.timestamp >= cutoff
-    )
-    
-    # Apply filters
-    if domain:
-        query = query.filter(NetworkElement.domain == domain)
-    
-    if kpi_code:
-        query = query.filter(KPIDefinition.kpi_code == kpi_code)
-    
-    # Get measurements
-    measurements = query.order_by(KPIMeasurement.timestamp).all()
+    compress = request.args.get('compress') == 'gzip'
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'npz'):
+        return jsonify({'error': 'format must be csv or npz'}), 400
     
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
+    # ?async=1 hands the export to a background job and answers with it
+    if request.args.get('async') in ('1', 'true'):
+        job = enqueue_job('kpi_export', {'time_range': time_range, 'domain': domain, 'kpi_code': kpi_code,
+                                         'format': export_format, 'compress': compress}, user=current_user)
+        return job_response(job, 202)
     
-    # Write header
-    writer.writerow(['timestamp', 'element_name', 'domain', 'kpi_name', 'kpi_code', 'value', 'unit', 'quality_score'])
-    
-    # Write data
-    for m in measurements:
-        element = NetworkElement.query.get(m.element_id)
-        kpi = KPIDefinition.query.get(m.kpi_id)
-        
-        writer.writerow([
-            m.timestamp.isoformat(),
-            element.element_name if element else '',
-            element.domain if element else '',
-            kpi.kpi_name if kpi else '',
-            kpi.kpi_code if kpi else '',
-            m.value,
-            kpi.unit if kpi else '',
-            m.quality_score
-        ])
-    
-    # Prepare response
-    output.seek(0)
-    filename = f"kpi_data_{time_range}_{domain or 'all'}_{kpi_code or 'all'}_{datetime.now().strftime('%Y%m%d')}.csv"
-    
-    return send_file(
-        io.BytesIO(output.getvalue().encode()),
-        mimetype='text/csv',
-        download_name=filename,
-        as_attachment=True
+    filename, mimetype, chunks = kpi_export(
+        cutoff, time_range, domain=domain, kpi_code=kpi_code, export_format=export_format, compress=compress,
+        chunk_size=current_app.config.get('EXPORT_CHUNK_SIZE', 5000)
+    )
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
 
@@ -340,91 +257,24 @@ def export_kpi_data():
 @login_required
 def export_chart(chart_type):
     """Generate and export chart images"""
-    # Get parameters
-    domain = request.args.get('domain')
     time_range = request.args.get('time_range', 'day')
-    
-    # Set time range
-    if time_range == 'day':
-        cutoff = datetime.utcnow() - timedelta(hours=24)
-        date_format = '%H:%M'
-    elif time_range == 'week':
-        cutoff = datetime.utcnow() - timedelta(days=7)
-        date_format = '%a'
-    elif time_range == 'month':
-        cutoff = datetime.utcnow() - timedelta(days=30)
-        date_format = '%d/%m'
-    else:
-        cutoff = datetime.utcnow() - timedelta(hours=24)
-        date_format = '%H:%M'
-    
-    plt.figure(figsize=(10, 6))
-    
-    if chart_type == 'domain_health':
-        # Domain health bar chart
-        domains = ['ran', 'transport', 'core', 'internet']
-        health_values = []
-        
-        for d in domains:
-            # Count active vs total
-            total = NetworkElement.query.filter_by(domain=d).count()
-            active = NetworkElement.query.filter_by(domain=d, status='active').count()
-            health = int((active / total * 100) if total > 0 else 0)
-            health_values.append(health)
-        
-        # Set colors based on health values
-        colors = ['#e74c3c' if h < 60 else '#f1c40f' if h < 90 else '#2ecc71' for h in health_values]
-        
-        plt.bar(domains, health_values, color=colors)
-        plt.xlabel('Network Domain')
-        plt.ylabel('Health (%)')
-        plt.title(f'Domain Health Overview - {time_range.capitalize()}')
-        plt.ylim(0, 100)
-        
-        # Add value labels on top of bars
-        for i, v in enumerate(health_values):
-            plt.text(i, v + 2, f"{v}%", ha='center')
-        
-        chart_title = f"domain_health_{time_range}_{datetime.now().strftime('%Y%m%d')}"
-        
-    elif chart_type == 'qoe_trend':
-        # QoE trend line chart
-        tests = PerformanceTest.query.filter(
-            PerformanceTest.timestamp >= cutoff
-        ).order_by(PerformanceTest.timestamp).all()
-        
-        # Group by date/hour
-        data = {}
-        for test in tests:
-            key = test.timestamp.strftime(date_format)
-            if key not in data:
-                data[key] = []
-            data[key].append(test.qoe_score)
-        
-        # Calculate averages
-        x = list(data.keys())
-        y = [sum(scores) / len(scores) if scores else 0 for scores in data.values()]
-        
-        plt.plot(x, y, marker='o', linestyle='-', color='#3498db')
-        plt.xlabel('Time')
-        plt.ylabel('Average QoE Score')
-        plt.title(f'QoE Score Trend - {time_range.capitalize()}')
-        plt.ylim(0, 100)
-        plt.grid(True, linestyle='--', alpha=0.7)
-        
-        chart_title = f"qoe_trend_{time_range}_{datetime.now().strftime('%Y%m%d')}"
-        
-    else:
+    if time_range not in TIME_RANGES:
+        time_range = 'day'
+    if chart_type not in CHARTS:
         return jsonify({'error': 'Invalid chart type'}), 400
-    
-    # Save chart to memory
-    img_data = io.BytesIO()
-    plt.tight_layout()
-    plt.savefig(img_data, format='png', dpi=100)
-    img_data.seek(0)
-    
+
+    if request.args.get('async') in ('1', 'true'):
+        job = enqueue_job('chart', {'chart_type': chart_type, 'time_range': time_range}, user=current_user)
+        return job_response(job, 202)
+
+    try:
+        png = chart_png(chart_type, time_range)
+    except ChartBusy:
+        return jsonify({'error': 'Chart renderer busy, try again shortly'}), 503
+
+    chart_title = f"{chart_type}_{time_range}_{datetime.now().strftime('%Y%m%d')}"
     return send_file(
-        img_data,
+        io.BytesIO(png),
         mimetype='image/png',
         download_name=f"{chart_title}.png",
         as_attachment=True
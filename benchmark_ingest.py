@@ -0,0 +1,379 @@
+"""
+Ingestion benchmark for Mobile QoE Tool
+Spins up the application against a temporary database, drives the KPI ingest
+API with concurrent synthetic collectors and reports sustained throughput,
+request latency and commit latency. Results are appended to a JSON lines file
+so runs can be compared across commits.
+
+Usage:
+    python benchmark_ingest.py --collectors 8 --duration 30
+    python benchmark_ingest.py --database-url postgresql://localhost/qoe_bench
+    python benchmark_ingest.py --compare 5
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from config import config, Config
+from app import create_app, db
+from app.models.user import User
+from app.models.network import NetworkElement, KPIDefinition
+
+# HLD requirement: the platform must ingest 1000 KPI measurements per second
+TARGET_MEASUREMENTS_PER_SECOND = 1000
+
+DEFAULT_RESULTS_FILE = os.path.join(Config.basedir, 'benchmark_results', 'ingest.jsonl')
+
+BENCH_KPIS = [
+    {'kpi_name': 'Signal-to-Interference-plus-Noise Ratio', 'kpi_code': 'sinr', 'unit': 'dB', 'domain': 'ran', 'impact_level': 'high', 'min_value': -5, 'max_value': 30, 'optimal_value': 20},
+    {'kpi_name': 'Physical Resource Block Utilization', 'kpi_code': 'prb_util', 'unit': '%', 'domain': 'ran', 'impact_level': 'medium', 'min_value': 0, 'max_value': 100, 'optimal_value': 50},
+    {'kpi_name': 'MPLS Tunnel Utilization', 'kpi_code': 'mpls_util', 'unit': '%', 'domain': 'transport', 'impact_level': 'high', 'min_value': 0, 'max_value': 100, 'optimal_value': 60},
+    {'kpi_name': 'Download Speed', 'kpi_code': 'dl_speed', 'unit': 'Mbps', 'domain': 'e2e', 'impact_level': 'high', 'min_value': 1, 'max_value': 1000, 'optimal_value': 50},
+    {'kpi_name': 'Latency', 'kpi_code': 'latency', 'unit': 'ms', 'domain': 'e2e', 'impact_level': 'high', 'min_value': 5, 'max_value': 500, 'optimal_value': 20},
+]
+
+BENCH_DOMAINS = ['ran', 'transport', 'core', 'internet']
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples (returns None when empty)"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def git_revision():
+    """Return the current git commit hash, or None outside a checkout"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=Config.basedir, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_config(database_url, schema=None):
+    """Create and register a config class pointing at the benchmark database"""
+    engine_options = {}
+    if database_url.startswith('postgresql'):
+        engine_options = {'pool_size': 20, 'max_overflow': 20, 'pool_pre_ping': True}
+        if schema:
+            engine_options['connect_args'] = {'options': f'-csearch_path={schema}'}
+    else:
+        # Collectors share one SQLite file; wait for the write lock instead of failing fast
+        engine_options = {'connect_args': {'timeout': 30, 'check_same_thread': False}}
+
+    class BenchmarkConfig(config['production']):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options
+        SESSION_COOKIE_SECURE = False
+        REMEMBER_COOKIE_SECURE = False
+        WTF_CSRF_ENABLED = False
+        LOG_TO_STDOUT = False
+
+    config['benchmark'] = BenchmarkConfig
+    return 'benchmark'
+
+
+def seed(num_elements):
+    """Create the benchmark user, KPI definitions and network elements"""
+    user = User(username='bench_engineer', email='bench@example.com', role='engineer')
+    user.set_password(uuid.uuid4().hex)
+    db.session.add(user)
+
+    for kpi_info in BENCH_KPIS:
+        db.session.add(KPIDefinition(**kpi_info))
+
+    for i in range(num_elements):
+        db.session.add(NetworkElement(
+            element_name=f'BENCH_ELEMENT_{i:05d}',
+            element_type='router',
+            domain=BENCH_DOMAINS[i % len(BENCH_DOMAINS)],
+            location=f'Bench Site {i // 10}',
+            status='active'
+        ))
+    db.session.commit()
+    return user.id
+
+
+class CommitTimer:
+    """Collects ORM commit latencies via session events"""
+
+    def __init__(self):
+        self.samples = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self):
+        event.listen(Session, 'before_commit', self._before_commit)
+        event.listen(Session, 'after_commit', self._after_commit)
+
+    def uninstall(self):
+        event.remove(Session, 'before_commit', self._before_commit)
+        event.remove(Session, 'after_commit', self._after_commit)
+
+    def reset(self):
+        with self._lock:
+            self.samples = []
+
+    def _before_commit(self, session):
+        self._local.started = time.perf_counter()
+
+    def _after_commit(self, session):
+        started = getattr(self._local, 'started', None)
+        if started is not None:
+            with self._lock:
+                self.samples.append(time.perf_counter() - started)
+            self._local.started = None
+
+
+def _measurement(element_names, rng):
+    kpi = rng.choice(BENCH_KPIS)
+    value = rng.uniform(kpi['min_value'], kpi['max_value'])
+    return {
+        'element_name': rng.choice(element_names),
+        'kpi_code': kpi['kpi_code'],
+        'value': round(value, 3),
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    }
+
+
+def single_payload(element_names, rng, batch_size):
+    """One measurement per request, as sent by POST /api/kpi/measurements"""
+    return _measurement(element_names, rng), 1
+
+
+def batch_payload(element_names, rng, batch_size):
+    """batch_size measurements per request, as sent by POST /api/kpi/measurements/batch"""
+    return {'measurements': [_measurement(element_names, rng) for _ in range(batch_size)]}, batch_size
+
+
+PAYLOAD_MODES = {
+    'single': ('/api/kpi/measurements', single_payload),
+    'batch': ('/api/kpi/measurements/batch', batch_payload),
+}
+
+
+class Collector(threading.Thread):
+    """Synthetic collector posting measurements until told to stop"""
+
+    def __init__(self, app, user_id, element_names, mode, batch_size, stop_event, seed_value):
+        super().__init__(daemon=True)
+        self.app = app
+        self.user_id = user_id
+        self.element_names = element_names
+        self.endpoint, self.payload_factory = PAYLOAD_MODES[mode]
+        self.batch_size = batch_size
+        self.stop_event = stop_event
+        self.rng = random.Random(seed_value)
+        self.recording = False
+        self.latencies = []
+        self.measurements = 0
+        self.errors = 0
+
+    def run(self):
+        client = self.app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user_id)
+            sess['_fresh'] = True
+
+        while not self.stop_event.is_set():
+            payload, count = self.payload_factory(self.element_names, self.rng, self.batch_size)
+            started = time.perf_counter()
+            response = client.post(self.endpoint, json=payload)
+            elapsed = time.perf_counter() - started
+            if not self.recording:
+                continue
+            if response.status_code in (200, 201, 202):
+                self.latencies.append(elapsed)
+                self.measurements += count
+            else:
+                self.errors += 1
+
+
+def run_benchmark(args):
+    """Run one benchmark and return the result record"""
+    temp_dir = None
+    schema = None
+    database_url = args.database_url
+    if not database_url:
+        temp_dir = tempfile.mkdtemp(prefix='qoe_bench_')
+        database_url = 'sqlite:///' + os.path.join(temp_dir, 'bench.db')
+    elif database_url.startswith('postgresql'):
+        schema = f'qoe_bench_{os.getpid()}'
+
+    app = create_app(build_config(database_url, schema))
+    app.logger.disabled = True
+    commit_timer = CommitTimer()
+
+    try:
+        with app.app_context():
+            if schema:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'CREATE SCHEMA {schema}'))
+            db.create_all()
+            user_id = seed(args.elements)
+            element_names = [e.element_name for e in NetworkElement.query.all()]
+            db.session.remove()
+
+        stop_event = threading.Event()
+        collectors = [
+            Collector(app, user_id, element_names, args.mode, args.batch_size, stop_event, args.seed + i)
+            for i in range(args.collectors)
+        ]
+        commit_timer.install()
+        for collector in collectors:
+            collector.start()
+
+        time.sleep(args.warmup)
+        commit_timer.reset()
+        for collector in collectors:
+            collector.recording = True
+        started = time.perf_counter()
+        time.sleep(args.duration)
+        for collector in collectors:
+            collector.recording = False
+        elapsed = time.perf_counter() - started
+
+        stop_event.set()
+        for collector in collectors:
+            collector.join()
+        commit_timer.uninstall()
+
+        latencies = [l for c in collectors for l in c.latencies]
+        measurements = sum(c.measurements for c in collectors)
+        throughput = measurements / elapsed if elapsed > 0 else 0.0
+
+        def ms(value):
+            return round(value * 1000, 3) if value is not None else None
+
+        return {
+            'timestamp': datetime.utcnow().isoformat(),
+            'commit': git_revision(),
+            'database': database_url.split(':', 1)[0],
+            'mode': args.mode,
+            'batch_size': args.batch_size if args.mode == 'batch' else 1,
+            'collectors': args.collectors,
+            'elements': args.elements,
+            'duration_s': round(elapsed, 3),
+            'requests': len(latencies),
+            'errors': sum(c.errors for c in collectors),
+            'measurements': measurements,
+            'measurements_per_sec': round(throughput, 1),
+            'request_latency_ms': {
+                'p50': ms(percentile(latencies, 50)),
+                'p95': ms(percentile(latencies, 95)),
+                'p99': ms(percentile(latencies, 99)),
+            },
+            'commit_latency_ms': {
+                'p50': ms(percentile(commit_timer.samples, 50)),
+                'p95': ms(percentile(commit_timer.samples, 95)),
+                'p99': ms(percentile(commit_timer.samples, 99)),
+            },
+            'target_per_sec': TARGET_MEASUREMENTS_PER_SECOND,
+            'meets_target': throughput >= TARGET_MEASUREMENTS_PER_SECOND,
+        }
+    finally:
+        with app.app_context():
+            db.session.remove()
+            if schema:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'DROP SCHEMA IF EXISTS {schema} CASCADE'))
+            db.engine.dispose()
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def save_result(result, results_file):
+    """Append a benchmark result to the results file"""
+    os.makedirs(os.path.dirname(os.path.abspath(results_file)), exist_ok=True)
+    with open(results_file, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+
+def load_results(results_file):
+    """Load previous benchmark results"""
+    if not os.path.exists(results_file):
+        return []
+    with open(results_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def print_result(result):
+    req = result['request_latency_ms']
+    commit = result['commit_latency_ms']
+    print(f"--- Ingest benchmark ({result['database']}, mode={result['mode']}, "
+          f"collectors={result['collectors']}, commit={result['commit'] or 'n/a'}) ---")
+    print(f"Measurements:        {result['measurements']} in {result['duration_s']}s "
+          f"({result['requests']} requests, {result['errors']} errors)")
+    print(f"Throughput:          {result['measurements_per_sec']} measurements/sec "
+          f"(target {result['target_per_sec']})")
+    print(f"Request latency ms:  p50={req['p50']} p95={req['p95']} p99={req['p99']}")
+    print(f"Commit latency ms:   p50={commit['p50']} p95={commit['p95']} p99={commit['p99']}")
+    print(f"Meets HLD target:    {'YES' if result['meets_target'] else 'NO'}")
+
+
+def print_comparison(results):
+    print(f"{'timestamp':<20} {'commit':<10} {'db':<11} {'mode':<8} {'coll':>4} "
+          f"{'meas/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'commit p95':>10}")
+    for r in results:
+        req = r['request_latency_ms']
+        print(f"{r['timestamp'][:19]:<20} {(r['commit'] or 'n/a'):<10} {r['database']:<11} "
+              f"{r['mode']:<8} {r['collectors']:>4} {r['measurements_per_sec']:>9} "
+              f"{req['p50']!s:>8} {req['p95']!s:>8} {req['p99']!s:>8} "
+              f"{r['commit_latency_ms']['p95']!s:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark KPI ingestion throughput and latency')
+    parser.add_argument('--collectors', type=int, default=8, help='Number of concurrent synthetic collectors')
+    parser.add_argument('--duration', type=float, default=20.0, help='Measured run time in seconds')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Warm-up time in seconds before measuring')
+    parser.add_argument('--elements', type=int, default=200, help='Number of synthetic network elements')
+    parser.add_argument('--mode', choices=sorted(PAYLOAD_MODES), default='single', help='Ingest API payload mode')
+    parser.add_argument('--batch-size', type=int, default=100, help='Measurements per request in batch mode')
+    parser.add_argument('--database-url', help='Benchmark against this database instead of a temporary SQLite file '
+                                               '(PostgreSQL runs in a throwaway schema)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for synthetic data')
+    parser.add_argument('--results-file', default=DEFAULT_RESULTS_FILE, help='JSON lines file to append results to')
+    parser.add_argument('--no-save', action='store_true', help='Do not store the result')
+    parser.add_argument('--compare', type=int, metavar='N', help='Show the last N stored results and exit')
+    parser.add_argument('--check', action='store_true', help='Exit non-zero when the HLD throughput target is missed')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.compare:
+        print_comparison(load_results(args.results_file)[-args.compare:])
+        return 0
+
+    result = run_benchmark(args)
+    print_result(result)
+    if not args.no_save:
+        save_result(result, args.results_file)
+        print(f"Result stored in {args.results_file}")
+
+    if args.check and not result['meets_target']:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -36,6 +36,89 @@ class Config:
     KPI_UPDATE_INTERVAL = 1  # seconds
     ALERT_CHECK_INTERVAL = 60  # seconds
     
+    # KPI measurement partitioning (native on PostgreSQL, routed tables on SQLite)
+    KPI_PARTITIONING = os.environ.get('KPI_PARTITIONING', 'false').lower() == 'true'
+    KPI_PARTITION_INTERVAL = os.environ.get('KPI_PARTITION_INTERVAL', 'month')  # day, week or month
+    KPI_PARTITION_PREMAKE = 2  # periods to create ahead of now
+
+    # Measurement ingestion
+    INGEST_MAX_FUTURE_SKEW = 300  # seconds a source timestamp may run ahead of server time
+    INGEST_MAX_BATCH = 5000  # measurements per batch request
+    KPI_EVALUATOR_TTL = 60  # seconds before cached KPI definitions are reloaded
+    QUALITY_BACKFILL_ON_CHANGE = True  # recompute stored quality scores when KPI thresholds change
+    QUALITY_BACKFILL_CHUNK_SIZE = 5000  # rows updated per commit
+
+    # Streaming ingest gateway (run_ingest_gateway.py)
+    INGEST_GATEWAY_HOST = os.environ.get('INGEST_GATEWAY_HOST', '0.0.0.0')
+    INGEST_GATEWAY_PORT = int(os.environ.get('INGEST_GATEWAY_PORT', 5100))  # TCP line protocol
+    INGEST_GATEWAY_WS_PORT = int(os.environ.get('INGEST_GATEWAY_WS_PORT', 5101))  # WebSocket, 0 disables
+    INGEST_GATEWAY_TOKEN = os.environ.get('INGEST_GATEWAY_TOKEN')  # required AUTH line when set
+    INGEST_GATEWAY_BATCH_SIZE = 1000  # measurements per database write
+    INGEST_GATEWAY_FLUSH_INTERVAL = 0.2  # seconds before a partial batch is written
+    INGEST_GATEWAY_QUEUE_SIZE = 50000  # queued measurements before collectors are throttled
+    INGEST_GATEWAY_MAX_LINE = 65536  # bytes
+
+    # Queue-based ingestion: the API enqueues, `flask ingest-worker` stores
+    INGEST_QUEUE_ENABLED = os.environ.get('INGEST_QUEUE_ENABLED', 'false').lower() == 'true'
+    INGEST_QUEUE_BACKEND = os.environ.get('INGEST_QUEUE_BACKEND', 'auto')  # auto, redis or database
+    INGEST_QUEUE_STREAM = 'kpi:ingest'
+    INGEST_QUEUE_GROUP = 'ingest-workers'
+    INGEST_QUEUE_VISIBILITY_TIMEOUT = 60  # seconds before an unacknowledged entry is redelivered
+    INGEST_WORKER_READ_COUNT = 200  # queue entries per worker batch
+    INGEST_WORKER_BLOCK_MS = 2000  # wait for new entries before polling again
+
+    # Topology API: KPI values and topology changes re-sent in ?since= deltas to cover late commits
+    TOPOLOGY_DELTA_OVERLAP = 5  # seconds
+    TOPOLOGY_DELTA_CHANGE_OVERLAP = 100  # change ids below the client's version
+    TOPOLOGY_MAX_NODES = 500  # nodes per response before ?level=auto switches to clusters
+    TOPOLOGY_LAYOUT_REBUILD_FRACTION = 0.1  # share of new elements above which the layout is recomputed
+    PATH_KPIS = {'latency': 'latency', 'jitter': 'jitter', 'loss': 'packet_loss'}  # per-hop KPI codes (loss in %)
+    PATH_MAX_PER_SOURCE = 64  # paths enumerated from each subscriber-side element
+
+    # Chart series: visual downsampling of raw points (?max_points=, ?downsample=lttb|minmax)
+    CHART_MAX_POINTS = 1000  # points per series; 0 returns every point
+    CHART_DOWNSAMPLING = 'lttb'  # lttb or minmax
+
+    # /api/kpi/aggregate
+    KPI_AGGREGATE_TARGET_BUCKETS = 500  # buckets per series aimed for by bucket=auto
+    KPI_AGGREGATE_MAX_BUCKETS = 5000  # buckets per series before a request is rejected
+
+    # Report exports
+    EXPORT_CHUNK_SIZE = 5000  # rows fetched and written per chunk
+    CHART_RENDER_WORKERS = 2  # threads rendering chart images
+    CHART_RENDER_QUEUE = 8  # renders allowed to wait for a worker
+    CHART_RENDER_TIMEOUT = 30  # seconds to wait for a queue slot before answering 503
+    CHART_CACHE_SIZE = 64  # rendered chart PNGs kept in memory per process
+
+    # Background jobs: the web tier enqueues, in-app threads or `flask worker` execute
+    JOBS_IN_APP_WORKERS = int(os.environ.get('JOBS_IN_APP_WORKERS', 0))  # worker threads in the web process
+    JOB_WORKER_THREADS = 2  # threads per `flask worker` process
+    JOB_ARTIFACT_DIR = os.environ.get('JOB_ARTIFACT_DIR') or os.path.join(basedir, 'instance', 'job_artifacts')
+    JOB_RESULT_TTL = 24 * 3600  # seconds finished jobs and their artifacts are kept
+    JOB_POLL_INTERVAL = 1.0  # seconds an idle worker thread waits before polling again
+    JOB_PROGRESS_INTERVAL = 1.0  # minimum seconds between progress writes of a job
+    JOB_HEARTBEAT_INTERVAL = 30  # seconds between heartbeats of running jobs
+    JOB_HEARTBEAT_TIMEOUT = 120  # seconds without heartbeat before a running job is re-queued
+    JOB_MAX_ATTEMPTS = 3  # runs of a job interrupted by worker crashes before it fails
+    JOB_PURGE_INTERVAL = 600  # seconds between purges of expired jobs
+    SQLITE_WAL = True  # write-ahead logging for file-based SQLite (readers no longer block writers)
+
+    # Data retention in days per table and KPI impact level (None keeps forever);
+    # rollups are keyed by resolution instead
+    RETENTION_POLICIES = {
+        'kpi_measurements': {'high': 90, 'medium': 30, 'low': 14, 'default': 30},
+        'alerts': {'high': 365, 'medium': 180, 'low': 90, 'default': 180},
+        'kpi_rollups': {'1m': 14, '1h': 180, '1d': 730},
+        'kpi_sketches': 365,  # hourly quantile sketches behind /api/kpi/percentiles
+    }
+    RETENTION_BATCH_SIZE = 5000  # rows deleted per statement
+    RETENTION_BATCH_PAUSE = 0.5  # seconds between batches
+    RETENTION_VACUUM = os.environ.get('RETENTION_VACUUM', 'false').lower() == 'true'
+    RETENTION_SCHEDULE_HOUR = 3  # UTC hour of the nightly purge
+    
+    # Run scheduled maintenance jobs inside the web process (enable on one replica only)
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'false').lower() == 'true'
+    
 class DevelopmentConfig(Config):
     DEBUG = True
     TESTING = False
@@ -0,0 +1,11 @@
+# Gunicorn server hooks (loaded from the working directory or with --config)
+
+
+def post_worker_init(worker):
+    """Start in-app job workers in each web worker once it has loaded the app
+
+    Threads do not survive fork, so with --preload they must be started after
+    the worker process exists rather than in create_app().
+    """
+    from app.services.jobs import start_in_app_workers
+    start_in_app_workers(worker.wsgi)
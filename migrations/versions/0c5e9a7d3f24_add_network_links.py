@@ -0,0 +1,53 @@
+"""Add network_links and topology_changes tables
+
+Revision ID: 0c5e9a7d3f24
+Revises: 6a0f3b9e5c18
+Create Date: 2026-10-19 16:48:12.630275
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c5e9a7d3f24'
+down_revision = '6a0f3b9e5c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('network_links',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source_id', sa.Integer(), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('link_type', sa.String(length=50), nullable=False),
+    sa.Column('capacity_mbps', sa.Float(), nullable=True),
+    sa.Column('subdomain', sa.String(length=50), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['source_id'], ['network_elements.id'], ),
+    sa.ForeignKeyConstraint(['target_id'], ['network_elements.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('source_id', 'target_id', name='uq_network_link_endpoints')
+    )
+    with op.batch_alter_table('network_links', schema=None) as batch_op:
+        batch_op.create_index('idx_network_link_target', ['target_id'], unique=False)
+
+    op.create_table('topology_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('topology_changes')
+
+    with op.batch_alter_table('network_links', schema=None) as batch_op:
+        batch_op.drop_index('idx_network_link_target')
+
+    op.drop_table('network_links')
@@ -0,0 +1,44 @@
+"""Add kpi_rollups table
+
+Revision ID: 3f1a9c2d7b41
+Revises: 8c54c2d79688
+Create Date: 2026-10-19 09:12:44.108532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2d7b41'
+down_revision = '8c54c2d79688'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('kpi_rollups',
+    sa.Column('resolution', sa.String(length=4), nullable=False),
+    sa.Column('element_id', sa.Integer(), nullable=False),
+    sa.Column('kpi_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('sample_count', sa.Integer(), nullable=False),
+    sa.Column('value_sum', sa.Float(), nullable=False),
+    sa.Column('value_sum_sq', sa.Float(), nullable=False),
+    sa.Column('min_value', sa.Float(), nullable=True),
+    sa.Column('max_value', sa.Float(), nullable=True),
+    sa.Column('last_value', sa.Float(), nullable=True),
+    sa.Column('last_timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['element_id'], ['network_elements.id'], ),
+    sa.ForeignKeyConstraint(['kpi_id'], ['kpi_definitions.id'], ),
+    sa.PrimaryKeyConstraint('resolution', 'element_id', 'kpi_id', 'bucket_start')
+    )
+    with op.batch_alter_table('kpi_rollups', schema=None) as batch_op:
+        batch_op.create_index('idx_rollup_kpi_bucket', ['resolution', 'kpi_id', 'bucket_start'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('kpi_rollups', schema=None) as batch_op:
+        batch_op.drop_index('idx_rollup_kpi_bucket')
+
+    op.drop_table('kpi_rollups')
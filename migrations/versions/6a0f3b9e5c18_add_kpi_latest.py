@@ -0,0 +1,39 @@
+"""Add kpi_latest table
+
+Revision ID: 6a0f3b9e5c18
+Revises: d41c8e7f2a63
+Create Date: 2026-10-19 15:22:51.804417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a0f3b9e5c18'
+down_revision = 'd41c8e7f2a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('kpi_latest',
+    sa.Column('element_id', sa.Integer(), nullable=False),
+    sa.Column('kpi_id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('quality_score', sa.Float(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['element_id'], ['network_elements.id'], ),
+    sa.ForeignKeyConstraint(['kpi_id'], ['kpi_definitions.id'], ),
+    sa.PrimaryKeyConstraint('element_id', 'kpi_id')
+    )
+    with op.batch_alter_table('kpi_latest', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_kpi_latest_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('kpi_latest', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_kpi_latest_updated_at'))
+
+    op.drop_table('kpi_latest')
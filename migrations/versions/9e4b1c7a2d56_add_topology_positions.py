@@ -0,0 +1,37 @@
+"""Add topology_positions table
+
+Revision ID: 9e4b1c7a2d56
+Revises: 0c5e9a7d3f24
+Create Date: 2026-10-19 18:05:41.219834
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b1c7a2d56'
+down_revision = '0c5e9a7d3f24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('topology_positions',
+    sa.Column('element_id', sa.Integer(), nullable=False),
+    sa.Column('domain', sa.String(length=50), nullable=False),
+    sa.Column('x', sa.Float(), nullable=False),
+    sa.Column('y', sa.Float(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['element_id'], ['network_elements.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('element_id')
+    )
+    with op.batch_alter_table('topology_positions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_topology_positions_version'), ['version'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('topology_positions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_topology_positions_version'))
+
+    op.drop_table('topology_positions')
@@ -0,0 +1,35 @@
+"""Make kpi_measurements unique per (element, kpi, timestamp)
+
+Revision ID: b7e2d4a91c05
+Revises: 3f1a9c2d7b41
+Create Date: 2026-10-19 11:03:27.519840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d4a91c05'
+down_revision = '3f1a9c2d7b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the first copy of any point that was stored more than once
+    op.execute(sa.text(
+        'DELETE FROM kpi_measurements WHERE id NOT IN ('
+        'SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM kpi_measurements '
+        'GROUP BY element_id, kpi_id, timestamp) AS survivors)'
+    ))
+
+    with op.batch_alter_table('kpi_measurements', schema=None) as batch_op:
+        batch_op.drop_index('idx_element_kpi')
+        batch_op.create_index('uq_kpi_measurement_series', ['element_id', 'kpi_id', 'timestamp'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('kpi_measurements', schema=None) as batch_op:
+        batch_op.drop_index('uq_kpi_measurement_series')
+        batch_op.create_index('idx_element_kpi', ['element_id', 'kpi_id'], unique=False)
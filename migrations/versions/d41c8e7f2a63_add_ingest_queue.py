@@ -0,0 +1,39 @@
+"""Add ingest_queue table
+
+Revision ID: d41c8e7f2a63
+Revises: b7e2d4a91c05
+Create Date: 2026-10-19 13:40:05.271946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c8e7f2a63'
+down_revision = 'b7e2d4a91c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingest_queue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('claimed_by', sa.String(length=100), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('deliveries', sa.Integer(), nullable=False),
+    sa.Column('failed_at', sa.DateTime(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('ingest_queue', schema=None) as batch_op:
+        batch_op.create_index('idx_ingest_queue_claim', ['failed_at', 'claimed_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ingest_queue', schema=None) as batch_op:
+        batch_op.drop_index('idx_ingest_queue_claim')
+
+    op.drop_table('ingest_queue')
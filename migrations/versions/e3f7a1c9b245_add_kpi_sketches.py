@@ -0,0 +1,42 @@
+"""Add kpi_sketches table
+
+Revision ID: e3f7a1c9b245
+Revises: 5b8d2f6e1a93
+Create Date: 2026-10-19 20:31:08.447120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3f7a1c9b245'
+down_revision = '5b8d2f6e1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('kpi_sketches',
+    sa.Column('element_id', sa.Integer(), nullable=False),
+    sa.Column('kpi_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('sample_count', sa.Integer(), nullable=False),
+    sa.Column('zero_count', sa.Integer(), nullable=False),
+    sa.Column('min_value', sa.Float(), nullable=True),
+    sa.Column('max_value', sa.Float(), nullable=True),
+    sa.Column('positive_bins', sa.LargeBinary(), nullable=False),
+    sa.Column('negative_bins', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['element_id'], ['network_elements.id'], ),
+    sa.ForeignKeyConstraint(['kpi_id'], ['kpi_definitions.id'], ),
+    sa.PrimaryKeyConstraint('element_id', 'kpi_id', 'bucket_start')
+    )
+    with op.batch_alter_table('kpi_sketches', schema=None) as batch_op:
+        batch_op.create_index('idx_sketch_kpi_bucket', ['kpi_id', 'bucket_start'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('kpi_sketches', schema=None) as batch_op:
+        batch_op.drop_index('idx_sketch_kpi_bucket')
+
+    op.drop_table('kpi_sketches')
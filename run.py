@@ -3,6 +3,7 @@ from app import create_app, db, socketio
 from app.models.user import User
 from app.models.network import NetworkElement, KPIDefinition
 from app.models.simulation import SimulationScenario
+from app.services.jobs import start_in_app_workers
 from flask_migrate import Migrate
 # Create app instance using environment variable or default to development
 app = create_app(os.getenv('FLASK_ENV', 'development'))
@@ -20,5 +21,8 @@ def make_shell_context():
     }
 
 if __name__ == '__main__':
+    # The reloader's watcher process only restarts the server; run jobs in the served child
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_in_app_workers(app)
     # Use socketio.run() to support WebSockets and enable debug mode for development
     socketio.run(app, debug=True)
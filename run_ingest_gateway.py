@@ -0,0 +1,16 @@
+import argparse
+import asyncio
+
+from app import create_app
+from app.services.gateway import IngestGateway
+
+app = create_app()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Streaming KPI ingest gateway (TCP line protocol and WebSocket)')
+    parser.add_argument('--host', help='Address to listen on (default: INGEST_GATEWAY_HOST)')
+    parser.add_argument('--port', type=int, help='TCP line-protocol port (default: INGEST_GATEWAY_PORT)')
+    parser.add_argument('--ws-port', type=int, help='WebSocket port, 0 to disable (default: INGEST_GATEWAY_WS_PORT)')
+    args = parser.parse_args()
+
+    asyncio.run(IngestGateway(app, host=args.host, port=args.port, ws_port=args.ws_port).serve_forever())
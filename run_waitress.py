@@ -1,7 +1,9 @@
 from waitress import serve
 from app import create_app
+from app.services.jobs import start_in_app_workers
 
 app = create_app()
 
 if __name__ == '__main__':
+    start_in_app_workers(app)
     serve(app, host='0.0.0.0', port=5000)
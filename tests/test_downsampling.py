@@ -0,0 +1,45 @@
+import numpy as np
+
+from app.services.downsampling import lttb_indices
+
+
+def reference_lttb(x, y, max_points):
+    """Straightforward loop implementation over the same equal-count buckets"""
+    size = len(x)
+    edges = np.linspace(1, size - 1, max_points - 1).astype(np.int64)
+    selected = [0]
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        a = best
+        selected.append(a)
+    selected.append(size - 1)
+    return selected
+
+
+def test_lttb_matches_reference():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        size = int(rng.integers(10, 300))
+        max_points = int(rng.integers(3, size))
+        x = np.sort(rng.uniform(0, 1000, size))
+        y = np.cumsum(rng.normal(size=size))
+        assert list(lttb_indices(x, y, max_points)) == reference_lttb(x, y, max_points)
+
+
+def test_lttb_keeps_endpoints_and_short_series():
+    x = np.arange(10, dtype=float)
+    y = np.array([0, 5, 0, 5, 0, 5, 0, 5, 0, 5], dtype=float)
+    selected = lttb_indices(x, y, 5)
+    assert selected[0] == 0 and selected[-1] == 9
+    assert list(lttb_indices(x, y, 20)) == list(range(10))
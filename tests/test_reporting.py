@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models.network import Alert, KPIDefinition, KPILatest, NetworkElement
+from app.services.reporting import alerts_summary, domain_health
+
+DOMAINS = ('ran', 'transport', 'core', 'internet')
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            KPIDefinition(kpi_name='SINR', kpi_code='sinr', unit='dB', domain='ran', impact_level='high',
+                          min_value=-5, max_value=30, optimal_value=20),
+            KPIDefinition(kpi_name='PRB Utilization', kpi_code='prb_util', unit='%', domain='ran',
+                          impact_level='medium', min_value=0, max_value=100, optimal_value=50),
+            KPIDefinition(kpi_name='MPLS Utilization', kpi_code='mpls_util', unit='%', domain='transport',
+                          impact_level='high', min_value=0, max_value=100, optimal_value=60),
+        ])
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def add_elements(count, start=0):
+    """Elements across all domains, each with a latest value for every KPI"""
+    now = datetime.utcnow()
+    kpis = KPIDefinition.query.all()
+    for i in range(start, start + count):
+        element = NetworkElement(element_name=f'NE{i}', element_type='router', domain=DOMAINS[i % 4],
+                                 status='active' if i % 3 else 'inactive')
+        db.session.add(element)
+        db.session.flush()
+        for kpi in kpis:
+            db.session.add(KPILatest(element_id=element.id, kpi_id=kpi.id, value=1.0, timestamp=now,
+                                     quality_score=80.0 if kpi.impact_level == 'high' else 10.0, updated_at=now))
+    db.session.commit()
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_domain_health_statement_count_is_constant(app):
+    cutoff = datetime.utcnow() - timedelta(hours=24)
+
+    add_elements(8)
+    with count_statements() as small:
+        domain_health(cutoff)
+
+    add_elements(200, start=8)
+    db.session.expire_all()
+    with count_statements() as large:
+        report = domain_health(cutoff)
+
+    assert len(small) == len(large) == 1
+    assert report['ran']['total'] == 52
+
+
+def test_domain_health_aggregates(app):
+    add_elements(8)
+    old = datetime.utcnow() - timedelta(days=3)
+    stale = NetworkElement(element_name='STALE', element_type='router', domain='ran', status='active')
+    db.session.add(stale)
+    db.session.flush()
+    sinr = KPIDefinition.query.filter_by(kpi_code='sinr').one()
+    db.session.add(KPILatest(element_id=stale.id, kpi_id=sinr.id, value=1.0, timestamp=old,
+                             quality_score=0.0, updated_at=old))
+    db.session.commit()
+
+    report = domain_health(datetime.utcnow() - timedelta(hours=24))
+
+    # ran: NE0 (inactive), NE4 (active) and STALE (active, value outside the range)
+    assert report['ran'] == {'health': 66, 'active': 2, 'total': 3, 'avg_quality': 80.0, 'kpi_count': 2}
+    # only the domain's own high impact KPIs count
+    assert report['transport']['kpi_count'] == 2
+    assert report['core']['kpi_count'] == 0
+    assert report['core']['avg_quality'] == 0
+    assert set(report) == set(DOMAINS)
+
+
+def test_alerts_summary_single_grouped_query(app):
+    add_elements(8)
+    now = datetime.utcnow()
+    severities = ('low', 'medium', 'high')
+    for i, element in enumerate(NetworkElement.query.order_by(NetworkElement.id)):
+        for j in range(i + 1):
+            db.session.add(Alert(element_id=element.id, alert_type='threshold', severity=severities[j % 3],
+                                 message='x', created_at=now, acknowledged=j % 2 == 1))
+    db.session.add(Alert(element_id=None, alert_type='system', severity='high', message='x', created_at=now))
+    db.session.add(Alert(element_id=1, alert_type='threshold', severity='high', message='old',
+                         created_at=now - timedelta(days=2)))
+    db.session.commit()
+
+    with count_statements() as statements:
+        summary = alerts_summary(now - timedelta(hours=24))
+
+    assert len(statements) == 1
+    assert summary['total_count'] == 37
+    assert summary['severity_counts'] == {'low': 15, 'medium': 12, 'high': 10}
+    # NE0..NE7 have 1..8 alerts; domains cycle ran, transport, core, internet
+    assert summary['domain_counts'] == {'ran': 6, 'transport': 8, 'core': 10, 'internet': 12}
+    assert summary['ack_counts'] == {'acknowledged': 16, 'unacknowledged': 21}